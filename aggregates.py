@@ -0,0 +1,1104 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+from mappings import dtypes, state_mapping, population_dropdown_mappings, state_variable_columns, state_division_mapping, division_region_mapping, income_bracket_bounds, ranking_metric_mappings, age_standard_populations
+
+# Aggregated tables are computed from the survey DataFrame the first time a
+# callback asks for them and then shared by every later callback. Callbacks run
+# on several threads, so each table is built under its own lock.
+_tables = {}
+_table_locks = {}
+_table_locks_guard = threading.Lock()
+
+def cached_table(df, key, build):
+    """
+    Returns the table stored for df under key, calling build() to compute it the first time.
+
+    Parameters:
+    df (pd.DataFrame): The survey DataFrame the table is computed from.
+    key (tuple): Identifies the table among those computed from df.
+    build (callable): Computes the table, called without arguments.
+
+    Returns:
+    The cached table.
+    """
+    cache_key = (id(df),) + tuple(key)
+    if cache_key in _tables:
+        return _tables[cache_key]
+
+    with _table_locks_guard:
+        lock = _table_locks.setdefault(cache_key, threading.Lock())
+    with lock:
+        if cache_key not in _tables:
+            _tables[cache_key] = build()
+    return _tables[cache_key]
+
+def state_year_table(df):
+    """
+    Population (sum of weights) and number of respondents for every state and year.
+
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+
+    Returns:
+    pd.DataFrame: Columns year, state, state_code, population and respondents.
+    """
+    def build():
+        table = weighted_cube(df, ['year', 'state'])[['year', 'state', 'wt', 'respondents']].rename(columns={'wt': 'population'})
+        table['state_code'] = table['state'].map(state_mapping)
+        return table
+
+    return cached_table(df, ('state_year',), build)
+
+# Standard population used for age-adjusted percentages, one of age_standard_populations
+AGE_STANDARD = os.environ.get('AGE_STANDARD', 'us2000')
+
+# Above this many cells, weighted_cube counts over the occupied cells instead of a dense array
+_DENSE_CUBE_LIMIT = 5_000_000
+
+# Percentages resting on fewer respondents than this, or with a relative standard error
+# above this, are flagged as unreliable (the NCHS presentation standard for proportions)
+MIN_RELIABLE_RESPONDENTS = 50
+MAX_RELIABLE_RSE = 0.3
+
+def _encode(df, column):
+    # Survey columns hold small integer codes, so offsetting by the minimum gives dense group indices
+    values = df[column].to_numpy()
+    low = int(values.min())
+    return (values - low).astype(np.intp), low, int(values.max()) - low + 1
+
+def weighted_cube(df, dims):
+    """
+    Sum of weights, sum of squared weights and number of respondents for every
+    combination of the given columns that occurs in the data. Computed in one pass with
+    np.bincount and cached, so later requests for the same columns are lookups. The
+    three sums are the sufficient statistics for the standard errors of percentage_intervals.
+
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+    dims (list): The integer-coded columns to group by (e.g., ['year', 'state', 'smoking']).
+
+    Returns:
+    pd.DataFrame: One row per non-empty cell, with the dims columns plus wt, wt2 and respondents.
+    """
+    dims = list(dims)
+
+    def build():
+        encoded = [_encode(df, dim) for dim in dims]
+        shape = tuple(size for _, _, size in encoded)
+        cells = np.ravel_multi_index([codes for codes, _, _ in encoded], shape)
+        weights = df['wt'].to_numpy(dtype=np.float64)
+
+        if np.prod(shape, dtype=np.float64) > _DENSE_CUBE_LIMIT:
+            # Many dims make the dense cube mostly empty, so count over the occupied cells only
+            occupied, cells = np.unique(cells, return_inverse=True)
+            respondents = np.bincount(cells)
+            wt = np.bincount(cells, weights=weights)
+            wt2 = np.bincount(cells, weights=weights * weights)
+            positions = np.unravel_index(occupied, shape)
+            occupied = slice(None)
+        else:
+            respondents = np.bincount(cells, minlength=int(np.prod(shape)))
+            wt = np.bincount(cells, weights=weights, minlength=respondents.size)
+            wt2 = np.bincount(cells, weights=weights * weights, minlength=respondents.size)
+
+            occupied = np.flatnonzero(respondents)
+            positions = np.unravel_index(occupied, shape)
+        cube = pd.DataFrame({dim: (position + low).astype(df[dim].dtype)
+                             for dim, position, (_, low, _) in zip(dims, positions, encoded)})
+        cube['wt'] = wt[occupied]
+        cube['wt2'] = wt2[occupied]
+        cube['respondents'] = respondents[occupied]
+        return cube
+
+    return cached_table(df, ('cube',) + tuple(dims), build)
+
+def stacked_cube(df, facets, dims):
+    """
+    The weighted cubes of several variables against the same columns, computed together:
+    the cells of every facet variable's cube are laid end to end in one index space, so
+    a single np.bincount over the stacked rows fills them all. Used for multi-select
+    comparisons, where a cube per selected variable would mean one pass each.
+
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+    facets (list): The variables compared (e.g., ['stroke', 'asthma']), each taking the x column.
+    dims (list): The integer-coded columns shared by every facet (e.g., ['state', 'year', 'smoking']).
+
+    Returns:
+    pd.DataFrame: One row per non-empty cell, with facet (the variable's name), x (its
+                  code), the dims columns, wt, wt2 and respondents.
+    """
+    facets, dims = list(facets), list(dims)
+
+    def build():
+        encoded_dims = [_encode(df, dim) for dim in dims]
+        dims_shape = tuple(size for _, _, size in encoded_dims)
+        weights = df['wt'].to_numpy(dtype=np.float64)
+
+        cells, shapes, offsets = [], [], [0]
+        for facet in facets:
+            codes, _, size = _encode(df, facet)
+            shape = dims_shape + (size,)
+            cells.append(np.ravel_multi_index([dim_codes for dim_codes, _, _ in encoded_dims] + [codes], shape) + offsets[-1])
+            shapes.append(shape)
+            offsets.append(offsets[-1] + int(np.prod(shape)))
+        cells = np.concatenate(cells)
+        stacked_weights = np.tile(weights, len(facets))
+
+        if offsets[-1] > _DENSE_CUBE_LIMIT:
+            occupied, cells = np.unique(cells, return_inverse=True)
+            respondents = np.bincount(cells)
+            wt = np.bincount(cells, weights=stacked_weights)
+            wt2 = np.bincount(cells, weights=stacked_weights * stacked_weights)
+        else:
+            respondents = np.bincount(cells, minlength=offsets[-1])
+            wt = np.bincount(cells, weights=stacked_weights, minlength=offsets[-1])
+            wt2 = np.bincount(cells, weights=stacked_weights * stacked_weights, minlength=offsets[-1])
+            occupied = np.flatnonzero(respondents)
+            respondents, wt, wt2 = respondents[occupied], wt[occupied], wt2[occupied]
+
+        # Split the occupied cells back into each facet's cube
+        parts = []
+        for index, facet in enumerate(facets):
+            in_facet = (occupied >= offsets[index]) & (occupied < offsets[index + 1])
+            positions = np.unravel_index(occupied[in_facet] - offsets[index], shapes[index])
+            part = pd.DataFrame({'facet': facet, 'x': (positions[-1] + int(df[facet].min())).astype(df[facet].dtype)})
+            for dim, position, (_, low, _) in zip(dims, positions[:-1], encoded_dims):
+                part[dim] = (position + low).astype(df[dim].dtype)
+            part['wt'] = wt[in_facet]
+            part['wt2'] = wt2[in_facet]
+            part['respondents'] = respondents[in_facet]
+            parts.append(part)
+        return pd.concat(parts, ignore_index=True)
+
+    return cached_table(df, ('stacked_cube', tuple(facets)) + tuple(dims), build)
+
+def prevalence_movers(df, year_a, year_b, min_respondents=50):
+    """
+    Change in weighted prevalence between two years for every state, variable and
+    answer code at once, by aligning the two years of state_prevalence_table. 'Other'
+    (-1) answers are left out, as is household income when the two years fall on
+    either side of its 2021 recode.
+
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+    year_a (int): The earlier year.
+    year_b (int): The later year.
+    min_respondents (int): Drops state and variable pairs with fewer respondents than
+                           this in either year.
+
+    Returns:
+    pd.DataFrame: Columns state, variable, code, percentage_a, percentage_b, change,
+                  respondents_a and respondents_b, sorted by the absolute change.
+    """
+    table = state_prevalence_table(df)
+    table = table.loc[(table['code'] != -1) & (table['total_respondents'] >= min_respondents),
+                      ['year', 'state', 'variable', 'code', 'percentage', 'total_respondents']]
+    if (year_a < 2021) != (year_b < 2021):
+        table = table.loc[table['variable'] != 'income']
+
+    keys = ['state', 'variable', 'code']
+    first = table.loc[table['year'] == year_a].drop(columns='year')
+    second = table.loc[table['year'] == year_b].drop(columns='year')
+    movers = first.merge(second, on=keys, suffixes=('_a', '_b'))
+    movers = movers.rename(columns={'total_respondents_a': 'respondents_a', 'total_respondents_b': 'respondents_b'})
+    movers['change'] = movers['percentage_b'] - movers['percentage_a']
+
+    order = np.argsort(-movers['change'].abs().to_numpy(), kind='stable')
+    return movers.iloc[order].reset_index(drop=True)[keys + ['percentage_a', 'percentage_b', 'change', 'respondents_a', 'respondents_b']]
+
+def geography_states(geography):
+    """
+    The state codes making up a geography.
+
+    Parameters:
+    geography (str or int): 'all', 'region:<name>', 'division:<name>' or a state code.
+
+    Returns:
+    list or None: The state codes, or None for 'all' (every state and territory).
+    """
+    if geography is None or geography == 'all':
+        return None
+    if isinstance(geography, str) and geography.startswith('region:'):
+        region = geography.split(':', 1)[1]
+        return [state for state, division in state_division_mapping.items() if division_region_mapping[division] == region]
+    if isinstance(geography, str) and geography.startswith('division:'):
+        division = geography.split(':', 1)[1]
+        return [state for state, state_division in state_division_mapping.items() if state_division == division]
+    return [int(geography)]
+
+def geography_label(geography):
+    """
+    Display name of a geography (e.g., 'All States', 'Northeast', 'AL').
+
+    Parameters:
+    geography (str or int): 'all', 'region:<name>', 'division:<name>' or a state code.
+
+    Returns:
+    str: The name used in figure titles.
+    """
+    if geography is None or geography == 'all':
+        return 'All States'
+    if isinstance(geography, str) and ':' in geography:
+        return geography.split(':', 1)[1]
+    return state_mapping[int(geography)]
+
+def geography_table(df, dims, geography='all'):
+    """
+    Sum of weights, sum of squared weights and number of respondents for every
+    combination of dims within a geography. Regions and divisions are the sum of their states' cells in the
+    state x dims cube, so no survey rows are read after the cube is built.
+
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+    dims (list): The integer-coded columns to group by, without 'state'.
+    geography (str or int): 'all', 'region:<name>', 'division:<name>' or a state code.
+
+    Returns:
+    pd.DataFrame: One row per non-empty cell, with the dims columns plus wt, wt2 and respondents.
+    """
+    dims = list(dims)
+    cube = weighted_cube(df, ['state'] + dims)
+    states = geography_states(geography)
+    if states is not None:
+        cube = cube.loc[cube['state'].isin(states)]
+    if states is not None and len(states) == 1:
+        return cube[dims + ['wt', 'wt2', 'respondents']].reset_index(drop=True)
+    return cube.groupby(dims, as_index=False, sort=True)[['wt', 'wt2', 'respondents']].sum()
+
+def year_range(selected_year):
+    """
+    First and last year of a year selection.
+
+    Parameters:
+    selected_year (int or list): A single year or a [first, last] range.
+
+    Returns:
+    tuple: (first, last), equal for a single year.
+    """
+    if isinstance(selected_year, (list, tuple)):
+        return int(min(selected_year)), int(max(selected_year))
+    return int(selected_year), int(selected_year)
+
+def pool_years(cells, dims, selected_year, equal_weight=False):
+    """
+    Pools the per-year cells of a cube over a year range. The weights are divided by the
+    number of years pooled, so frequencies read as an average annual population while
+    percentages are the pooled weighted percentages. With equal_weight, each year's
+    weights are first rescaled to the same total so every year counts equally. The sums
+    of squared weights are rescaled by the square of the same factors.
+
+    Parameters:
+    cells (pd.DataFrame): A cube with a year column, the dims columns, wt, wt2 and respondents.
+    dims (list): The columns to keep, without 'year'.
+    selected_year (int or list): A single year or a [first, last] range.
+    equal_weight (bool): Whether to give each year the same total weight.
+
+    Returns:
+    pd.DataFrame: One row per combination of dims, with wt, wt2 and respondents.
+    """
+    first, last = year_range(selected_year)
+    cells = cells.loc[(cells['year'] >= first) & (cells['year'] <= last)]
+    if first == last:
+        return cells[list(dims) + ['wt', 'wt2', 'respondents']].reset_index(drop=True)
+
+    scale = pd.Series(1 / cells['year'].nunique(), index=cells.index)
+    if equal_weight:
+        year_totals = cells.groupby('year')['wt'].transform('sum')
+        scale = scale * (year_totals.groupby(cells['year']).first().mean() / year_totals)
+    pooled = cells.assign(wt=cells['wt'] * scale, wt2=cells['wt2'] * scale ** 2)
+    return pooled.groupby(list(dims), as_index=False, sort=True)[['wt', 'wt2', 'respondents']].sum()
+
+def state_prevalence_table(df):
+    """
+    Weighted percentage of adults in each state and year answering each code of every
+    variable in population_dropdown_mappings. As in filter_and_prepare_data, the
+    percentage is the code's share of all weights in the state and year, 'Other' (-1)
+    answers included.
+
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+
+    Returns:
+    pd.DataFrame: Columns year, state, variable, code, wt, wt2, respondents, total_wt,
+                  total_respondents and percentage.
+    """
+    def build():
+        tables = []
+        for variable in (option['value'] for option in population_dropdown_mappings):
+            if variable == 'state':
+                continue
+            cube = weighted_cube(df, ['year', 'state', variable]).rename(columns={variable: 'code'})
+            cube.insert(2, 'variable', variable)
+            tables.append(cube)
+
+        table = pd.concat(tables, ignore_index=True)
+        table['variable'] = table['variable'].astype('category')
+        totals = table.groupby(['variable', 'year', 'state'], observed=True)
+        table['total_wt'] = totals['wt'].transform('sum')
+        table['total_respondents'] = totals['respondents'].transform('sum')
+        table['percentage'] = table['wt'] / table['total_wt'] * 100
+        return table
+
+    return cached_table(df, ('state_prevalence',), build)
+
+def state_prevalence(df, variable, code, year=None, age_adjusted=False):
+    """
+    Looks up the state prevalence of one answer from state_prevalence_table, or its
+    age-adjusted counterpart.
+
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+    variable (str): The survey variable (e.g., 'smoking').
+    code (int): The answer code (e.g., 1 for 'Current smoker - now every day').
+    year (int or None): Restricts the result to one year if given.
+    age_adjusted (bool): Whether to age-standardize the prevalence (not for 'age' itself).
+
+    Returns:
+    pd.DataFrame: One row per state (and year), with the prevalence in percentage.
+    """
+    if age_adjusted and variable != 'age':
+        table = cached_table(df, ('state_prevalence_adjusted', variable, AGE_STANDARD), lambda: age_adjusted_percentage(
+            weighted_cube(df, ['year', 'state', 'age', variable]), ['year', 'state'], variable
+        ).rename(columns={variable: 'code'}).assign(variable=variable))
+    else:
+        table = state_prevalence_table(df)
+    rows = (table['variable'] == variable) & (table['code'] == code)
+    if year is not None:
+        rows &= table['year'] == year
+    return table.loc[rows]
+
+def _add_intervals(table, z=1.96):
+    # 95% interval clipped to 0-100, and the reliability flag
+    table['ci_low'] = (table['percentage'] - z * table['se']).clip(lower=0)
+    table['ci_high'] = (table['percentage'] + z * table['se']).clip(upper=100)
+    table['unreliable'] = ((table['group_respondents'] < MIN_RELIABLE_RESPONDENTS)
+                           | (table['se'] > MAX_RELIABLE_RSE * table['percentage'])
+                           | table['se'].isna())
+    return table
+
+def percentage_intervals(cells, groups):
+    """
+    Weighted percentage of each cell within its group, with its standard error,
+    95% confidence interval and a reliability flag. The standard error is the Taylor
+    linearization of the weighted proportion, which for a category only depends on the
+    sums of weights and squared weights of the cell and its group, so it is read from
+    the cube without another pass over the survey rows:
+
+        var(p) = (wt2_cell * (1 - p)^2 + (wt2_group - wt2_cell) * p^2) / wt_group^2 * n / (n - 1)
+
+    Percentages are flagged unreliable when the group has fewer than
+    MIN_RELIABLE_RESPONDENTS respondents or the relative standard error exceeds
+    MAX_RELIABLE_RSE.
+
+    Parameters:
+    cells (pd.DataFrame): Cube cells with the groups columns, wt, wt2 and respondents.
+    groups (list): The columns defining each group (e.g., ['age']).
+
+    Returns:
+    pd.DataFrame: The cells with percentage, se, ci_low, ci_high, group_respondents
+                  and unreliable columns added.
+    """
+    totals = cells.groupby(list(groups))[['wt', 'wt2', 'respondents']].transform('sum')
+    share = cells['wt'] / totals['wt']
+    n = totals['respondents']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variance = ((cells['wt2'] * (1 - share) ** 2 + (totals['wt2'] - cells['wt2']) * share ** 2)
+                    / totals['wt'] ** 2 * (n / (n - 1)).where(n > 1))
+
+    table = cells.assign(percentage=share * 100, se=np.sqrt(variance) * 100, group_respondents=n)
+    return _add_intervals(table)
+
+def age_adjusted_percentage(cells, groups, category, standard=None):
+    """
+    Directly age-standardized percentage of each category within each group. The
+    percentage is computed within every age stratum of the group and the strata are
+    combined with the standard population's weights, renormalized over the strata the
+    group has respondents in. Respondents with an 'Other' (-1) age are left out. The
+    standard error combines the strata's linearized variances with the squared weights.
+
+    Parameters:
+    cells (pd.DataFrame): Cube cells with the groups columns, age, category, wt, wt2 and respondents.
+    groups (list): The columns defining each group (e.g., ['year', 'state']).
+    category (str): The column whose categories are counted (e.g., 'smoking').
+    standard (str or None): A key of age_standard_populations, AGE_STANDARD if None.
+
+    Returns:
+    pd.DataFrame: One row per group and category, with the groups columns, category,
+                  percentage, se, ci_low, ci_high, group_respondents and unreliable.
+    """
+    standard_weights = pd.Series(age_standard_populations[standard or AGE_STANDARD], dtype=np.float64)
+    groups = list(groups)
+
+    cells = cells.loc[cells['age'].isin(standard_weights.index)]
+    strata = percentage_intervals(cells, groups + ['age'])
+
+    # Renormalize the standard over the age strata present in each group
+    present = cells[groups + ['age']].drop_duplicates()
+    present = present.assign(standard=present['age'].map(standard_weights))
+    group_standard = present.groupby(groups)['standard'].sum().rename('group_standard')
+    group_standard = cells[groups].merge(group_standard, left_on=groups, right_index=True, how='left')['group_standard'].to_numpy()
+    share = cells['age'].map(standard_weights).to_numpy() / group_standard
+
+    adjusted = cells[groups + [category]].assign(
+        percentage=strata['percentage'] * share,
+        variance=(strata['se'] * share) ** 2,
+        respondents=cells['respondents'],
+    )
+    adjusted = adjusted.groupby(groups + [category], as_index=False, sort=True)[['percentage', 'variance', 'respondents']].sum()
+    adjusted['se'] = np.sqrt(adjusted['variance'])
+    adjusted['group_respondents'] = adjusted.groupby(groups)['respondents'].transform('sum')
+    return _add_intervals(adjusted.drop(columns=['variance', 'respondents']))
+
+# A variable counts as collected in a year and geography when at least this share of the
+# weighted population gave a valid (not 'Other') answer
+MIN_COLLECTED_SHARE = 0.01
+
+def availability_table(df):
+    """
+    Weighted count of valid answers to every coded survey variable in each year and
+    state, read from the year x state x variable cubes. Callbacks consult it before
+    building a figure, so combinations where a question was not asked return at once.
+
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+
+    Returns:
+    pd.DataFrame: Columns variable, year, state, valid_wt, valid_respondents and total_wt.
+    """
+    def build():
+        tables = []
+        for variable in (column for column, dtype in dtypes.items() if dtype == 'int8' and column != 'state'):
+            cube = weighted_cube(df, ['year', 'state', variable])
+            valid = cube[variable] != -1
+            table = cube.assign(valid_wt=cube['wt'].where(valid, 0.0), valid_respondents=cube['respondents'].where(valid, 0))
+            table = table.groupby(['year', 'state'], as_index=False).agg(
+                valid_wt=('valid_wt', 'sum'), valid_respondents=('valid_respondents', 'sum'), total_wt=('wt', 'sum'))
+            table.insert(0, 'variable', variable)
+            tables.append(table)
+        return pd.concat(tables, ignore_index=True)
+
+    return cached_table(df, ('availability',), build)
+
+def available_years(df, variable, geography='all'):
+    """
+    The years in which a variable was collected in a geography (see MIN_COLLECTED_SHARE),
+    cached per variable and geography.
+
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+    variable (str): The survey variable (e.g., 'aids_test').
+    geography (str or int): 'all', 'region:<name>', 'division:<name>' or a state code.
+
+    Returns:
+    list: The sorted years. State and variables without coded answers (e.g., 'height')
+          get every year.
+    """
+    def build():
+        table = availability_table(df)
+        if variable == 'state' or dtypes.get(variable) != 'int8':
+            return sorted(int(year) for year in table['year'].unique())
+
+        rows = table['variable'] == variable
+        states = geography_states(geography)
+        if states is not None:
+            rows &= table['state'].isin(states)
+        years = table.loc[rows].groupby('year')[['valid_wt', 'total_wt']].sum()
+        return [int(year) for year in years.index[years['valid_wt'] >= MIN_COLLECTED_SHARE * years['total_wt']]]
+
+    return cached_table(df, ('available_years', variable, geography), build)
+
+def variable_available(df, variable, selected_year, geography='all'):
+    """
+    Whether a variable was collected in a geography in any year of a selection.
+
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+    variable (str): The survey variable (e.g., 'aids_test').
+    selected_year (int or list): A single year or a [first, last] range.
+    geography (str or int): 'all', 'region:<name>', 'division:<name>' or a state code.
+
+    Returns:
+    bool: True if at least one year of the selection has the variable.
+    """
+    first, last = year_range(selected_year)
+    return any(first <= year <= last for year in available_years(df, variable, geography))
+
+def continuous_stats_table(df):
+    """
+    Sufficient statistics of the continuous survey columns for every state and year:
+    the sum of weights (<column>_w), weighted sum (<column>_wx) and weighted sum of
+    squares (<column>_wx2) over the respondents with a valid value. Missing values and
+    'Other' (-1) answers are left out. Sums add across states and years, so any
+    roll-up of the table still gives exact weighted means and variances.
+
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+
+    Returns:
+    pd.DataFrame: Columns year and state, then the three sums for each column in state_variable_columns.
+    """
+    def build():
+        cube = weighted_cube(df, ['year', 'state'])
+        year_codes, year_low, year_size = _encode(df, 'year')
+        state_codes, state_low, state_size = _encode(df, 'state')
+        cells = np.ravel_multi_index([year_codes, state_codes], (year_size, state_size))
+        occupied = np.ravel_multi_index([(cube['year'].to_numpy() - year_low).astype(np.intp),
+                                         (cube['state'].to_numpy() - state_low).astype(np.intp)],
+                                        (year_size, state_size))
+
+        table = cube[['year', 'state']].copy()
+        weights = df['wt'].to_numpy()
+        size = year_size * state_size
+        for column in state_variable_columns.values():
+            values = df[column].to_numpy(dtype=np.float64)
+            valid = ~np.isnan(values) & (values != -1)
+            w = np.where(valid, weights, 0.0)
+            x = np.where(valid, values, 0.0)
+            table[f'{column}_w'] = np.bincount(cells, weights=w, minlength=size)[occupied]
+            table[f'{column}_wx'] = np.bincount(cells, weights=w * x, minlength=size)[occupied]
+            table[f'{column}_wx2'] = np.bincount(cells, weights=w * x * x, minlength=size)[occupied]
+        return table
+
+    return cached_table(df, ('continuous_stats',), build)
+
+def continuous_summary(df, column, national=False):
+    """
+    Weighted mean, variance and standard deviation of a continuous column, computed
+    from continuous_stats_table without scanning the survey rows.
+
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+    column (str): One of the columns in state_variable_columns (e.g., 'height').
+    national (bool): If True, rolls the states up into one row per year.
+
+    Returns:
+    pd.DataFrame: Columns year (and state), weight, mean, variance and std.
+    """
+    table = continuous_stats_table(df)
+    keys = ['year'] if national else ['year', 'state']
+    sums = table[keys + [f'{column}_w', f'{column}_wx', f'{column}_wx2']]
+    if national:
+        sums = sums.groupby('year', as_index=False).sum(numeric_only=True).drop(columns='state', errors='ignore')
+
+    w = sums[f'{column}_w'].to_numpy()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = sums[f'{column}_wx'].to_numpy() / w
+        # Clipped at zero, as rounding can leave a tiny negative variance when all values are equal
+        variance = np.clip(sums[f'{column}_wx2'].to_numpy() / w - mean ** 2, 0, None)
+
+    summary = sums[keys].reset_index(drop=True)
+    summary['weight'] = w
+    summary['mean'] = mean
+    summary['variance'] = variance
+    summary['std'] = np.sqrt(variance)
+    return summary[summary['weight'] > 0].reset_index(drop=True)
+
+def kpi_table(df):
+    """
+    The overview KPI card values for every state and year, computed in one pass from
+    the cached cubes: population, average age, employment rate and median household
+    income.
+
+    The employment rate is the share of employed respondents among the employed and
+    unemployed (unweighted). The median income is interpolated linearly inside the
+    income bracket holding half of the weight, with 'Other' (-1) left out.
+
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+
+    Returns:
+    pd.DataFrame: Columns year, state, population, avg_age, employment_rate and median_income.
+    """
+    def build():
+        table = state_year_table(df)[['year', 'state', 'population']]
+
+        ages = continuous_summary(df, 'age_midpoint')[['year', 'state', 'mean']].rename(columns={'mean': 'avg_age'})
+
+        employment = weighted_cube(df, ['year', 'state', 'employment'])
+        employment = employment.pivot_table(index=['year', 'state'], columns='employment', values='respondents', aggfunc='sum', fill_value=0)
+        employed = employment.get(1, 0)
+        unemployed = employment.get(2, 0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            employment_rate = (employed / (employed + unemployed) * 100).rename('employment_rate').reset_index()
+
+        income = weighted_cube(df, ['year', 'state', 'income'])
+        income = income.loc[income['income'] != -1].sort_values(['year', 'state', 'income'])
+        cumulative = income.groupby(['year', 'state'])['wt'].cumsum()
+        half = income.groupby(['year', 'state'])['wt'].transform('sum') / 2
+        # The median bracket is the one where the cumulative weight first reaches half
+        median_rows = (cumulative >= half) & (cumulative - income['wt'] < half)
+        bracket = income.loc[median_rows]
+        lower = bracket['income'].map(lambda code: income_bracket_bounds[code][0])
+        upper = bracket['income'].map(lambda code: income_bracket_bounds[code][1])
+        share = (half[median_rows] - (cumulative[median_rows] - bracket['wt'])) / bracket['wt']
+        median_income = bracket[['year', 'state']].assign(median_income=lower + share * (upper - lower))
+
+        for part in (ages, employment_rate, median_income):
+            table = table.merge(part, on=['year', 'state'], how='left')
+        return table
+
+    return cached_table(df, ('kpi',), build)
+
+def state_metrics_table(df):
+    """
+    Every metric in ranking_metric_mappings for every state and year, with a percentile
+    rank (0-100, within the year) for each. Built from kpi_table, the continuous
+    sufficient statistics and the year x state x variable cubes, so sorting or
+    ranking states never reads the survey rows.
+
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+
+    Returns:
+    pd.DataFrame: Columns year, state, then each metric and its <metric>_pct rank.
+    """
+    def build():
+        table = kpi_table(df)
+        for metric, column in (('avg_height', 'height'), ('avg_weight', 'weight')):
+            means = continuous_summary(df, column)[['year', 'state', 'mean']].rename(columns={'mean': metric})
+            table = table.merge(means, on=['year', 'state'], how='left')
+
+        for metric in ranking_metric_mappings:
+            if 'variable' not in metric:
+                continue
+            cube = weighted_cube(df, ['year', 'state', metric['variable']])
+            cube = cube.loc[cube[metric['variable']] != -1]
+            in_metric = cube['wt'].where(cube[metric['variable']].isin(metric['codes']), 0.0)
+            sums = cube[['year', 'state']].assign(numerator=in_metric, denominator=cube['wt'])
+            sums = sums.groupby(['year', 'state'], as_index=False)[['numerator', 'denominator']].sum()
+            sums[metric['value']] = sums['numerator'] / sums['denominator'] * 100
+            table = table.merge(sums[['year', 'state', metric['value']]], on=['year', 'state'], how='left')
+
+        metrics = [metric['value'] for metric in ranking_metric_mappings]
+        ranks = table.groupby('year')[metrics].rank(pct=True) * 100
+        return pd.concat([table, ranks.add_suffix('_pct')], axis=1)
+
+    return cached_table(df, ('state_metrics',), build)
+
+def association_matrix(df, year):
+    """
+    Weighted Cramér's V between every pair of variables in population_dropdown_mappings
+    for one year. Each pair's weighted contingency table is one np.bincount over the
+    year's rows, with 'Other' (-1) answers left out of the pair. Cached per year.
+
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+    year (int): The survey year.
+
+    Returns:
+    pd.DataFrame: A symmetric variables x variables matrix of values between 0 and 1,
+                  with NaN where a pair has fewer than two answers on either side.
+    """
+    def build():
+        variables = [option['value'] for option in population_dropdown_mappings]
+        rows = (df['year'] == year).to_numpy()
+        weights = df['wt'].to_numpy()[rows]
+
+        codes, sizes, valid = {}, {}, {}
+        for variable in variables:
+            values = df[variable].to_numpy()[rows]
+            valid[variable] = values != -1
+            categories, codes[variable] = np.unique(values, return_inverse=True)
+            sizes[variable] = len(categories)
+
+        matrix = pd.DataFrame(np.eye(len(variables)), index=variables, columns=variables)
+        for i, first in enumerate(variables):
+            for second in variables[i + 1:]:
+                keep = valid[first] & valid[second]
+                cells = codes[first][keep] * sizes[second] + codes[second][keep]
+                table = np.bincount(cells, weights=weights[keep], minlength=sizes[first] * sizes[second])
+                table = table.reshape(sizes[first], sizes[second])
+                # Answers nobody gave in this pairing (e.g., the -1 code) drop out of the table
+                table = table[table.sum(axis=1) > 0][:, table.sum(axis=0) > 0]
+
+                total = table.sum()
+                if min(table.shape) < 2 or total == 0:
+                    value = np.nan
+                else:
+                    expected = np.outer(table.sum(axis=1), table.sum(axis=0)) / total
+                    chi_square = ((table - expected) ** 2 / expected).sum()
+                    value = np.sqrt(chi_square / (total * (min(table.shape) - 1)))
+                matrix.loc[first, second] = matrix.loc[second, first] = value
+        return matrix
+
+    return cached_table(df, ('association', year), build)
+
+def state_profiles(df, year, variables):
+    """
+    State x feature matrix of health profiles for one year: the weighted share of each
+    state's valid answers to every variable given to each answer code, read from
+    state_prevalence_table. 'Other' (-1) answers are left out of the shares. States
+    missing more than half the features, and features still missing in a state, are
+    dropped.
+
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+    year (int): The survey year.
+    variables (list): The survey variables whose answers make up the features.
+
+    Returns:
+    pd.DataFrame: Percentages indexed by state code, with (variable, code) columns.
+    """
+    table = state_prevalence_table(df)
+    rows = table.loc[(table['year'] == year) & table['variable'].isin(variables) & (table['code'] != -1),
+                     ['state', 'variable', 'code', 'wt']]
+    rows = rows.assign(variable=rows['variable'].astype(str))
+    valid = rows.groupby(['state', 'variable'])['wt'].transform('sum')
+    profiles = rows.assign(share=rows['wt'] / valid * 100).pivot_table(
+        index='state', columns=['variable', 'code'], values='share', aggfunc='sum')
+
+    # Codes nobody gave in a state that answered the question are 0%, not missing
+    answered = rows.groupby(['state', 'variable'])['wt'].sum().unstack()
+    answered = answered.reindex(index=profiles.index, columns=profiles.columns.get_level_values('variable')) > 0
+    profiles = profiles.where(~(profiles.isna() & answered.to_numpy()), 0.0)
+
+    profiles = profiles.loc[profiles.notna().mean(axis=1) > 0.5]
+    return profiles.dropna(axis=1)
+
+def average_linkage(distances):
+    """
+    Agglomerative clustering with average linkage (UPGMA): the two closest clusters
+    are merged until one is left, the distance between clusters being the mean
+    distance between their members.
+
+    Parameters:
+    distances (np.ndarray): Symmetric matrix of pairwise distances.
+
+    Returns:
+    tuple: The merges, one (first, second) pair of item positions per step such that
+           their clusters are joined, and the leaf order, in which every cluster's
+           members are contiguous.
+    """
+    n = len(distances)
+    matrix = np.array(distances, dtype=np.float64)
+    np.fill_diagonal(matrix, np.inf)
+    sizes = np.ones(n)
+    members = [[index] for index in range(n)]
+    active = np.ones(n, dtype=bool)
+    merges = []
+
+    for _ in range(n - 1):
+        masked = np.where(active[:, None] & active[None, :], matrix, np.inf)
+        first, second = np.unravel_index(np.argmin(masked), masked.shape)
+        first, second = min(first, second), max(first, second)
+        merges.append((members[first][0], members[second][0]))
+
+        # Lance-Williams update: the merged cluster keeps the first slot
+        merged = (sizes[first] * matrix[first] + sizes[second] * matrix[second]) / (sizes[first] + sizes[second])
+        matrix[first], matrix[:, first] = merged, merged
+        matrix[first, first] = np.inf
+        sizes[first] += sizes[second]
+        members[first] = members[first] + members[second]
+        active[second] = False
+
+    return merges, members[int(np.flatnonzero(active)[0])] if n else []
+
+def state_similarity(df, year, variables):
+    """
+    Pairwise distances between the states' health profiles (see state_profiles) and
+    their average linkage clustering. Each feature is standardized across states, and
+    the distance is the root mean square difference of the standardized features.
+    Cached per year and variable selection.
+
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+    year (int): The survey year.
+    variables (list): The survey variables whose answers make up the features.
+
+    Returns:
+    dict: states (state codes), distances (states x states array), merges and leaves
+          (see average_linkage) and features (number of features used).
+    """
+    variables = sorted(variables)
+
+    def build():
+        profiles = state_profiles(df, year, variables)
+        values = profiles.to_numpy()
+        spread = values.std(axis=0)
+        values = values[:, spread > 0]
+        values = (values - values.mean(axis=0)) / values.std(axis=0)
+
+        # All pairs at once from the Gram matrix
+        squared = (values ** 2).sum(axis=1)
+        distances = np.sqrt(np.clip(squared[:, None] + squared[None, :] - 2 * values @ values.T, 0, None) / max(values.shape[1], 1))
+        np.fill_diagonal(distances, 0)
+        merges, leaves = average_linkage(distances)
+        return {
+            'states': profiles.index.to_numpy(),
+            'distances': distances,
+            'merges': merges,
+            'leaves': leaves,
+            'features': values.shape[1],
+        }
+
+    return cached_table(df, ('state_similarity', year) + tuple(variables), build)
+
+def state_clusters(similarity, clusters):
+    """
+    Cuts the clustering of state_similarity into a number of clusters, by replaying
+    all but the last clusters - 1 merges.
+
+    Parameters:
+    similarity (dict): The result of state_similarity.
+    clusters (int): The number of clusters.
+
+    Returns:
+    pd.DataFrame: Columns state and cluster, numbered from 1 in leaf order.
+    """
+    n = len(similarity['states'])
+    parent = list(range(n))
+
+    def root(index):
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    for first, second in similarity['merges'][:max(n - clusters, 0)]:
+        parent[root(second)] = root(first)
+
+    numbers = {}
+    for leaf in similarity['leaves']:
+        numbers.setdefault(root(leaf), len(numbers) + 1)
+    return pd.DataFrame({
+        'state': similarity['states'],
+        'cluster': [numbers[root(index)] for index in range(n)],
+    })
+
+# Bins along each axis of the height x weight density grid, and the deepest zoom level
+# (each level halves the bin width)
+DENSITY_BINS = 80
+_MAX_DENSITY_ZOOM = 6
+
+def _density_points(df):
+    # Respondents with a valid height and weight, read from the survey once
+    def build():
+        heights = df['height'].to_numpy(dtype=np.float64)
+        weights = df['weight'].to_numpy(dtype=np.float64)
+        rows = np.flatnonzero(np.isfinite(heights) & np.isfinite(weights) & (heights != -1) & (weights != -1))
+        return {
+            'rows': rows,
+            'x': heights[rows],
+            'y': weights[rows],
+            'wt': df['wt'].to_numpy(dtype=np.float64)[rows],
+            'year': df['year'].to_numpy()[rows],
+        }
+
+    return cached_table(df, ('density_points',), build)
+
+def _density_axis(low, high, view, bins):
+    """
+    Snaps a zoom window on one axis to the bin grid of its zoom level. Each level halves
+    the bin width, and the level is the one giving between bins / 2 and bins bins in the
+    window, so every window is a slice of one of a handful of grids that can be cached.
+
+    Returns:
+    tuple: (level, first bin, last bin + 1, bin width), bins counted from low.
+    """
+    span = high - low
+    if view is None:
+        return 0, 0, bins, span / bins
+    start, stop = max(min(view), low), min(max(view), high)
+    if stop <= start:
+        return 0, 0, bins, span / bins
+    level = int(np.clip(np.floor(np.log2(span / (stop - start))), 0, _MAX_DENSITY_ZOOM))
+    width = span / (bins * 2 ** level)
+    first = int(np.floor((start - low) / width))
+    last = int(np.ceil((stop - low) / width))
+    return level, first, max(last, first + 1), width
+
+def _density_bins(df, first, last, variable, code, x_level, y_level, bins):
+    """
+    Occupied bins of the full-extent height x weight grid at one zoom level per axis,
+    for a year range and filter. Only the occupied bins are kept, so the deepest levels
+    cost no more than the respondents they hold. Cached per year range, filter and
+    pair of levels, which bounds the cache however the user pans.
+
+    Returns:
+    tuple: The flat bin index (y bin * x bins + x bin) of each occupied bin in
+           increasing order, its weight summed over the years, and the number of x bins.
+    """
+    def build():
+        points = _density_points(df)
+        x_low, x_high = points['x'].min(), points['x'].max()
+        y_low, y_high = points['y'].min(), points['y'].max()
+        nx, ny = bins * 2 ** x_level, bins * 2 ** y_level
+        keep = (points['year'] >= first) & (points['year'] <= last)
+        if variable is not None:
+            keep &= df[variable].to_numpy()[points['rows']] == code
+        # Zero-based bin of each point, with the top edge counted in the last bin
+        x_bins = np.minimum(((points['x'][keep] - x_low) / ((x_high - x_low) / nx)).astype(np.int64), nx - 1)
+        y_bins = np.minimum(((points['y'][keep] - y_low) / ((y_high - y_low) / ny)).astype(np.int64), ny - 1)
+        keys, inverse = np.unique(y_bins * nx + x_bins, return_inverse=True)
+        return keys, np.bincount(inverse, weights=points['wt'][keep], minlength=len(keys)), nx
+
+    return cached_table(df, ('density_bins', first, last, variable, code, x_level, y_level, bins), build)
+
+def density_grid(df, selected_year, variable=None, code=None, x_range=None, y_range=None, bins=DENSITY_BINS):
+    """
+    Weighted 2-D histogram of height (x) by weight (y). A zoom window is snapped to its
+    zoom level's bin grid (see _density_axis), so zooming in re-bins at a finer width.
+    The occupied bins of each zoom level's full-extent grid are cached per filter (see
+    _density_bins), and every window, including every pan, is sliced out of them.
+    Pooled years give average annual populations, as in pool_years.
+
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+    selected_year (int or list): A single year or a [first, last] range.
+    variable (str or None): Optional survey variable to filter on (e.g., 'sex').
+    code (int or None): The variable's answer code to keep.
+    x_range, y_range (list or None): The zoomed [low, high] of each axis, None for the full extent.
+    bins (int): Number of bins along each axis at the top zoom level.
+
+    Returns:
+    pd.DataFrame: The weighted population in each bin, indexed by the weight bin centres
+                  with the height bin centres as columns.
+    """
+    first, last = year_range(selected_year)
+    points = _density_points(df)
+    x_low, x_high = points['x'].min(), points['x'].max()
+    y_low, y_high = points['y'].min(), points['y'].max()
+    x_level, x_first, x_last, x_width = _density_axis(x_low, x_high, x_range, bins)
+    y_level, y_first, y_last, y_width = _density_axis(y_low, y_high, y_range, bins)
+    if variable is None or code is None:
+        variable, code = None, None
+
+    keys, weights, full_nx = _density_bins(df, first, last, variable, code, x_level, y_level, bins)
+    # The window's rows of bins are one contiguous run of the sorted keys
+    start, stop = np.searchsorted(keys, [y_first * full_nx, y_last * full_nx])
+    y_bins, x_bins = np.divmod(keys[start:stop], full_nx)
+    inside = (x_bins >= x_first) & (x_bins < x_last)
+
+    nx, ny = x_last - x_first, y_last - y_first
+    grid = np.bincount((y_bins[inside] - y_first) * nx + x_bins[inside] - x_first, weights=weights[start:stop][inside], minlength=nx * ny)
+    x_centres = x_low + (np.arange(x_first, x_last) + 0.5) * x_width
+    y_centres = y_low + (np.arange(y_first, y_last) + 0.5) * y_width
+    return pd.DataFrame(grid.reshape(ny, nx) / (last - first + 1), index=y_centres, columns=x_centres)
+
+# Continuous measures with quantile sketches, and the spacing of their fixed bins. Survey
+# weights are heavily skewed, so their bins are spaced evenly on a log scale.
+_sketch_spacing = {'height': 'linear', 'weight': 'linear', 'bmi': 'linear', 'wt': 'log'}
+SKETCH_BINS = 512
+
+def _measure_values(df, measure):
+    # Values of a sketched measure, NaN where missing or 'Other' (-1); BMI is derived
+    if measure == 'bmi':
+        height = df['height'].to_numpy(dtype=np.float64)
+        weight = df['weight'].to_numpy(dtype=np.float64)
+        valid = (height > 0) & (weight > 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(valid, weight / height ** 2, np.nan)
+    values = df[measure].to_numpy(dtype=np.float64)
+    return np.where(values == -1, np.nan, values)
+
+def _sketch_edges(df, measure):
+    # Bin edges shared by every partition of a measure, so sketches merge bin by bin
+    def build():
+        values = _measure_values(df, measure)
+        values = values[np.isfinite(values)]
+        if _sketch_spacing[measure] == 'log':
+            return np.geomspace(values.min(), values.max(), SKETCH_BINS + 1)
+        return np.linspace(values.min(), values.max(), SKETCH_BINS + 1)
+
+    return cached_table(df, ('sketch_edges', measure), build)
+
+def quantile_sketch(df, measure, dims):
+    """
+    Fixed-bin histogram sketch of a continuous measure for every combination of the
+    given columns: the sum of weights and number of respondents in each of the
+    measure's SKETCH_BINS bins. Every partition shares the same bin edges, so the
+    sketches of any group of partitions merge by adding them bin by bin. Only occupied
+    bins are stored, and the sketch is built in one pass and cached.
+
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+    measure (str): 'height', 'weight', 'bmi' (derived from both) or 'wt'.
+    dims (list): The integer-coded columns partitioning the survey (e.g., ['year', 'state', 'sex']).
+
+    Returns:
+    pd.DataFrame: One row per occupied partition and bin, with the dims columns, bin
+                  (index into the bins), wt and respondents.
+    """
+    dims = list(dims)
+
+    def build():
+        values = _measure_values(df, measure)
+        valid = np.isfinite(values)
+        edges = _sketch_edges(df, measure)
+        bins = np.clip(np.searchsorted(edges, values[valid], side='right') - 1, 0, SKETCH_BINS - 1)
+
+        encoded = [_encode(df, dim) for dim in dims]
+        shape = tuple(size for _, _, size in encoded) + (SKETCH_BINS,)
+        cells = np.ravel_multi_index([codes[valid] for codes, _, _ in encoded] + [bins], shape)
+        occupied, cells = np.unique(cells, return_inverse=True)
+        positions = np.unravel_index(occupied, shape)
+
+        sketch = pd.DataFrame({dim: (position + low).astype(df[dim].dtype)
+                               for dim, position, (_, low, _) in zip(dims, positions, encoded)})
+        sketch['bin'] = positions[-1].astype(np.int16)
+        sketch['wt'] = np.bincount(cells, weights=df['wt'].to_numpy(dtype=np.float64)[valid])
+        sketch['respondents'] = np.bincount(cells)
+        return sketch
+
+    return cached_table(df, ('quantile_sketch', measure) + tuple(dims), build)
+
+def weighted_quantiles(df, measure, selected_year, by=None, geography='all', quantiles=(0.05, 0.25, 0.5, 0.75, 0.95)):
+    """
+    Weighted quantiles of a continuous measure for each group, from the merged
+    quantile sketches of the group's states and years instead of the survey rows.
+    Within a bin, values are interpolated linearly, so quantiles are exact to within
+    one bin width. Quantiles of the survey weight itself count respondents rather than
+    weights, describing how the weights are spread over the sample.
+
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+    measure (str): 'height', 'weight', 'bmi' or 'wt'.
+    selected_year (int or list): A single year or a [first, last] range.
+    by (str or None): The survey variable to group by (e.g., 'sex', 'state'), None for one group.
+    geography (str or int): 'all', 'region:<name>', 'division:<name>' or a state code.
+    quantiles (tuple): The quantiles to compute, between 0 and 1.
+
+    Returns:
+    pd.DataFrame: One row per group, with the by column, a p<percent> column for each
+                  quantile (e.g., p50) and respondents.
+    """
+    dims = ['year', 'state'] + ([by] if by not in (None, 'year', 'state') else [])
+    sketch = quantile_sketch(df, measure, dims)
+    first, last = year_range(selected_year)
+    rows = (sketch['year'] >= first) & (sketch['year'] <= last)
+    states = geography_states(geography)
+    if states is not None:
+        rows &= sketch['state'].isin(states)
+    sketch = sketch.loc[rows]
+
+    groups = [by] if by is not None else []
+    weight = 'respondents' if measure == 'wt' else 'wt'
+    if groups:
+        keys, group_codes = np.unique(sketch[by].to_numpy(), return_inverse=True)
+    else:
+        keys, group_codes = np.array([0]), np.zeros(len(sketch), dtype=np.intp)
+
+    # Merge the partitions' sketches into one dense histogram per group
+    histogram = np.zeros((len(keys), SKETCH_BINS))
+    np.add.at(histogram, (group_codes, sketch['bin'].to_numpy()), sketch[weight].to_numpy(dtype=np.float64))
+    respondents = np.bincount(group_codes, weights=sketch['respondents'].to_numpy(), minlength=len(keys))
+
+    edges = _sketch_edges(df, measure)
+    cumulative = np.cumsum(histogram, axis=1)
+    totals = cumulative[:, -1]
+    table = pd.DataFrame({by: keys}) if groups else pd.DataFrame(index=[0])
+    for quantile in quantiles:
+        target = quantile * totals
+        # First bin where the cumulative weight reaches the target, then interpolate inside it
+        index = np.argmax(cumulative >= target[:, None], axis=1)
+        below = np.where(index > 0, cumulative[np.arange(len(keys)), index - 1], 0.0)
+        inside = histogram[np.arange(len(keys)), index]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            share = np.where(inside > 0, (target - below) / inside, 0.0)
+        values = edges[index] + share * (edges[index + 1] - edges[index])
+        table[f'p{round(quantile * 100)}'] = np.where(totals > 0, values, np.nan)
+    table['respondents'] = respondents.astype(np.int64)
+    return table.reset_index(drop=True)
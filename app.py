@@ -3,7 +3,11 @@ import dash_bootstrap_components as dbc
 from pyngrok import ngrok
 
 print('Initializing app')
-app = Dash(__name__, use_pages=True, external_stylesheets=[dbc.themes.SLATE])
+app = Dash(__name__, use_pages=True, external_stylesheets=[dbc.themes.SLATE], compress=True)
+
+# Compress responses, including _dash-update-component figure payloads, with brotli
+# where the browser supports it and gzip otherwise
+app.server.config.update(COMPRESS_ALGORITHM=['br', 'gzip'], COMPRESS_MIN_SIZE=500)
 
 navbar = dbc.Navbar(
     dbc.Container(
@@ -16,6 +20,12 @@ navbar = dbc.Navbar(
                     dbc.NavItem(dbc.NavLink("Demographics", href="/demographics")),
                     dbc.NavItem(dbc.NavLink("Lifestyle", href="/lifestyle")),
                     dbc.NavItem(dbc.NavLink("Health Conditions", href="/health_conditions")),
+                    dbc.NavItem(dbc.NavLink("State Rankings", href="/rankings")),
+                    dbc.NavItem(dbc.NavLink("Biggest Movers", href="/movers")),
+                    dbc.NavItem(dbc.NavLink("Associations", href="/associations")),
+                    dbc.NavItem(dbc.NavLink("Height & Weight", href="/body_measures")),
+                    dbc.NavItem(dbc.NavLink("Trends", href="/trends")),
+                    dbc.NavItem(dbc.NavLink("State Similarity", href="/similarity")),
                     dbc.NavItem(dbc.NavLink("CDC BRFSS Website", href="https://www.cdc.gov/brfss/annual_data/annual_data.htm", target="_blank")),
                     dbc.DropdownMenu(
                         children=[
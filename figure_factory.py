@@ -0,0 +1,887 @@
+import base64
+import hashlib
+import json
+import os
+import zlib
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.io as pio
+from dash import Patch
+from plotly.utils import PlotlyJSONEncoder
+
+# Builds Plotly figures as plain dictionaries straight from aggregated columns.
+# Dash serialises these as they are, so none of the plotly.express grouping or
+# graph_objects validation runs on the request path. The output matches what
+# the equivalent px.bar / px.area / px.choropleth call plus update_layout gave.
+
+# Named templates are resolved to dictionaries once, plotly.js only understands the expanded form
+_templates = {}
+
+# Set TRANSPORT_REPORT=1 to print how many bytes compact_figures saves per callback
+TRANSPORT_REPORT = os.environ.get('TRANSPORT_REPORT', '0') == '1'
+
+def get_template(name):
+    if name not in _templates:
+        _templates[name] = pio.templates[name].to_plotly_json()
+    return _templates[name]
+
+def merge_layout(layout, updates):
+    """
+    Recursively merges nested layout updates into a layout dictionary, in place.
+    Template names are expanded to their dictionaries.
+    """
+    for key, value in updates.items():
+        if key == 'template' and isinstance(value, str):
+            value = get_template(value)
+        if isinstance(value, dict) and isinstance(layout.get(key), dict) and key != 'template':
+            merge_layout(layout[key], value)
+        else:
+            layout[key] = value
+    return layout
+
+def _values(column):
+    # Numbers stay as arrays, labels become lists of Python strings
+    values = column.to_numpy() if isinstance(column, pd.Series) else np.asarray(column)
+    if values.dtype.kind in 'iuf':
+        return values
+    return [None if pd.isna(value) else value for value in values]
+
+def _base_layout(title, x_title, y_title, legend_title=None):
+    layout = {
+        'template': get_template(pio.templates.default),
+        'xaxis': {'anchor': 'y', 'domain': [0.0, 1.0], 'title': {'text': x_title}},
+        'yaxis': {'anchor': 'x', 'domain': [0.0, 1.0], 'title': {'text': y_title}},
+        'legend': {'tracegroupgap': 0},
+        'title': {'text': title},
+    }
+    if legend_title is not None:
+        layout['legend']['title'] = {'text': legend_title}
+    return layout
+
+def _hovertemplate(fields):
+    # Fields sharing a display name keep the first position but show the last value, as in plotly.express
+    entries = {}
+    for name, value in fields:
+        entries[name] = value
+    return '<br>'.join(f'{name}={value}' for name, value in entries.items()) + '<extra></extra>'
+
+def _split_by_color(plot_df, color):
+    """
+    Yields (category, row positions) for each colour category in order of first appearance,
+    which is the order plotly.express creates its traces in.
+    """
+    codes, categories = pd.factorize(plot_df[color])
+    for index, category in enumerate(categories):
+        yield category, np.flatnonzero(codes == index)
+
+def _bar_trace(plot_df, rows, category, colour, x, y, color, label, text, texttemplate, barmode,
+               interval, error_bars, hatch, axis=''):
+    # One colour category's bars, on the x<axis> / y<axis> pair of subplot axes
+    hover_fields = [(label(color), category), (label(x), '%{x}'), (label(y), '%{y}')]
+    trace = {
+        'type': 'bar',
+        'name': category,
+        'legendgroup': category,
+        'orientation': 'v',
+        'showlegend': True,
+        'marker': {'color': colour},
+        'x': _values(plot_df[x].iloc[rows]),
+        'y': _values(plot_df[y].iloc[rows]),
+        'xaxis': f'x{axis}',
+        'yaxis': f'y{axis}',
+    }
+    if barmode == 'group':
+        trace['alignmentgroup'] = 'True'
+        trace['offsetgroup'] = category
+    if text is not None:
+        trace['text'] = _values(plot_df[text].iloc[rows])
+        trace['textposition'] = 'auto'
+        hover_fields.append((label(text), texttemplate if texttemplate and '%{text' in texttemplate else '%{text}'))
+    if texttemplate is not None:
+        trace['texttemplate'] = texttemplate
+    if interval is not None:
+        heights = plot_df[y].iloc[rows].to_numpy()
+        low, high = (plot_df[column].iloc[rows].to_numpy() for column in interval)
+        trace['customdata'] = np.column_stack([low, high])
+        hover_fields.append(('95% CI', '%{customdata[0]:.1f} - %{customdata[1]:.1f}'))
+        if error_bars:
+            trace['error_y'] = {
+                'type': 'data',
+                'symmetric': False,
+                'array': high - heights,
+                'arrayminus': heights - low,
+                'thickness': 1,
+                'width': 2,
+                'color': 'gray',
+            }
+    if hatch is not None:
+        trace['marker']['pattern'] = {'shape': ['/' if flag else '' for flag in plot_df[hatch].iloc[rows]]}
+    trace['hovertemplate'] = _hovertemplate(hover_fields)
+    return trace
+
+def bar_figure(plot_df, x, y, color, text=None, barmode='relative', title=None, labels=None,
+               color_discrete_sequence=None, layout=None, texttemplate=None, interval=None,
+               error_bars=True, hatch=None):
+    """
+    Equivalent of px.bar with a categorical colour column: one bar trace per colour category.
+
+    Parameters:
+    plot_df (pd.DataFrame): The aggregated data to plot.
+    x, y, color, text (str): Columns holding the bar positions, heights, colour categories and bar labels.
+    barmode (str): 'group', 'stack' or 'relative'.
+    title (str): The figure title.
+    labels (dict): Display names for the columns, used in axis, legend and hover labels.
+    color_discrete_sequence (list): Colours assigned to the categories in order.
+    layout (dict): Nested layout updates applied on top of the defaults.
+    texttemplate (str): Formats the bar labels in the browser (e.g. '%{text:.2f}M'), so numbers
+                        can be sent instead of one preformatted string per bar.
+    interval (tuple): Columns holding the lower and upper bounds of a confidence interval
+                      around y, shown in the hover label.
+    error_bars (bool): Whether to also draw the interval as error bars.
+    hatch (str): Boolean column; bars where it is True are hatched (e.g. unreliable estimates).
+
+    Returns:
+    dict: A figure dictionary that can be returned from a callback as it is.
+    """
+    labels = labels or {}
+    colors = color_discrete_sequence or px.colors.qualitative.Plotly
+    label = lambda column: labels.get(column, column)
+
+    data = []
+    for index, (category, rows) in enumerate(_split_by_color(plot_df, color)):
+        data.append(_bar_trace(plot_df, rows, category, colors[index % len(colors)], x, y, color, label, text, texttemplate,
+                               barmode, interval, error_bars, hatch))
+
+    figure_layout = _base_layout(title, label(x), label(y), legend_title=label(color))
+    figure_layout['barmode'] = barmode
+    merge_layout(figure_layout, layout or {})
+
+    return {'data': data, 'layout': figure_layout}
+
+def facet_bar_figure(plot_df, facet, x, y, color, facet_titles, columns=2, text=None, barmode='relative',
+                     title=None, labels=None, color_discrete_sequence=None, layout=None, texttemplate=None,
+                     interval=None, error_bars=True, hatch=None):
+    """
+    Small multiples of bar_figure: one subplot per facet value, laid out in a grid and
+    sharing the y-axis, with each colour category keeping one colour and legend entry
+    across the subplots.
+
+    Parameters:
+    plot_df (pd.DataFrame): The aggregated data to plot.
+    facet (str): Column holding the facet of each row.
+    x, y, color (str): As in bar_figure; the x categories may differ between facets.
+    facet_titles (dict): Subplot title of each facet value, in display order.
+    columns (int): Number of subplots per row.
+    Other parameters are as in bar_figure.
+
+    Returns:
+    dict: A figure dictionary.
+    """
+    labels = labels or {}
+    colors = color_discrete_sequence or px.colors.qualitative.Plotly
+    label = lambda column: labels.get(column, column)
+
+    facets = list(facet_titles)
+    columns = max(1, min(columns, len(facets)))
+    rows_count = -(-len(facets) // columns)
+    categories = list(pd.unique(plot_df[color]))
+    gap_x, gap_y = 0.06, 0.12
+
+    data = []
+    shown = set()
+    figure_layout = _base_layout(title, None, None, legend_title=label(color))
+    figure_layout['barmode'] = barmode
+    figure_layout['annotations'] = []
+    for position, value in enumerate(facets):
+        axis = '' if position == 0 else str(position + 1)
+        column, row = position % columns, position // columns
+        x_domain = [column / columns + (gap_x / 2 if column else 0), (column + 1) / columns - (gap_x / 2 if column < columns - 1 else 0)]
+        y_domain = [1 - (row + 1) / rows_count + (gap_y / 2 if row < rows_count - 1 else 0), 1 - row / rows_count - (gap_y / 2 if row else 0)]
+        figure_layout[f'xaxis{axis}'] = {'anchor': f'y{axis}', 'domain': x_domain, 'title': {'text': None}}
+        figure_layout[f'yaxis{axis}'] = {'anchor': f'x{axis}', 'domain': y_domain,
+                                         'title': {'text': label(y) if column == 0 else None}}
+        if position:
+            figure_layout[f'yaxis{axis}']['matches'] = 'y'
+        figure_layout['annotations'].append({
+            'text': facet_titles[value], 'xref': 'paper', 'yref': 'paper', 'showarrow': False,
+            'x': sum(x_domain) / 2, 'y': y_domain[1], 'xanchor': 'center', 'yanchor': 'bottom',
+        })
+
+        in_facet = (plot_df[facet] == value).to_numpy()
+        for index, category in enumerate(categories):
+            rows = np.flatnonzero(in_facet & (plot_df[color] == category).to_numpy())
+            if rows.size == 0:
+                continue
+            trace = _bar_trace(plot_df, rows, category, colors[index % len(colors)], x, y, color, label, text, texttemplate,
+                               barmode, interval, error_bars, hatch, axis=axis)
+            trace['showlegend'] = category not in shown
+            shown.add(category)
+            data.append(trace)
+
+    merge_layout(figure_layout, layout or {})
+
+    return {'data': data, 'layout': figure_layout}
+
+def continuous_bar_figure(plot_df, x, y, text=None, title=None, labels=None, color_continuous_scale=None,
+                          template=None, layout=None):
+    """
+    Equivalent of px.bar coloured by its own y values on a continuous colour axis.
+
+    Parameters:
+    plot_df (pd.DataFrame): The aggregated data to plot.
+    x, y, text (str): Columns holding the bar positions, heights and bar labels.
+    title (str): The figure title.
+    labels (dict): Display names for the columns.
+    color_continuous_scale (list): Colours of the scale, evenly spaced.
+    template (str): Name of the template to use instead of the default one.
+    layout (dict): Nested layout updates applied on top of the defaults.
+
+    Returns:
+    dict: A figure dictionary.
+    """
+    labels = labels or {}
+    scale = color_continuous_scale or px.colors.sequential.Plasma
+    label = lambda column: labels.get(column, column)
+
+    trace = {
+        'type': 'bar',
+        'name': '',
+        'legendgroup': '',
+        'orientation': 'v',
+        'showlegend': False,
+        'marker': {'color': _values(plot_df[y]), 'coloraxis': 'coloraxis'},
+        'x': _values(plot_df[x]),
+        'y': _values(plot_df[y]),
+        'xaxis': 'x',
+        'yaxis': 'y',
+    }
+    hover_fields = [(label(x), '%{x}'), (label(y), '%{y}')]
+    if text is not None:
+        trace['text'] = _values(plot_df[text])
+        trace['textposition'] = 'auto'
+        hover_fields.append((label(text), '%{text}'))
+    trace['hovertemplate'] = _hovertemplate(hover_fields)
+
+    figure_layout = _base_layout(title, label(x), label(y))
+    figure_layout['barmode'] = 'relative'
+    figure_layout['coloraxis'] = {
+        'colorbar': {'title': {'text': label(y)}},
+        'colorscale': [[index / (len(scale) - 1), colour] for index, colour in enumerate(scale)],
+        'autocolorscale': False,
+    }
+    if template is not None:
+        figure_layout['template'] = get_template(template)
+    merge_layout(figure_layout, layout or {})
+
+    return {'data': [trace], 'layout': figure_layout}
+
+def area_figure(plot_df, x, y, color, title=None, labels=None, color_discrete_sequence=None, layout=None):
+    """
+    Equivalent of px.area: one stacked line trace per colour category.
+
+    Parameters:
+    plot_df (pd.DataFrame): The aggregated data to plot.
+    x, y, color (str): Columns holding the x positions, stacked values and colour categories.
+    title (str): The figure title.
+    labels (dict): Display names for the columns.
+    color_discrete_sequence (list): Colours assigned to the categories in order.
+    layout (dict): Nested layout updates applied on top of the defaults.
+
+    Returns:
+    dict: A figure dictionary.
+    """
+    labels = labels or {}
+    colors = color_discrete_sequence or px.colors.qualitative.Plotly
+    label = lambda column: labels.get(column, column)
+
+    data = []
+    for index, (category, rows) in enumerate(_split_by_color(plot_df, color)):
+        data.append({
+            'type': 'scatter',
+            'name': category,
+            'legendgroup': category,
+            'mode': 'lines',
+            'stackgroup': '1',
+            'orientation': 'v',
+            'showlegend': True,
+            'line': {'color': colors[index % len(colors)]},
+            'x': _values(plot_df[x].iloc[rows]),
+            'y': _values(plot_df[y].iloc[rows]),
+            'xaxis': 'x',
+            'yaxis': 'y',
+            'hovertemplate': _hovertemplate([(label(color), category), (label(x), '%{x}'), (label(y), '%{y}')]),
+        })
+
+    figure_layout = _base_layout(title, label(x), label(y), legend_title=label(color))
+    merge_layout(figure_layout, layout or {})
+
+    return {'data': data, 'layout': figure_layout}
+
+def _transparent(colour, alpha):
+    # '#rrggbb' or 'rgb(r, g, b)' as an rgba string, for the fill of confidence bands
+    if colour.startswith('#'):
+        channels = [int(colour[index:index + 2], 16) for index in (1, 3, 5)]
+    else:
+        channels = [int(float(channel)) for channel in colour[colour.index('(') + 1:colour.index(')')].split(',')[:3]]
+    return 'rgba({}, {}, {}, {})'.format(*channels, alpha)
+
+def line_figure(plot_df, x, y, color, title=None, labels=None, color_discrete_sequence=None, layout=None,
+                interval=None, bands=True, hollow=None):
+    """
+    Equivalent of px.line with markers: one trace per colour category, optionally with a
+    shaded confidence band behind each line.
+
+    Parameters:
+    plot_df (pd.DataFrame): The aggregated data to plot, sorted along x.
+    x, y, color (str): Columns holding the x positions, values and colour categories.
+    title (str): The figure title.
+    labels (dict): Display names for the columns.
+    color_discrete_sequence (list): Colours assigned to the categories in order.
+    layout (dict): Nested layout updates applied on top of the defaults.
+    interval (tuple): Columns holding the lower and upper confidence limits, shown on hover.
+    bands (bool): Whether to shade the interval behind each line.
+    hollow (str): Boolean column; its True points are drawn as open markers (e.g., unreliable estimates).
+
+    Returns:
+    dict: A figure dictionary.
+    """
+    labels = labels or {}
+    colors = color_discrete_sequence or px.colors.qualitative.Plotly
+    label = lambda column: labels.get(column, column)
+
+    data = []
+    for index, (category, rows) in enumerate(_split_by_color(plot_df, color)):
+        colour = colors[index % len(colors)]
+        hover_fields = [(label(color), category), (label(x), '%{x}'), (label(y), '%{y}')]
+        trace = {
+            'type': 'scatter',
+            'name': category,
+            'legendgroup': category,
+            'mode': 'lines+markers',
+            'showlegend': True,
+            'line': {'color': colour},
+            'marker': {'color': colour},
+            'x': _values(plot_df[x].iloc[rows]),
+            'y': _values(plot_df[y].iloc[rows]),
+            'xaxis': 'x',
+            'yaxis': 'y',
+        }
+        if interval is not None:
+            low, high = (plot_df[column].iloc[rows].to_numpy() for column in interval)
+            trace['customdata'] = np.column_stack([low, high])
+            hover_fields.append(('95% CI', '%{customdata[0]:.1f} - %{customdata[1]:.1f}'))
+            if bands:
+                # Closed polygon along the upper limits and back along the lower ones
+                x_values = plot_df[x].iloc[rows].to_numpy()
+                data.append({
+                    'type': 'scatter',
+                    'name': category,
+                    'legendgroup': category,
+                    'mode': 'lines',
+                    'showlegend': False,
+                    'hoverinfo': 'skip',
+                    'fill': 'toself',
+                    'fillcolor': _transparent(colour, 0.2),
+                    'line': {'width': 0},
+                    'x': np.concatenate([x_values, x_values[::-1]]),
+                    'y': np.concatenate([high, low[::-1]]),
+                    'xaxis': 'x',
+                    'yaxis': 'y',
+                })
+        if hollow is not None:
+            trace['marker']['symbol'] = ['circle-open' if flag else 'circle' for flag in plot_df[hollow].iloc[rows]]
+        trace['hovertemplate'] = _hovertemplate(hover_fields)
+        data.append(trace)
+
+    figure_layout = _base_layout(title, label(x), label(y), legend_title=label(color))
+    merge_layout(figure_layout, layout or {})
+
+    return {'data': data, 'layout': figure_layout}
+
+def choropleth_figure(plot_df, locations, color, range_color=None, color_continuous_scale=None, labels=None,
+                      title=None, layout=None):
+    """
+    Equivalent of px.choropleth over US states with a continuous colour axis.
+
+    Parameters:
+    plot_df (pd.DataFrame): One row per state.
+    locations (str): Column holding the two letter state codes.
+    color (str): Column holding the value to colour the states by.
+    range_color (tuple): Lower and upper bound of the colour axis.
+    color_continuous_scale (list): Colours of the scale, evenly spaced.
+    labels (dict): Display names for the columns.
+    title (str): The figure title.
+    layout (dict): Nested layout updates applied on top of the defaults.
+
+    Returns:
+    dict: A figure dictionary.
+    """
+    labels = labels or {}
+    scale = color_continuous_scale or px.colors.sequential.Plasma
+    label = lambda column: labels.get(column, column)
+
+    trace = {
+        'type': 'choropleth',
+        'name': '',
+        'geo': 'geo',
+        'coloraxis': 'coloraxis',
+        'locationmode': 'USA-states',
+        'locations': _values(plot_df[locations]),
+        'z': _values(plot_df[color]),
+        'hovertemplate': _hovertemplate([(label(locations), '%{location}'), (label(color), '%{z}')]),
+    }
+
+    coloraxis = {
+        'colorbar': {'title': {'text': label(color)}},
+        'colorscale': [[index / (len(scale) - 1), colour] for index, colour in enumerate(scale)],
+        'autocolorscale': False,
+    }
+    if range_color is not None:
+        coloraxis['cmin'], coloraxis['cmax'] = range_color
+
+    figure_layout = {
+        'template': get_template(pio.templates.default),
+        'geo': {'domain': {'x': [0.0, 1.0], 'y': [0.0, 1.0]}, 'center': {}, 'scope': 'usa'},
+        'coloraxis': coloraxis,
+        'legend': {'tracegroupgap': 0},
+        'margin': {'t': 60},
+    }
+    if title is not None:
+        figure_layout['title'] = {'text': title}
+    merge_layout(figure_layout, layout or {})
+
+    return {'data': [trace], 'layout': figure_layout}
+
+def category_choropleth_figure(plot_df, locations, color, color_discrete_sequence=None, labels=None, title=None,
+                               layout=None):
+    """
+    Equivalent of px.choropleth over US states with discrete colours: one trace per
+    colour category, each with a single-colour scale and its own legend entry.
+
+    Parameters:
+    plot_df (pd.DataFrame): One row per state.
+    locations (str): Column holding the two letter state codes.
+    color (str): Column holding the category of each state.
+    color_discrete_sequence (list): Colours assigned to the categories in order.
+    labels (dict): Display names for the columns.
+    title (str): The figure title.
+    layout (dict): Nested layout updates applied on top of the defaults.
+
+    Returns:
+    dict: A figure dictionary.
+    """
+    labels = labels or {}
+    colors = color_discrete_sequence or px.colors.qualitative.Plotly
+    label = lambda column: labels.get(column, column)
+
+    data = []
+    for index, (category, rows) in enumerate(_split_by_color(plot_df, color)):
+        colour = colors[index % len(colors)]
+        data.append({
+            'type': 'choropleth',
+            'name': str(category),
+            'legendgroup': str(category),
+            'geo': 'geo',
+            'locationmode': 'USA-states',
+            'locations': _values(plot_df[locations].iloc[rows]),
+            'z': np.ones(len(rows)),
+            'colorscale': [[0.0, colour], [1.0, colour]],
+            'showscale': False,
+            'showlegend': True,
+            'hovertemplate': _hovertemplate([(label(color), category), (label(locations), '%{location}')]),
+        })
+
+    figure_layout = {
+        'template': get_template(pio.templates.default),
+        'geo': {'domain': {'x': [0.0, 1.0], 'y': [0.0, 1.0]}, 'center': {}, 'scope': 'usa'},
+        'legend': {'title': {'text': label(color)}, 'tracegroupgap': 0},
+        'margin': {'t': 60},
+    }
+    if title is not None:
+        figure_layout['title'] = {'text': title}
+    merge_layout(figure_layout, layout or {})
+
+    return {'data': data, 'layout': figure_layout}
+
+def heatmap_figure(matrix, x_labels, y_labels, title=None, zmin=None, zmax=None, colorscale=None,
+                   value_label='value', layout=None):
+    """
+    Equivalent of px.imshow on a matrix with labelled rows and columns.
+
+    Parameters:
+    matrix (np.ndarray): The values, one row per y label.
+    x_labels, y_labels (list): Labels of the columns and rows.
+    title (str): The figure title.
+    zmin, zmax (float): Bounds of the colour axis.
+    colorscale (list): Colours of the scale, evenly spaced.
+    value_label (str): Name of the values shown on hover.
+    layout (dict): Nested layout updates applied on top of the defaults.
+
+    Returns:
+    dict: A figure dictionary.
+    """
+    scale = colorscale or px.colors.sequential.Plasma
+    trace = {
+        'type': 'heatmap',
+        'x': list(x_labels),
+        'y': list(y_labels),
+        'z': np.asarray(matrix, dtype=float),
+        'coloraxis': 'coloraxis',
+        'hovertemplate': f'x: %{{x}}<br>y: %{{y}}<br>{value_label}: %{{z:.3f}}<extra></extra>',
+    }
+
+    figure_layout = _base_layout(title, None, None)
+    figure_layout['xaxis'].update({'constrain': 'domain', 'scaleanchor': 'y', 'tickangle': -45})
+    figure_layout['yaxis'].update({'autorange': 'reversed', 'constrain': 'domain'})
+    figure_layout['coloraxis'] = {
+        'colorbar': {'title': {'text': value_label}},
+        'colorscale': [[index / (len(scale) - 1), colour] for index, colour in enumerate(scale)],
+        'cmin': zmin,
+        'cmax': zmax,
+    }
+    merge_layout(figure_layout, layout or {})
+
+    return {'data': [trace], 'layout': figure_layout}
+
+def density_figure(matrix, x_title, y_title, value_label='value', title=None, colorscale=None, layout=None):
+    """
+    A binned 2-D density: a heatmap on numeric axes, with empty bins left blank and the
+    axes fixed to the extent of the bins sent.
+
+    Parameters:
+    matrix (pd.DataFrame): The value of each bin, indexed by the y bin centres with the
+                           x bin centres as columns.
+    x_title, y_title (str): Titles of the axes.
+    value_label (str): Name of the values shown on hover and on the colour bar.
+    title (str): The figure title.
+    colorscale (list): Colours of the scale, evenly spaced.
+    layout (dict): Nested layout updates applied on top of the defaults.
+
+    Returns:
+    dict: A figure dictionary.
+    """
+    scale = colorscale or px.colors.sequential.Viridis
+    x = matrix.columns.to_numpy(dtype=float)
+    y = matrix.index.to_numpy(dtype=float)
+    values = matrix.to_numpy(dtype=float)
+    trace = {
+        'type': 'heatmap',
+        'x': x,
+        'y': y,
+        'z': np.where(values > 0, values, np.nan),
+        'coloraxis': 'coloraxis',
+        'hovertemplate': f'{x_title}: %{{x:.2f}}<br>{y_title}: %{{y:.1f}}<br>{value_label}: %{{z:,.0f}}<extra></extra>',
+    }
+
+    figure_layout = _base_layout(title, x_title, y_title)
+    # Half a bin beyond the outer centres, so the axes match the bins
+    if x.size and y.size:
+        x_half = (x[1] - x[0]) / 2 if x.size > 1 else 0.5
+        y_half = (y[1] - y[0]) / 2 if y.size > 1 else 0.5
+        figure_layout['xaxis']['range'] = [x[0] - x_half, x[-1] + x_half]
+        figure_layout['yaxis']['range'] = [y[0] - y_half, y[-1] + y_half]
+    figure_layout['coloraxis'] = {
+        'colorbar': {'title': {'text': value_label}},
+        'colorscale': [[index / (len(scale) - 1), colour] for index, colour in enumerate(scale)],
+    }
+    merge_layout(figure_layout, layout or {})
+
+    return {'data': [trace], 'layout': figure_layout}
+
+def box_summary_figure(plot_df, x, low, q1, median, q3, high, title=None, x_title=None, y_title=None, layout=None):
+    """
+    Box plots drawn from precomputed summaries, one box per row, so no raw values are sent.
+
+    Parameters:
+    plot_df (pd.DataFrame): One row per box, in display order.
+    x (str): Column holding the box labels.
+    low, q1, median, q3, high (str): Columns holding the whisker ends, quartiles and median.
+    title (str): The figure title.
+    x_title, y_title (str): Titles of the axes.
+    layout (dict): Nested layout updates applied on top of the defaults.
+
+    Returns:
+    dict: A figure dictionary.
+    """
+    trace = {
+        'type': 'box',
+        'x': _values(plot_df[x]),
+        'lowerfence': plot_df[low].to_numpy(),
+        'q1': plot_df[q1].to_numpy(),
+        'median': plot_df[median].to_numpy(),
+        'q3': plot_df[q3].to_numpy(),
+        'upperfence': plot_df[high].to_numpy(),
+        'boxpoints': False,
+        'marker': {'color': '#636efa'},
+        'showlegend': False,
+    }
+
+    figure_layout = _base_layout(title, x_title, y_title)
+    merge_layout(figure_layout, layout or {})
+
+    return {'data': [trace], 'layout': figure_layout}
+
+def message_figure(message, title=None, layout=None):
+    """
+    A figure without data showing a message in place of the plot, e.g. for a question
+    that was not asked in the selected years.
+
+    Parameters:
+    message (str): The text shown in the middle of the plot area.
+    title (str): The figure title.
+    layout (dict): Nested layout updates applied on top of the defaults.
+
+    Returns:
+    dict: A figure dictionary.
+    """
+    figure_layout = _base_layout(title, None, None)
+    figure_layout['xaxis'].update({'visible': False})
+    figure_layout['yaxis'].update({'visible': False})
+    figure_layout['annotations'] = [{
+        'text': message, 'xref': 'paper', 'yref': 'paper', 'x': 0.5, 'y': 0.5,
+        'showarrow': False, 'font': {'size': 16},
+    }]
+    merge_layout(figure_layout, layout or {})
+
+    return {'data': [], 'layout': figure_layout}
+
+def forest_figure(plot_df, y, x, low, high, title=None, x_title=None, reference=1, layout=None):
+    """
+    A forest plot: one point per row with a horizontal interval, on a log x-axis
+    with a dashed line at the reference value.
+
+    Parameters:
+    plot_df (pd.DataFrame): One row per estimate, in display order from the top.
+    y (str): Column holding the row labels.
+    x, low, high (str): Columns holding the estimates and interval bounds.
+    title (str): The figure title.
+    x_title (str): Title of the x-axis.
+    reference (float): The x value of the dashed line.
+    layout (dict): Nested layout updates applied on top of the defaults.
+
+    Returns:
+    dict: A figure dictionary.
+    """
+    estimates = plot_df[x].to_numpy()
+    trace = {
+        'type': 'scatter',
+        'mode': 'markers',
+        'x': estimates,
+        'y': _values(plot_df[y]),
+        'marker': {'size': 8, 'color': '#636efa'},
+        'error_x': {
+            'type': 'data',
+            'symmetric': False,
+            'array': plot_df[high].to_numpy() - estimates,
+            'arrayminus': estimates - plot_df[low].to_numpy(),
+            'thickness': 1.5,
+            'width': 4,
+        },
+        'customdata': np.column_stack([plot_df[low].to_numpy(), plot_df[high].to_numpy()]),
+        'hovertemplate': '%{y}<br>%{x:.2f} (%{customdata[0]:.2f} - %{customdata[1]:.2f})<extra></extra>',
+        'showlegend': False,
+    }
+
+    figure_layout = _base_layout(title, x_title, None)
+    figure_layout['xaxis']['type'] = 'log'
+    figure_layout['yaxis']['autorange'] = 'reversed'
+    figure_layout['shapes'] = [{
+        'type': 'line', 'xref': 'x', 'yref': 'paper', 'x0': reference, 'x1': reference, 'y0': 0, 'y1': 1,
+        'line': {'dash': 'dash', 'color': 'gray'},
+    }]
+    merge_layout(figure_layout, layout or {})
+
+    return {'data': [trace], 'layout': figure_layout}
+
+def sparkline_figure(plot_df, x, y, highlight=None, hoverformat=',.1f', color='#636efa'):
+    """
+    A small line chart without axes, grid or title, for trends next to a KPI value.
+
+    Parameters:
+    plot_df (pd.DataFrame): The data to plot, sorted along x.
+    x, y (str): Columns holding the x positions and values.
+    highlight: The x value to mark with a dot (e.g., the selected year).
+    hoverformat (str): d3 format of the values shown on hover.
+    color (str): Colour of the line.
+
+    Returns:
+    dict: A figure dictionary.
+    """
+    data = [{
+        'type': 'scatter',
+        'mode': 'lines',
+        'x': _values(plot_df[x]),
+        'y': _values(plot_df[y]),
+        'line': {'color': color, 'width': 2},
+        'hovertemplate': f'%{{x}}: %{{y:{hoverformat}}}<extra></extra>',
+        'showlegend': False,
+    }]
+    marked = plot_df[plot_df[x] == highlight]
+    if highlight is not None and not marked.empty:
+        data.append({
+            'type': 'scatter',
+            'mode': 'markers',
+            'x': _values(marked[x]),
+            'y': _values(marked[y]),
+            'marker': {'color': color, 'size': 6},
+            'hoverinfo': 'skip',
+            'showlegend': False,
+        })
+
+    axis = {'visible': False, 'fixedrange': True}
+    layout = {
+        'xaxis': dict(axis),
+        'yaxis': dict(axis),
+        'margin': {'l': 0, 'r': 0, 't': 2, 'b': 2},
+        'paper_bgcolor': 'rgba(0,0,0,0)',
+        'plot_bgcolor': 'rgba(0,0,0,0)',
+        'hovermode': 'closest',
+        'showlegend': False,
+    }
+
+    return {'data': data, 'layout': layout}
+
+def _plain(values):
+    return values.tolist() if isinstance(values, np.ndarray) else values
+
+def figure_signature(figure):
+    """
+    Summarises everything about a figure except its values and title: the traces,
+    their names and their categories. Two figures with the same signature differ
+    only in bar heights, bar labels and title.
+    """
+    if not figure or not figure.get('data'):
+        return None
+    structure = [(trace.get('type'), trace.get('name'), _plain(trace.get('x'))) for trace in figure['data']]
+    return hashlib.md5(repr(structure).encode()).hexdigest()
+
+def value_patch(figure):
+    """
+    Returns a dash.Patch replacing only the y values, bar labels, intervals and title
+    of a figure already shown in the browser.
+    """
+    patch = Patch()
+    for index, trace in enumerate(figure['data']):
+        patch['data'][index]['y'] = trace['y']
+        for key in ('text', 'customdata', 'error_y'):
+            if key in trace:
+                patch['data'][index][key] = trace[key]
+        if 'pattern' in trace.get('marker', {}):
+            patch['data'][index]['marker']['pattern'] = trace['marker']['pattern']
+    patch['layout']['title']['text'] = figure['layout']['title']['text']
+    return patch
+
+def patch_unchanged_figures(figures, previous_signatures, values_only):
+    """
+    Swaps figures whose structure is unchanged since the last response for value patches.
+
+    Parameters:
+    figures (list): Newly built figure dictionaries.
+    previous_signatures (list or None): Signatures stored after the last response.
+    values_only (bool): True when the change that triggered the callback (e.g. moving the
+                        year slider) cannot have changed the figures' structure.
+
+    Returns:
+    tuple: (outputs, signatures) where outputs holds a figure or a dash.Patch for each
+           figure and signatures should be stored for the next call.
+    """
+    signatures = [figure_signature(figure) for figure in figures]
+    if not values_only or not previous_signatures or len(previous_signatures) != len(figures):
+        return list(figures), signatures
+
+    outputs = [
+        value_patch(figure) if signature is not None and signature == previous else figure
+        for figure, signature, previous in zip(figures, signatures, previous_signatures)
+    ]
+    return outputs, signatures
+
+# Integer typed arrays plotly.js can decode, smallest first
+_integer_dtypes = [('i1', np.int8), ('u1', np.uint8), ('i2', np.int16), ('u2', np.uint16), ('i4', np.int32), ('u4', np.uint32)]
+
+def _compact_array(values, decimals):
+    """
+    Rounds a numeric array to display precision. Whole numbers are sent as a base64
+    typed array when that is shorter than the JSON list, others as a JSON list.
+    """
+    if values.dtype.kind == 'f':
+        finite = values[np.isfinite(values)]
+        # Large values such as population counts are never shown with decimals
+        if finite.size and np.abs(finite).max() >= 1000:
+            decimals = 0
+        values = np.round(values, decimals)
+        if finite.size < values.size:
+            return np.where(np.isnan(values), None, values).tolist()
+
+    as_list = values.tolist()
+    # Matrices (e.g., heatmap z) stay nested lists
+    if values.size == 0 or values.ndim > 1 or not np.all(values == np.floor(values)):
+        return as_list
+
+    low, high = values.min(), values.max()
+    for dtype, numpy_type in _integer_dtypes:
+        if np.iinfo(numpy_type).min <= low and high <= np.iinfo(numpy_type).max:
+            encoded = {'dtype': dtype, 'bdata': base64.b64encode(values.astype(numpy_type).tobytes()).decode('ascii')}
+            # Short arrays of small numbers are shorter as plain JSON
+            if len(encoded['bdata']) + 25 < len(json.dumps(as_list)):
+                return encoded
+            return [int(value) for value in as_list]
+    return as_list
+
+def _compact_values(container, decimals):
+    for key, value in container.items():
+        if isinstance(value, np.ndarray) and value.dtype.kind in 'iuf':
+            container[key] = _compact_array(value, decimals)
+        elif isinstance(value, dict) and 'bdata' not in value:
+            _compact_values(value, decimals)
+
+def compact_figure(figure, decimals=2):
+    """
+    Shrinks a figure dictionary before it is sent to the browser, in place:
+    numeric arrays are rounded to display precision and sent as typed arrays where
+    that is shorter, and the template only keeps defaults for the trace types used.
+
+    Parameters:
+    figure (dict): A figure dictionary built by this module.
+    decimals (int): Decimal places kept for values below 1000.
+
+    Returns:
+    dict: The same figure dictionary.
+    """
+    if not figure or 'data' not in figure:
+        return figure
+
+    traces = list(figure['data'])
+    for frame in figure.get('frames', []):
+        traces.extend(frame.get('data', []))
+    for trace in traces:
+        _compact_values(trace, decimals)
+
+    template = figure.get('layout', {}).get('template')
+    if isinstance(template, dict) and 'data' in template:
+        used_types = {trace.get('type', 'scatter') for trace in traces}
+        figure['layout']['template'] = {
+            'data': {trace_type: defaults for trace_type, defaults in template['data'].items() if trace_type in used_types},
+            'layout': template['layout'],
+        }
+
+    return figure
+
+def _payload_size(figure):
+    return len(json.dumps(figure, cls=PlotlyJSONEncoder).encode())
+
+def compact_figures(figures, label='callback', decimals=2):
+    """
+    Applies compact_figure to each of a callback's figures and, with TRANSPORT_REPORT=1,
+    prints the bytes saved and the size after gzip compression.
+    """
+    if not TRANSPORT_REPORT:
+        return [compact_figure(figure, decimals) for figure in figures]
+
+    before = sum(_payload_size(figure) for figure in figures)
+    figures = [compact_figure(figure, decimals) for figure in figures]
+    payload = json.dumps(figures, cls=PlotlyJSONEncoder).encode()
+    gzipped = len(zlib.compress(payload, 6))
+    print(f'[{label}] figures {before / 1024:.1f} kB -> {len(payload) / 1024:.1f} kB compacted '
+          f'-> {gzipped / 1024:.1f} kB gzipped, saved {(before - gzipped) / 1024:.1f} kB')
+    return figures
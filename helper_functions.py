@@ -1,9 +1,62 @@
+import os
+import time
 import numpy as np
 import pandas as pd
 import plotly.express as px
-from mappings import title_dictionary, state_mapping
+from mappings import title_dictionary, state_mapping, state_variable_columns, ranking_metric_mappings, quantile_measure_mappings, similarity_group_mappings
 import random
+from concurrent.futures import ThreadPoolExecutor
 from dash import html, dcc
+from figure_factory import bar_figure, continuous_bar_figure, area_figure, choropleth_figure, heatmap_figure, forest_figure, sparkline_figure, density_figure, box_summary_figure, message_figure, facet_bar_figure, line_figure, category_choropleth_figure, compact_figure
+from regression import risk_model, risk_model_covariates
+from aggregates import cached_table, stacked_cube, geography_states, state_year_table, state_prevalence, continuous_summary, geography_table, geography_label, year_range, pool_years, kpi_table, state_metrics_table, prevalence_movers, association_matrix, age_adjusted_percentage, percentage_intervals, density_grid, weighted_quantiles, available_years, variable_available, state_similarity, state_clusters
+
+# Number of threads used to build a callback's figures concurrently.
+# FIGURE_WORKERS=1 builds them one after another on the callback thread.
+FIGURE_WORKERS = max(1, int(os.environ.get('FIGURE_WORKERS', 4)))
+
+# Set FIGURE_TIMING=1 to print how long each figure took to build.
+FIGURE_TIMING = os.environ.get('FIGURE_TIMING', '0') == '1'
+
+# Survey years shown by the all-years small multiples, and subplots per row
+ALL_YEARS = list(range(2012, 2023))
+ALL_YEARS_COLUMNS = 4
+
+# One executor shared by every callback, so concurrent requests cannot
+# start more than FIGURE_WORKERS builder threads between them.
+figure_executor = ThreadPoolExecutor(max_workers=FIGURE_WORKERS, thread_name_prefix='figure') if FIGURE_WORKERS > 1 else None
+
+def _timed_call(builder, args):
+    start = time.perf_counter()
+    result = builder(*args)
+    return result, time.perf_counter() - start
+
+def build_figures(builders, label='callback'):
+    """
+    Runs the independent figure builders of a callback, concurrently when
+    FIGURE_WORKERS > 1, and returns their results in the order given.
+
+    Parameters:
+    builders (dict): Maps a name to a tuple of (function, *args), e.g.
+                     {'anthro': (update_dem_anthro_fig, df, 2022, 'age', 'bmi_category')}.
+    label (str): Name of the calling callback, used in the timing output.
+
+    Returns:
+    list: The value returned by each builder.
+    """
+    start = time.perf_counter()
+
+    if figure_executor is None:
+        timed_results = [_timed_call(spec[0], spec[1:]) for spec in builders.values()]
+    else:
+        futures = [figure_executor.submit(_timed_call, spec[0], spec[1:]) for spec in builders.values()]
+        timed_results = [future.result() for future in futures]
+
+    if FIGURE_TIMING:
+        timings = ', '.join(f'{name} {elapsed * 1000:.0f}ms' for name, (_, elapsed) in zip(builders, timed_results))
+        print(f'[{label}] {timings} | total {(time.perf_counter() - start) * 1000:.0f}ms')
+
+    return [result for result, _ in timed_results]
 
 def weighted_mean(df, value_col, weight_col):
     df = df[df[value_col] != -1]  # Filter out invalid values
@@ -370,67 +423,128 @@ def get_mapping_dict(selected_variable, year=None, time_series=False):
     else:
         return {-1: 'Other'}
 
-def update_state_map(df, selected_year, selected_variable):
+def update_state_map(df, selected_year, selected_variable, prevalence_variable=None, prevalence_code=None, average_variable=None, age_adjusted=False):
+    """
+    Generates the state choropleth for the selected year, with one animation frame
+    per year so the browser can switch years without asking the server again.
+
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+    selected_year (int): The year shown before any frame is selected.
+    selected_variable (str): 'frequency' for the population, 'count' for the number of respondents
+                             'prevalence' for the percentage of adults giving one answer
+                             or 'average' for the weighted mean of a continuous variable.
+    prevalence_variable (str): With 'prevalence', the survey variable (e.g., 'smoking').
+    prevalence_code (int): With 'prevalence', the answer code to map.
+    average_variable (str): With 'average', a value of state_variable_mappings (e.g., 'Average Height').
+    age_adjusted (bool): With 'prevalence', whether to age-standardize the percentages.
 
-    plot_df = filter_and_prepare_data(df, selected_year, x_variable='state')
-    plot_df['state_code'] = plot_df['state'].map(state_mapping)
+    Returns:
+    dict: A Plotly figure dictionary with a frame named after each year.
+    """
+    # Per-state values for every year are computed once and shared by all callbacks
+    plot_df = state_year_table(df)
 
     mapping = {'frequency': 'Population',
-               'count': 'Number of Respondents'}
+               'count': 'Number of Respondents',
+               'prevalence': 'Percentage',
+               'average': average_variable}
+    title = f'{mapping[selected_variable]} by State'
 
     if selected_variable == 'frequency':
-        plot_df['colour_value'] = plot_df['frequency']
+        plot_df = plot_df.assign(colour_value=plot_df['population'])
 
         range_color = (0, 32*(10**6))
     elif selected_variable == 'count':
-        plot_df = df.loc[df['year'] == selected_year]
-        plot_df['state_code'] = plot_df['state'].map(state_mapping)
-        plot_df = plot_df.groupby('state_code', as_index=False).size()
-        plot_df.rename(columns={'size': 'colour_value'}, inplace=True)
+        plot_df = plot_df.assign(colour_value=plot_df['respondents'])
 
         range_color = (0, 30000)
-
-    choropleth_map = px.choropleth(
-        data_frame=plot_df,
-        locationmode='USA-states',
+    elif selected_variable == 'prevalence':
+        # Looked up from the precomputed state x year x variable x code table
+        plot_df = state_prevalence(df, prevalence_variable, prevalence_code, age_adjusted=age_adjusted)
+        plot_df = plot_df.assign(state_code=plot_df['state'].map(state_mapping), colour_value=plot_df['percentage'])
+
+        # The same colour range for every year keeps the frames comparable
+        range_color = (0, max(plot_df['colour_value'].max(), 1) if not plot_df.empty else 100)
+        code_label = get_mapping_dict(prevalence_variable, time_series=True).get(prevalence_code, prevalence_code)
+        title = f'{title_dictionary[prevalence_variable]}: {code_label}'
+        if age_adjusted and prevalence_variable != 'age':
+            title += ' (Age-Adjusted)'
+    elif selected_variable == 'average':
+        # Weighted means come from the per state and year sufficient statistics
+        plot_df = continuous_summary(df, state_variable_columns[average_variable])
+        plot_df = plot_df.assign(state_code=plot_df['state'].map(state_mapping), colour_value=plot_df['mean'])
+
+        range_color = (plot_df['colour_value'].min(), plot_df['colour_value'].max())
+
+    choropleth_map = choropleth_figure(
+        plot_df[plot_df['year'] == selected_year],
         locations='state_code',
-        scope='usa',
         color='colour_value',
         range_color=range_color,
         color_continuous_scale=px.colors.sequential.speed,
         labels={'colour_value': mapping[selected_variable],
                 'state_code': 'State'},
-    )
-
-    choropleth_map.update_layout(
-        title={
-            'text' : f'{mapping[selected_variable]} by State',
-            'x': 0.5,
-            'xanchor': 'center',
-            'font': {
-                'size': 24
+        layout={
+            'title': {
+                'text' : title,
+                'x': 0.5,
+                'xanchor': 'center',
+                'font': {
+                    'size': 24
+                }
             }
         }
     )
 
+    # Each frame only replaces the states and their values
+    choropleth_map['frames'] = [
+        {'name': str(year), 'data': [{'locations': list(year_df['state_code']), 'z': year_df['colour_value'].to_numpy()}]}
+        for year, year_df in plot_df.groupby('year')
+    ]
+
     return choropleth_map
 
-def update_frequency_chart(selected_year, selected_variable, df):
-    df_filtered = df[df['year'] == selected_year]
-    df_grouped = df_filtered.groupby(selected_variable)
-    weighted_frequency = df_grouped['wt'].sum().reset_index()
-    weighted_frequency.columns = [selected_variable, 'weighted_frequency']
+def update_frequency_chart_slices(df, selected_variable):
+    """
+    Builds the frequency chart for every year at once, for the browser to switch
+    between as the year slider moves without calling back to the server.
+
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+    selected_variable (str): The variable selected by the user.
+
+    Returns:
+    tuple: The dropdown text and a dictionary holding the layout shared by all years
+           under 'layout' and each year's traces and layout changes under 'years'.
+    """
+    # One groupby covers all years
+    all_years = df.groupby(['year', selected_variable])['wt'].sum().reset_index()
+    all_years.columns = ['year', selected_variable, 'weighted_frequency']
+
+    slices = {'layout': None, 'years': {}}
+    for year, weighted_frequency in all_years.groupby('year'):
+        figure = compact_figure(frequency_chart_figure(weighted_frequency.drop(columns='year'), int(year), selected_variable))
+        layout = figure['layout']
+
+        # Only the title and colour bar ticks change from year to year
+        year_layout = {'title': layout.pop('title'), 'coloraxis': layout.pop('coloraxis')}
+        if slices['layout'] is None:
+            slices['layout'] = layout
+        slices['years'][int(year)] = {'data': figure['data'], 'layout': year_layout}
+
+    return f"Selected variable: {selected_variable}", slices
+
+def frequency_chart_figure(weighted_frequency, selected_year, selected_variable):
     mapping_dict = get_mapping_dict(selected_variable, year=selected_year)
     weighted_frequency['mapped_labels'] = weighted_frequency[selected_variable].map(mapping_dict)
 
     max_value = weighted_frequency['weighted_frequency'].max()
-    max_label = weighted_frequency.loc[weighted_frequency['weighted_frequency'] == max_value, 'mapped_labels'].values[0]
 
-    frequency_chart = px.bar(
+    frequency_chart = continuous_bar_figure(
         weighted_frequency,
         x='mapped_labels',
         y='weighted_frequency',
-        color='weighted_frequency',
         color_continuous_scale=px.colors.sequential.Blues,
         title=f'<b>Adult population count by {title_dictionary[selected_variable]} ({selected_year})</b>',
         labels={
@@ -438,32 +552,29 @@ def update_frequency_chart(selected_year, selected_variable, df):
             'weighted_frequency': 'Count'
         },
         template='plotly',
-        hover_data={'weighted_frequency': ':.2f'},
-        text='weighted_frequency'
-    )
-
-    # Code to enhance chart layout
-    frequency_chart.update_layout(
-        title_font_size=18,  # Increase title font size
-        xaxis_title=f'<b>{title_dictionary[selected_variable]}</b>',  # Bold x-axis label
-        yaxis_title='<b>Count</b>',  # Bold y-axis label
-        margin=dict(t=50, b=50, l=50, r=50),  # Adjust margins
-        coloraxis_colorbar=dict(
-            title='Count',
-            title_font_size=16,
-            tickvals=[0, max(weighted_frequency['weighted_frequency'])//2, max(weighted_frequency['weighted_frequency'])],
-            ticktext=['Low', 'Medium', 'High']  # Add colorbar tick text
+        text='weighted_frequency',
+        # Code to enhance chart layout
+        layout=dict(
+            title=dict(font=dict(size=18)),  # Increase title font size
+            xaxis=dict(title=dict(text=f'<b>{title_dictionary[selected_variable]}</b>')),  # Bold x-axis label
+            yaxis=dict(title=dict(text='<b>Count</b>')),  # Bold y-axis label
+            margin=dict(t=50, b=50, l=50, r=50),  # Adjust margins
+            coloraxis=dict(colorbar=dict(
+                title=dict(text='Count', font=dict(size=16)),
+                tickvals=[0, max_value // 2, max_value],
+                ticktext=['Low', 'Medium', 'High']  # Add colorbar tick text
+            ))
         )
     )
 
     # Update hover mode
-    frequency_chart.update_traces(
+    frequency_chart['data'][0].update(
         hovertemplate='<b>%{x}</b><br>Count: %{y}<extra></extra>',
         textposition='outside',
         texttemplate='%{text:.2s}',
     )
 
-    return f"Selected variable: {selected_variable}", frequency_chart
+    return frequency_chart
 
 def filter_and_prepare_data(df, year=None, x_variable=None, y_variable=None):
     """
@@ -524,584 +635,657 @@ def filter_and_prepare_data(df, year=None, x_variable=None, y_variable=None):
 
     return plot_df
 
-def update_dem_anthro_fig(df, selected_year, demographic, anthro_var):
+def prepare_cross_tab(df, selected_year, x_variable, y_variable, geography='all', equal_weight=False, age_adjusted=False):
     """
-    Generates the figure for the Anthropometrics & Clinical Measures graph.
+    Weighted frequency of each y_variable category within each x_variable group for one
+    year, or a pooled range of years, and geography, in the same layout as
+    filter_and_prepare_data. Summed from the state x year x x_variable x y_variable cube,
+    so a pooled range or another geography costs the same as a single year.
 
     Parameters:
     df (pd.DataFrame): The input DataFrame containing survey data.
-    selected_year (int): The year selected by the user.
-    demographic (str): The demographic variable selected by the user (e.g., 'age', 'sex').
-    anthro_var (str): The specific anthropometric variable to plot (e.g., 'bmi_category').
+    selected_year (int or list): The year, or [first, last] range of years, to show.
+    x_variable (str): The grouping variable (e.g., 'age').
+    y_variable (str): The variable whose categories are counted (e.g., 'smoking').
+    geography (str or int): 'all', 'region:<name>', 'division:<name>' or a state code.
+    equal_weight (bool): With a range, whether each year counts equally (see pool_years).
+    age_adjusted (bool): Whether to age-standardize the percentages. Ignored when
+                         either variable is 'age'; frequencies stay crude.
 
     Returns:
-    plotly.graph_objs._figure.Figure: A Plotly figure for the Anthropometrics & Clinical Measures.
+    pd.DataFrame: Columns x_variable, y_variable, year, frequency, percentage, se,
+                  ci_low, ci_high, group_respondents, unreliable, percentage_text and
+                  formatted_frequency. Pooled frequencies are average annual populations
+                  and year holds the last year of the range. Standard errors and intervals
+                  come from the cube's sufficient statistics (see percentage_intervals).
     """
+    cells = geography_table(df, ['year', x_variable, y_variable], geography)
+    plot_df = pool_years(cells, [x_variable, y_variable], selected_year, equal_weight)
+    plot_df = percentage_intervals(plot_df, [x_variable])
+    interval_columns = ['percentage', 'se', 'ci_low', 'ci_high', 'group_respondents', 'unreliable']
+
+    if age_adjusted and 'age' not in (x_variable, y_variable):
+        # Percentages within each age stratum, combined with the standard population's weights
+        strata = pool_years(geography_table(df, ['year', 'age', x_variable, y_variable], geography),
+                            ['age', x_variable, y_variable], selected_year, equal_weight)
+        adjusted = age_adjusted_percentage(strata, [x_variable], y_variable)
+        plot_df = plot_df.drop(columns=interval_columns).merge(adjusted, on=[x_variable, y_variable], how='left')
+        plot_df[['percentage', 'se', 'ci_low', 'ci_high']] = plot_df[['percentage', 'se', 'ci_low', 'ci_high']].fillna(0)
+        plot_df['unreliable'] = plot_df['unreliable'].fillna(True).astype(bool)
+
+    plot_df = plot_df.assign(year=year_range(selected_year)[1]).rename(columns={'wt': 'frequency'})
+    plot_df = plot_df[[x_variable, y_variable, 'year', 'frequency'] + interval_columns]
+    plot_df[['percentage', 'se', 'ci_low', 'ci_high']] = plot_df[['percentage', 'se', 'ci_low', 'ci_high']].round(1)
+    plot_df['percentage_text'] = plot_df['percentage'].apply(lambda x: f'{x:.1f}%')
+    plot_df['formatted_frequency'] = (plot_df['frequency'] / 1e6).round(2).astype(str) + 'M'
 
-    # Prepare data
-    plot_df = filter_and_prepare_data(df, selected_year, demographic, anthro_var)
-    
-    # Get the mapping dictionaries for demographic and anthro_var
-    demographic_mapping = get_mapping_dict(demographic, year=selected_year)
-    anthro_mapping = get_mapping_dict(anthro_var, year=selected_year)
-    
-    # Apply the mappings
-    plot_df[demographic] = plot_df[demographic].map(demographic_mapping)
-    plot_df[anthro_var] = plot_df[anthro_var].map(anthro_mapping)
-    
-    # Generate Plotly bar chart
-    fig = px.bar(
-        plot_df,
-        x=demographic,
-        y='percentage',
-        color=anthro_var,
-        text='formatted_frequency',
-        barmode='group',
-        title=f'{title_dictionary[anthro_var]} by {title_dictionary[demographic]} ({selected_year})',
-        color_discrete_sequence=randomize_colors(px.colors.qualitative.Set3),
-            labels={
-            "formatted_frequency": "Frequency",
-            "percentage": "Percentage",
-            demographic: title_dictionary[demographic],
-            anthro_var: title_dictionary[anthro_var]
-        },
-    )
-    
-    fig.update_layout(
-        template='plotly_dark',
-        plot_bgcolor='white',  # Set plot area background to white
-        paper_bgcolor='rgba(0,0,0,0)',  # Keep the outer background transparent (or dark)
-        font=dict(color='white'),  # Ensure text is visible on the white background
-        xaxis=dict(showgrid=False),  # Optional: light gridlines
-        yaxis=dict(showgrid=True, gridcolor='LightGray'),
-        yaxis_title='Percentage of Demographic Group',
-        xaxis_title=title_dictionary[demographic],
-        uniformtext_minsize=8, uniformtext_mode='hide',
-        title_x=1,
-        title_xanchor='right',
-    )
-    
-    return fig
-
+    return plot_df
 
-def update_dem_chronic_fig(df, selected_year, demographic, chronic_var):
+def prepare_cross_tabs(df, selected_year, x_variables, y_variable, geography='all', equal_weight=False, age_adjusted=False):
     """
-    Generates the figure for the Chronic Conditions graph.
+    prepare_cross_tab for several x variables at once, for multi-select comparisons. All
+    the x variables' cubes come from one stacked_cube pass, and the geography roll-up,
+    year pooling, percentages and intervals are computed once over the stacked cells, so
+    the cost stays flat as the selection grows.
 
     Parameters:
     df (pd.DataFrame): The input DataFrame containing survey data.
-    selected_year (int): The year selected by the user.
-    demographic (str): The demographic variable selected by the user (e.g., 'age', 'sex').
-    chronic_var (str): The specific chronic condition variable to plot (e.g., 'asthma').
+    selected_year (int or list): The year, or [first, last] range of years, to show.
+    x_variables (list): The grouping variables (e.g., ['stroke', 'asthma']).
+    y_variable (str): The variable whose categories are counted (e.g., 'smoking').
+    geography (str or int): 'all', 'region:<name>', 'division:<name>' or a state code.
+    equal_weight (bool): With a range, whether each year counts equally (see pool_years).
+    age_adjusted (bool): Whether to age-standardize the percentages. Ignored for the
+                         'age' facet, or for all of them when y_variable is 'age'.
 
     Returns:
-    plotly.graph_objs._figure.Figure: A Plotly figure for the Chronic Conditions.
+    pd.DataFrame: As prepare_cross_tab, with a facet column naming the x variable of
+                  each row and its codes in the x column.
     """
-    # Prepare data
-    plot_df = filter_and_prepare_data(df, selected_year, demographic, chronic_var)
-    
-    # Get the mapping dictionaries for demographic and chronic_var
-    demographic_mapping = get_mapping_dict(demographic, year=selected_year)
-    chronic_mapping = get_mapping_dict(chronic_var, year=selected_year)
-    
-    # Apply the mappings
-    plot_df[demographic] = plot_df[demographic].map(demographic_mapping)
-    plot_df[chronic_var] = plot_df[chronic_var].map(chronic_mapping)
-    
-    # Generate Plotly bar chart
-    fig = px.bar(
-        plot_df,
-        x=demographic,
-        y='percentage',
-        color=chronic_var,
-        text='formatted_frequency',
-        barmode='group',
-        title=f'{title_dictionary[chronic_var]} by {title_dictionary[demographic]} ({selected_year})',
-        color_discrete_sequence=randomize_colors(px.colors.qualitative.Set3),
-            labels={
-            "formatted_frequency": "Frequency",
-            "percentage": "Percentage",
-            demographic: title_dictionary[demographic],
-            chronic_var: title_dictionary[chronic_var]
-        },
-    )
-    
-    fig.update_layout(
-        template='plotly_dark',
-        plot_bgcolor='white',  # Set plot area background to white
-        paper_bgcolor='rgba(0,0,0,0)',  # Keep the outer background transparent (or dark)
-        font=dict(color='white'),  # Ensure text is visible on the white background
-        xaxis=dict(showgrid=False),  # Optional: light gridlines
-        yaxis=dict(showgrid=True, gridcolor='LightGray'),
-        yaxis_title='Percentage of Demographic Group',
-        xaxis_title=title_dictionary[demographic],
-        uniformtext_minsize=8, uniformtext_mode='hide',
-        title_x=1,
-        title_xanchor='right',
-    )
-    
-    return fig
-
-
-def update_dem_access_fig(df, selected_year, demographic, access_var):
+    def rolled_up(dims):
+        # Sum the selected states' cells, then pool the years
+        cells = stacked_cube(df, x_variables, ['state', 'year'] + dims)
+        states = geography_states(geography)
+        if states is not None:
+            cells = cells.loc[cells['state'].isin(states)]
+        cells = cells.groupby(['facet', 'x', 'year'] + dims, as_index=False, sort=False)[['wt', 'wt2', 'respondents']].sum()
+        return pool_years(cells, ['facet', 'x'] + dims, selected_year, equal_weight)
+
+    plot_df = percentage_intervals(rolled_up([y_variable]), ['facet', 'x'])
+    interval_columns = ['percentage', 'se', 'ci_low', 'ci_high', 'group_respondents', 'unreliable']
+
+    if age_adjusted and y_variable != 'age' and any(variable != 'age' for variable in x_variables):
+        strata = rolled_up(['age', y_variable])
+        adjusted = age_adjusted_percentage(strata.loc[strata['facet'] != 'age'], ['facet', 'x'], y_variable)
+        keep = plot_df['facet'] == 'age'
+        merged = plot_df.loc[~keep].drop(columns=interval_columns).merge(adjusted, on=['facet', 'x', y_variable], how='left')
+        merged[['percentage', 'se', 'ci_low', 'ci_high']] = merged[['percentage', 'se', 'ci_low', 'ci_high']].fillna(0)
+        merged['unreliable'] = merged['unreliable'].fillna(True).astype(bool)
+        plot_df = pd.concat([plot_df.loc[keep], merged], ignore_index=True)
+
+    plot_df = plot_df.assign(year=year_range(selected_year)[1]).rename(columns={'wt': 'frequency'})
+    plot_df = plot_df[['facet', 'x', y_variable, 'year', 'frequency'] + interval_columns]
+    plot_df[['percentage', 'se', 'ci_low', 'ci_high']] = plot_df[['percentage', 'se', 'ci_low', 'ci_high']].round(1)
+    order = {variable: index for index, variable in enumerate(x_variables)}
+    return plot_df.sort_values(['facet', 'x', y_variable], key=lambda column: column.map(order) if column.name == 'facet' else column).reset_index(drop=True)
+
+def prepare_cross_tab_by_year(df, x_variable, y_variable, geography='all', age_adjusted=False):
     """
-    Generates the figure for the Healthcare Access graph.
+    prepare_cross_tab for every survey year at once, for the all-years small multiples.
+    The year stays a dimension of the cube instead of being filtered or pooled, so the
+    full history is one cube read and one pass of percentage_intervals. The result is
+    cached per variable pair, geography and age adjustment.
 
     Parameters:
     df (pd.DataFrame): The input DataFrame containing survey data.
-    selected_year (int): The year selected by the user.
-    demographic (str): The demographic variable selected by the user (e.g., 'age', 'sex').
-    access_var (str): The specific healthcare access variable to plot (e.g., 'health_insurance').
+    x_variable (str): The grouping variable (e.g., 'age').
+    y_variable (str): The variable whose categories are counted (e.g., 'smoking').
+    geography (str or int): 'all', 'region:<name>', 'division:<name>' or a state code.
+    age_adjusted (bool): Whether to age-standardize the percentages. Ignored when
+                         either variable is 'age'.
 
     Returns:
-    plotly.graph_objs._figure.Figure: A Plotly figure for Healthcare Access.
+    pd.DataFrame: As prepare_cross_tab, with one block of rows per year in which both
+                  variables were collected. Callers copy it before changing it.
     """
-    # Prepare data
-    plot_df = filter_and_prepare_data(df, selected_year, demographic, access_var)
-    
-    # Get the mapping dictionaries for demographic and access_var
-    demographic_mapping = get_mapping_dict(demographic, year=selected_year)
-    access_mapping = get_mapping_dict(access_var, year=selected_year)
-    
-    # Apply the mappings
-    plot_df[demographic] = plot_df[demographic].map(demographic_mapping)
-    plot_df[access_var] = plot_df[access_var].map(access_mapping)
-    
-    # Generate Plotly bar chart
-    fig = px.bar(
-        plot_df,
-        x=demographic,
-        y='percentage',
-        color=access_var,
-        text='formatted_frequency',
-        barmode='group',
-        title=f'{title_dictionary[access_var]} by {title_dictionary[demographic]} ({selected_year})',
-        color_discrete_sequence=randomize_colors(px.colors.qualitative.Set3),
-            labels={
-            "formatted_frequency": "Frequency",
-            "percentage": "Percentage",
-            demographic: title_dictionary[demographic],
-            access_var: title_dictionary[access_var]
-        },
-    )
-    
-    fig.update_layout(
-        template='plotly_dark',
-        plot_bgcolor='white',  # Set plot area background to white
-        paper_bgcolor='rgba(0,0,0,0)',  # Keep the outer background transparent (or dark)
-        font=dict(color='white'),  # Ensure text is visible on the white background
-        xaxis=dict(showgrid=False),  # Optional: light gridlines
-        yaxis=dict(showgrid=True, gridcolor='LightGray'),
-        yaxis_title='Percentage of Demographic Group',
-        xaxis_title=title_dictionary[demographic],
-        uniformtext_minsize=8, uniformtext_mode='hide',
-        title_x=1,
-        title_xanchor='right',
-    )
-    
-    return fig
+    age_adjusted = bool(age_adjusted) and 'age' not in (x_variable, y_variable)
+
+    def build():
+        years = sorted(set(available_years(df, x_variable, geography)) & set(available_years(df, y_variable, geography)))
+        cells = geography_table(df, ['year', x_variable, y_variable], geography)
+        plot_df = percentage_intervals(cells.loc[cells['year'].isin(years)], ['year', x_variable])
+        interval_columns = ['percentage', 'se', 'ci_low', 'ci_high', 'group_respondents', 'unreliable']
+
+        if age_adjusted:
+            strata = geography_table(df, ['year', 'age', x_variable, y_variable], geography)
+            adjusted = age_adjusted_percentage(strata.loc[strata['year'].isin(years)], ['year', x_variable], y_variable)
+            plot_df = plot_df.drop(columns=interval_columns).merge(adjusted, on=['year', x_variable, y_variable], how='left')
+            plot_df[['percentage', 'se', 'ci_low', 'ci_high']] = plot_df[['percentage', 'se', 'ci_low', 'ci_high']].fillna(0)
+            plot_df['unreliable'] = plot_df['unreliable'].fillna(True).astype(bool)
+
+        plot_df = plot_df.rename(columns={'wt': 'frequency'})
+        plot_df = plot_df[[x_variable, y_variable, 'year', 'frequency'] + interval_columns]
+        plot_df[['percentage', 'se', 'ci_low', 'ci_high']] = plot_df[['percentage', 'se', 'ci_low', 'ci_high']].round(1)
+        return plot_df.sort_values(['year', x_variable, y_variable]).reset_index(drop=True)
+
+    return cached_table(df, ('cross_tab_by_year', x_variable, y_variable, geography, age_adjusted), build)
+
+def _year_label(selected_year):
+    first, last = year_range(selected_year)
+    return str(first) if first == last else f'{first}-{last}'
+
+def _label_year(selected_year):
+    # Income codes changed in 2021, so ranges spanning the change use the time series labels
+    first, last = year_range(selected_year)
+    if first < 2021 <= last:
+        return None
+    return last
+
+def not_collected_figure(df, variables, selected_year, geography='all', title=None):
+    """
+    Checks the availability index before a figure is built.
 
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+    variables (list): The survey variables the figure needs.
+    selected_year (int or list): The year, or [first, last] range of years, selected by the user.
+    geography (str or int): 'all', 'region:<name>', 'division:<name>' or a state code.
+    title (str): Title of the figure shown instead.
 
-def update_dem_health_fig(df, selected_year, demographic, health_var):
+    Returns:
+    dict or None: A "not collected" figure naming the first missing variable, or None
+                  if every variable was collected in the selection.
     """
-    Generates the figure for the Health Measures graph.
+    for variable in variables:
+        if not variable_available(df, variable, selected_year, geography):
+            place = 'any state' if geography == 'all' else geography_label(geography)
+            return message_figure(
+                f'{title_dictionary.get(variable, variable.title())} was not collected in {place} in {_year_label(selected_year)}',
+                title=title,
+                layout=dict(template='plotly_dark', paper_bgcolor='rgba(0,0,0,0)', font=dict(color='white')),
+            )
+    return None
+
+def availability_options(df, options, selected_year, geography='all'):
+    """
+    Disables the dropdown options whose variable was not collected in the selection.
 
     Parameters:
     df (pd.DataFrame): The input DataFrame containing survey data.
-    selected_year (int): The year selected by the user.
-    demographic (str): The demographic variable selected by the user (e.g., 'age', 'sex').
-    health_var (str): The specific health measure variable to plot (e.g., 'blood_pressure').
+    options (list): Dropdown options with a survey variable as value (e.g., lifestyle_variable_mappings).
+    selected_year (int or list): The year, or [first, last] range of years, selected by the user.
+    geography (str or int): 'all', 'region:<name>', 'division:<name>' or a state code.
 
     Returns:
-    plotly.graph_objs._figure.Figure: A Plotly figure for Health Measures.
+    list: The options, each with a disabled flag.
     """
-    # Prepare data
-    plot_df = filter_and_prepare_data(df, selected_year, demographic, health_var)
-    
-    # Get the mapping dictionaries for demographic and health_var
-    demographic_mapping = get_mapping_dict(demographic, year=selected_year)
-    health_mapping = get_mapping_dict(health_var, year=selected_year)
-    
-    # Apply the mappings
-    plot_df[demographic] = plot_df[demographic].map(demographic_mapping)
-    plot_df[health_var] = plot_df[health_var].map(health_mapping)
-    
-    # Generate Plotly bar chart
-    fig = px.bar(
-        plot_df,
-        x=demographic,
-        y='percentage',
-        color=health_var,
-        text='formatted_frequency',
-        barmode='group',
-        title=f'{title_dictionary[health_var]} by {title_dictionary[demographic]} ({selected_year})',
-        color_discrete_sequence=randomize_colors(px.colors.qualitative.Set3),
-            labels={
-            "formatted_frequency": "Frequency",
-            "percentage": "Percentage",
-            demographic: title_dictionary[demographic],
-            health_var: title_dictionary[health_var]
-        },
-    )
-    
-    fig.update_layout(
-        template='plotly_dark',
-        plot_bgcolor='white',  # Set plot area background to white
-        paper_bgcolor='rgba(0,0,0,0)',  # Keep the outer background transparent (or dark)
-        font=dict(color='white'),  # Ensure text is visible on the white background
-        xaxis=dict(showgrid=False),  # Optional: light gridlines
-        yaxis=dict(showgrid=True, gridcolor='LightGray'),
-        yaxis_title='Percentage of Demographic Group',
-        xaxis_title=title_dictionary[demographic],
-        uniformtext_minsize=8, uniformtext_mode='hide',
-        title_x=1,
-        title_xanchor='right',
-    )
-    
-    return fig
+    return [dict(option, disabled=not variable_available(df, option['value'], selected_year, geography)) for option in options]
+
+def availability_marks(df, variables, geography='all', first=2012, last=2022):
+    """
+    Year slider marks with the years missing any of the variables struck through.
 
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+    variables (list): The survey variables every figure on the page needs.
+    geography (str or int): 'all', 'region:<name>', 'division:<name>' or a state code.
+    first, last (int): The slider's first and last years.
 
-def update_dem_lifestyle_fig(df, selected_year, demographic, lifestyle_var):
+    Returns:
+    dict: Marks keyed by the year as a string.
     """
-    Generates the figure for the Lifestyle graph.
+    collected = set(range(first, last + 1))
+    for variable in variables:
+        collected &= set(available_years(df, variable, geography))
+    return {
+        str(year): str(year) if year in collected
+        else {'label': str(year), 'style': {'color': '#6c757d', 'textDecoration': 'line-through'}}
+        for year in range(first, last + 1)
+    }
+
+def _cross_tab_bar_figure(df, selected_year, x_variable, y_variable, barmode, yaxis_title, title_right=True, geography='all', equal_weight=False, age_adjusted=False, all_years=False):
+    """
+    Builds the bar chart shared by the demographics, lifestyle and health conditions pages:
+    the percentage of each x_variable group falling into each y_variable category. With
+    several x variables selected, draws one subplot per variable (see _facet_cross_tab_figure),
+    and with all_years, one subplot per year (see _all_years_cross_tab_figure).
 
     Parameters:
     df (pd.DataFrame): The input DataFrame containing survey data.
-    selected_year (int): The year selected by the user.
-    demographic (str): The demographic variable selected by the user (e.g., 'age', 'sex').
-    lifestyle_var (str): The specific lifestyle variable to plot (e.g., 'smoking').
+    selected_year (int or list): The year, or [first, last] range of years, selected by the user.
+    x_variable (str or list): The page's variable, or variables, shown along the x-axis (e.g., 'age', 'smoking').
+    y_variable (str): The variable shown as coloured bars (e.g., 'bmi_category').
+    barmode (str): 'group' or 'stack'.
+    yaxis_title (str): Title of the y-axis.
+    title_right (bool): Whether to right-align the figure title.
+    geography (str or int): 'all', 'region:<name>', 'division:<name>' or a state code.
+    equal_weight (bool): With a range of years, whether each year counts equally.
+    age_adjusted (bool): Whether to age-standardize the percentages.
+    all_years (bool): Whether to show every survey year instead of selected_year.
 
     Returns:
-    plotly.graph_objs._figure.Figure: A Plotly figure for Lifestyle.
+    dict: A Plotly figure dictionary.
     """
+    if isinstance(x_variable, (list, tuple)):
+        if not x_variable:
+            return message_figure('Select at least one variable to compare',
+                                  layout=dict(template='plotly_dark', paper_bgcolor='rgba(0,0,0,0)', font=dict(color='white')))
+        if all_years:
+            # Years are the facets, so only the first selected variable is compared
+            return _all_years_cross_tab_figure(df, x_variable[0], y_variable, barmode, yaxis_title, title_right, geography, age_adjusted)
+        if len(x_variable) > 1:
+            return _facet_cross_tab_figure(df, selected_year, list(x_variable), y_variable, barmode, yaxis_title, title_right,
+                                           geography, equal_weight, age_adjusted)
+        x_variable = x_variable[0]
+    elif all_years:
+        return _all_years_cross_tab_figure(df, x_variable, y_variable, barmode, yaxis_title, title_right, geography, age_adjusted)
+
+    # Questions not asked in the selection need no cube lookups
+    title = f'{title_dictionary[y_variable]} by {title_dictionary[x_variable]} ({_year_label(selected_year)})' if geography == 'all' \
+        else f'{title_dictionary[y_variable]} by {title_dictionary[x_variable]}, {geography_label(geography)} ({_year_label(selected_year)})'
+    unavailable = not_collected_figure(df, [x_variable, y_variable], selected_year, geography, title=title)
+    if unavailable is not None:
+        return unavailable
+
     # Prepare data
-    plot_df = filter_and_prepare_data(df, selected_year, demographic, lifestyle_var)
-    
-    # Get the mapping dictionaries for demographic and lifestyle_var
-    demographic_mapping = get_mapping_dict(demographic, year=selected_year)
-    lifestyle_mapping = get_mapping_dict(lifestyle_var, year=selected_year)
-    
+    plot_df = prepare_cross_tab(df, selected_year, x_variable, y_variable, geography, equal_weight, age_adjusted)
+
     # Apply the mappings
-    plot_df[demographic] = plot_df[demographic].map(demographic_mapping)
-    plot_df[lifestyle_var] = plot_df[lifestyle_var].map(lifestyle_mapping)
-    
-    # Generate Plotly bar chart
-    fig = px.bar(
-        plot_df,
-        x=demographic,
-        y='percentage',
-        color=lifestyle_var,
-        text='formatted_frequency',
-        barmode='group',
-        title=f'{title_dictionary[lifestyle_var]} by {title_dictionary[demographic]} ({selected_year})',
-        color_discrete_sequence=randomize_colors(px.colors.qualitative.Set3),
-            labels={
-            "formatted_frequency": "Frequency",
-            "percentage": "Percentage",
-            demographic: title_dictionary[demographic],
-            lifestyle_var: title_dictionary[lifestyle_var]
-        },
-    )
-    
-    fig.update_layout(
+    label_year = _label_year(selected_year)
+    plot_df[x_variable] = plot_df[x_variable].map(get_mapping_dict(x_variable, year=label_year, time_series=label_year is None))
+    plot_df[y_variable] = plot_df[y_variable].map(get_mapping_dict(y_variable, year=label_year, time_series=label_year is None))
+
+    layout = dict(
         template='plotly_dark',
         plot_bgcolor='white',  # Set plot area background to white
         paper_bgcolor='rgba(0,0,0,0)',  # Keep the outer background transparent (or dark)
         font=dict(color='white'),  # Ensure text is visible on the white background
-        xaxis=dict(showgrid=False),  # Optional: light gridlines
-        yaxis=dict(showgrid=True, gridcolor='LightGray'),
-        yaxis_title='Percentage of Demographic Group',
-        xaxis_title=title_dictionary[demographic],
-        uniformtext_minsize=8, uniformtext_mode='hide',
-        title_x=1,
-        title_xanchor='right',
+        xaxis=dict(showgrid=False, title=dict(text=title_dictionary[x_variable])),
+        yaxis=dict(showgrid=True, gridcolor='LightGray', title=dict(text=yaxis_title)),
+        uniformtext=dict(minsize=8, mode='hide'),
     )
-    
-    return fig
-
-def randomize_colors(color_sequence):
-    """
-    Randomizes the order of a given color sequence.
-    
-    Parameters:
-        color_sequence (list): A list of color hex codes or names.
-    
-    Returns:
-        list: A randomized list of the color sequence.
-    """
-    randomized_sequence = color_sequence.copy()  # Copy the original sequence
-    random.shuffle(randomized_sequence)  # Randomize the order
-    return randomized_sequence
+    if title_right:
+        layout['title'] = dict(x=1, xanchor='right')
+    if age_adjusted and 'age' not in (x_variable, y_variable):
+        layout['yaxis']['title']['text'] += ' (Age-Adjusted)'
 
-def update_life_health_fig(df, selected_year, lifestyle, health_var):
-    # Prepare data
-    plot_df = filter_and_prepare_data(df, selected_year, lifestyle, health_var)
-    
-    #cast column to object type
-    plot_df[lifestyle] = plot_df[lifestyle].astype('object')
-    plot_df[health_var] = plot_df[health_var].astype('object')
+    # Bar labels are formatted in the browser instead of sending a string per bar
+    plot_df['frequency_millions'] = (plot_df['frequency'] / 1e6).round(2)
 
-    # Get the mapping dictionaries for lifestyle and health_var
-    lifestyle_mapping = get_mapping_dict(lifestyle, year=selected_year)
-    health_mapping = get_mapping_dict(health_var, year=selected_year)
-    
-    # Apply the mappings
-    plot_df.loc[:, lifestyle] = plot_df[lifestyle].map(lifestyle_mapping)
-    plot_df.loc[:, health_var] = plot_df[health_var].map(health_mapping)
-    
-    # Normalize frequencies to percentages
-    plot_df['percentage'] = plot_df.groupby(lifestyle)['frequency'].apply(lambda x: x / x.sum() * 100).reset_index(drop=True)
-    plot_df['percentage_text'] = plot_df['percentage'].apply(lambda x: f'{x:.1f}%')
-    
-    # Generate Plotly bar chart
-    fig = px.bar(
+    return bar_figure(
         plot_df,
-        x=lifestyle,
+        x=x_variable,
         y='percentage',
-        color=health_var,
-        text='formatted_frequency',
-        barmode='stack',
-        title=f'{title_dictionary[health_var]} by {title_dictionary[lifestyle]} ({selected_year})',
+        color=y_variable,
+        text='frequency_millions',
+        texttemplate='%{text:.2f}M',
+        barmode=barmode,
+        title=title,
         color_discrete_sequence=randomize_colors(px.colors.qualitative.Set3),
         labels={
-            "formatted_frequency": "Frequency",
+            "frequency_millions": "Frequency",
             "percentage": "Percentage",
-            lifestyle: title_dictionary[lifestyle],
-            health_var: title_dictionary[health_var]
+            x_variable: title_dictionary[x_variable],
+            y_variable: title_dictionary[y_variable]
         },
+        layout=layout,
+        interval=('ci_low', 'ci_high'),
+        # Error bars on stacked segments would overlap the segment above, so those only show the interval on hover
+        error_bars=barmode == 'group',
+        hatch='unreliable',
     )
-    
-    fig.update_layout(
+
+def _facet_cross_tab_figure(df, selected_year, x_variables, y_variable, barmode, yaxis_title, title_right, geography, equal_weight, age_adjusted):
+    """
+    The multi-select version of _cross_tab_bar_figure: one subplot per x variable, two
+    to a row, from a single batched prepare_cross_tabs call. Variables not collected in
+    the selection are left out.
+    """
+    place = '' if geography == 'all' else f', {geography_label(geography)}'
+    title = f'{title_dictionary[y_variable]} by Selected Variables{place} ({_year_label(selected_year)})'
+    unavailable = not_collected_figure(df, [y_variable], selected_year, geography, title=title)
+    if unavailable is not None:
+        return unavailable
+    collected = [variable for variable in x_variables if variable_available(df, variable, selected_year, geography)]
+    if not collected:
+        return not_collected_figure(df, x_variables[:1], selected_year, geography, title=title)
+    x_variables = collected
+
+    plot_df = prepare_cross_tabs(df, selected_year, x_variables, y_variable, geography, equal_weight, age_adjusted)
+
+    # Each facet's codes get that variable's labels
+    label_year = _label_year(selected_year)
+    labels = pd.Series(index=plot_df.index, dtype=object)
+    for variable in x_variables:
+        rows = plot_df['facet'] == variable
+        labels[rows] = plot_df.loc[rows, 'x'].map(get_mapping_dict(variable, year=label_year, time_series=label_year is None))
+    plot_df['x'] = labels
+    plot_df[y_variable] = plot_df[y_variable].map(get_mapping_dict(y_variable, year=label_year, time_series=label_year is None))
+    plot_df['frequency_millions'] = (plot_df['frequency'] / 1e6).round(2)
+
+    adjusted = age_adjusted and y_variable != 'age'
+    layout = dict(
         template='plotly_dark',
         plot_bgcolor='white',
         paper_bgcolor='rgba(0,0,0,0)',
         font=dict(color='white'),
-        xaxis=dict(showgrid=False),
-        yaxis=dict(showgrid=True, gridcolor='LightGray'),
-        yaxis_title='Percentage',
-        xaxis_title=title_dictionary[lifestyle],
-        uniformtext_minsize=8, uniformtext_mode='hide',
-        title_x=1,
-        title_xanchor='right',
-    )
-    
-    return fig
-
-def update_life_anthro_fig(df, selected_year, lifestyle, anthro_var):
-        # Prepare data
-    plot_df = filter_and_prepare_data(df, selected_year, lifestyle, anthro_var)
-    
-    # Get the mapping dictionaries for lifestyle and anthro_var
-    lifestyle_mapping = get_mapping_dict(lifestyle, year=selected_year)
-    anthro_mapping = get_mapping_dict(anthro_var, year=selected_year)
-        
-    #cast column to object type
-    plot_df[lifestyle] = plot_df[lifestyle].astype('object')
-    plot_df[anthro_var] = plot_df[anthro_var].astype('object')
-    
-    # Apply the mappings
-    plot_df.loc[:, lifestyle] = plot_df[lifestyle].map(lifestyle_mapping)
-    plot_df.loc[:, anthro_var] = plot_df[anthro_var].map(anthro_mapping)
-    
-    # Generate Plotly bar chart
-    fig = px.bar(
-        plot_df,
-        x=lifestyle,
-        y='percentage',
-        color=anthro_var,
-        text='formatted_frequency',
-        barmode='stack',
-        title=f'{title_dictionary[anthro_var]} by {title_dictionary[lifestyle]} ({selected_year})',
-        color_discrete_sequence=randomize_colors(px.colors.qualitative.Set3),
-            labels={
-            "formatted_frequency": "Frequency",
-            "percentage": "Percentage",
-            lifestyle: title_dictionary[lifestyle],
-            anthro_var: title_dictionary[anthro_var]
-        },
-    )
-    
-    fig.update_layout(
-        template='plotly_dark',
-        plot_bgcolor='white',  # Set plot area background to white
-        paper_bgcolor='rgba(0,0,0,0)',  # Keep the outer background transparent (or dark)
-        font=dict(color='white'),  # Ensure text is visible on the white background
-        xaxis=dict(showgrid=False),  # Optional: light gridlines
-        yaxis=dict(showgrid=True, gridcolor='LightGray'),
-        yaxis_title='Percentage of Lifestyle Group',
-        xaxis_title=title_dictionary[lifestyle],
-        uniformtext_minsize=8, uniformtext_mode='hide',
-        title_x=1,
-        title_xanchor='right',
+        yaxis=dict(showgrid=True, gridcolor='LightGray', title=dict(text=yaxis_title + (' (Age-Adjusted)' if adjusted else ''))),
+        uniformtext=dict(minsize=8, mode='hide'),
     )
-    
-    return fig
+    if title_right:
+        layout['title'] = dict(x=1, xanchor='right')
 
-def update_life_chronic_fig(df, selected_year, lifestyle, chronic_var, weight_col='wt'):
-    # Prepare data
-    plot_df = filter_and_prepare_data(df, selected_year, lifestyle, chronic_var)
-    
-    # Get the mapping dictionaries for lifestyle and chronic_var
-    lifestyle_mapping = get_mapping_dict(lifestyle, year=selected_year)
-    chronic_mapping = get_mapping_dict(chronic_var, year=selected_year)
-    
-    #cast column to object type
-    plot_df[lifestyle] = plot_df[lifestyle].astype('object')
-    plot_df[chronic_var] = plot_df[chronic_var].astype('object')
-    
-    # Apply the mappings
-    plot_df.loc[:, lifestyle] = plot_df[lifestyle].map(lifestyle_mapping)
-    plot_df.loc[:, chronic_var] = plot_df[chronic_var].map(chronic_mapping)
-    
-    # Generate Plotly bar chart
-    fig = px.bar(
+    return facet_bar_figure(
         plot_df,
-        x=lifestyle,
+        facet='facet',
+        x='x',
         y='percentage',
-        color=chronic_var,
-        text='formatted_frequency',
-        barmode='stack',
-        title=f'{title_dictionary[chronic_var]} by {title_dictionary[lifestyle]} ({selected_year})',
+        color=y_variable,
+        facet_titles={variable: title_dictionary[variable] for variable in x_variables},
+        text='frequency_millions',
+        texttemplate='%{text:.2f}M',
+        barmode=barmode,
+        title=title,
         color_discrete_sequence=randomize_colors(px.colors.qualitative.Set3),
         labels={
-            "formatted_frequency": "Frequency",
-            "percentage": "Percentage",
-            lifestyle: title_dictionary[lifestyle],
-            chronic_var: title_dictionary[chronic_var]
+            'frequency_millions': 'Frequency',
+            'percentage': 'Percentage',
+            'x': 'Group',
+            y_variable: title_dictionary[y_variable],
         },
+        layout=layout,
+        interval=('ci_low', 'ci_high'),
+        error_bars=barmode == 'group',
+        hatch='unreliable',
     )
-    
-    fig.update_layout(
+
+def _all_years_cross_tab_figure(df, x_variable, y_variable, barmode, yaxis_title, title_right, geography, age_adjusted):
+    """
+    The all-years version of _cross_tab_bar_figure: one subplot per survey year, four
+    to a row, from a single prepare_cross_tab_by_year call. Years in which either
+    variable was not collected are left out.
+    """
+    place = '' if geography == 'all' else f', {geography_label(geography)}'
+    title = f'{title_dictionary[y_variable]} by {title_dictionary[x_variable]}{place} (All Years)'
+    plot_df = prepare_cross_tab_by_year(df, x_variable, y_variable, geography, age_adjusted).copy()
+    if plot_df.empty:
+        return not_collected_figure(df, [x_variable, y_variable], [ALL_YEARS[0], ALL_YEARS[-1]], geography, title=title) or {}
+
+    # Income codes changed in 2021, so the years share the time series labels
+    plot_df[x_variable] = plot_df[x_variable].map(get_mapping_dict(x_variable, time_series=True))
+    plot_df[y_variable] = plot_df[y_variable].map(get_mapping_dict(y_variable, time_series=True))
+    plot_df['frequency_millions'] = (plot_df['frequency'] / 1e6).round(2)
+
+    adjusted = age_adjusted and 'age' not in (x_variable, y_variable)
+    layout = dict(
         template='plotly_dark',
         plot_bgcolor='white',
         paper_bgcolor='rgba(0,0,0,0)',
         font=dict(color='white'),
-        xaxis=dict(showgrid=False),
-        yaxis=dict(showgrid=True, gridcolor='LightGray'),
-        yaxis_title='Percentage of Lifestyle Group',
-        xaxis_title=title_dictionary[lifestyle],
-        uniformtext_minsize=8, uniformtext_mode='hide',
-        title_x=1,
-        title_xanchor='right',
+        yaxis=dict(showgrid=True, gridcolor='LightGray', title=dict(text=yaxis_title + (' (Age-Adjusted)' if adjusted else ''))),
+        uniformtext=dict(minsize=8, mode='hide'),
     )
-    
-    return fig
-
+    if title_right:
+        layout['title'] = dict(x=1, xanchor='right')
 
-def update_life_access_fig(df, selected_year, lifestyle, access_var, weight_col='wt'):
-    # Prepare data
-    plot_df = filter_and_prepare_data(df, selected_year, lifestyle, access_var)
-    
-    # Get the mapping dictionaries for lifestyle and access_var
-    lifestyle_mapping = get_mapping_dict(lifestyle, year=selected_year)
-    access_mapping = get_mapping_dict(access_var, year=selected_year)
-    
-    #cast column to object type
-    plot_df[lifestyle] = plot_df[lifestyle].astype('object')
-    plot_df[access_var] = plot_df[access_var].astype('object')
-    
-    # Apply the mappings
-    plot_df.loc[:, lifestyle] = plot_df[lifestyle].map(lifestyle_mapping)
-    plot_df.loc[:, access_var] = plot_df[access_var].map(access_mapping)
-    
-    # Generate Plotly bar chart
-    fig = px.bar(
+    return facet_bar_figure(
         plot_df,
-        x=lifestyle,
+        facet='year',
+        x=x_variable,
         y='percentage',
-        color=access_var,
-        text='formatted_frequency',
-        barmode='stack',
-        title=f'{title_dictionary[access_var]} by {title_dictionary[lifestyle]} ({selected_year})',
+        color=y_variable,
+        facet_titles={year: str(year) for year in sorted(plot_df['year'].unique())},
+        columns=ALL_YEARS_COLUMNS,
+        text='frequency_millions',
+        texttemplate='%{text:.2f}M',
+        barmode=barmode,
+        title=title,
         color_discrete_sequence=randomize_colors(px.colors.qualitative.Set3),
         labels={
-            "formatted_frequency": "Frequency",
-            "percentage": "Percentage",
-            lifestyle: title_dictionary[lifestyle],
-            access_var: title_dictionary[access_var]
+            'frequency_millions': 'Frequency',
+            'percentage': 'Percentage',
+            x_variable: title_dictionary[x_variable],
+            y_variable: title_dictionary[y_variable],
         },
+        layout=layout,
+        interval=('ci_low', 'ci_high'),
+        error_bars=barmode == 'group',
+        hatch='unreliable',
     )
-    
-    fig.update_layout(
-        template='plotly_dark',
-        plot_bgcolor='white',
-        paper_bgcolor='rgba(0,0,0,0)',
-        font=dict(color='white'),
-        xaxis=dict(showgrid=False),
-        yaxis=dict(showgrid=True, gridcolor='LightGray'),
-        yaxis_title='Percentage of Lifestyle Group',
-        xaxis_title=title_dictionary[lifestyle],
-        uniformtext_minsize=8, uniformtext_mode='hide',
-        title_x=1,
-        title_xanchor='right',
-    )
-    
-    return fig
-
 
-
-def update_time_series(df, selected_state, variable, all=False):
+def cross_tab_graph_style(x_variables, all_years=False):
     """
-    Generates a time series plot based on the selected variable.
+    Height of a cross-tab graph, growing by a row for every two variables compared, or
+    for every ALL_YEARS_COLUMNS years in the all-years view.
 
     Parameters:
-    df (pd.DataFrame): The input DataFrame containing the survey data.
-    selected_state (str): The state selected by the user.
-    variable (str): The demographic variable to be analyzed.
+    x_variables (str or list): The variable, or variables, selected on the page.
+    all_years (bool): Whether the page shows every survey year.
 
     Returns:
-    plotly.graph_objs._figure.Figure: A Plotly figure representing the time series.
+    dict: The dcc.Graph style.
     """
+    if all_years:
+        rows = -(-len(ALL_YEARS) // ALL_YEARS_COLUMNS)
+    else:
+        count = len(x_variables) if isinstance(x_variables, (list, tuple)) else 1
+        rows = max(1, -(-count // 2))
+    return {'height': f'{400 + 300 * (rows - 1)}px'}
 
-    # Filter the data based on the selected state and ensure it excludes the year 2014
-    time_series_data = filter_and_prepare_data(df, year=None, x_variable='state', y_variable=variable)
-
-    if time_series_data.empty:
-        return {}
-
-    time_series_data = time_series_data.loc[time_series_data['state'] == selected_state]
-    time_series_data = time_series_data.loc[time_series_data['year'].astype(int) != 2014]
-    time_series_data[variable] = time_series_data[variable].map(get_mapping_dict(variable, time_series=True))
+def update_dem_anthro_fig(df, selected_year, demographic, anthro_var, geography='all', equal_weight=False, age_adjusted=False, all_years=False):
+    """
+    Generates the figure for the Anthropometrics & Clinical Measures graph.
+
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+    selected_year (int or list): The year, or [first, last] range of years, selected by the user.
+    demographic (str or list): The demographic variable, or variables, selected by the user (e.g., 'age', ['age', 'sex']).
+    anthro_var (str): The specific anthropometric variable to plot (e.g., 'bmi_category').
+    geography (str or int): 'all', 'region:<name>', 'division:<name>' or a state code.
+    equal_weight (bool): With a range of years, whether each year counts equally.
+    age_adjusted (bool): Whether to age-standardize the percentages.
+
+    Returns:
+    dict: A Plotly figure dictionary for the Anthropometrics & Clinical Measures.
+    """
+    return _cross_tab_bar_figure(df, selected_year, demographic, anthro_var, barmode='group', yaxis_title='Percentage of Demographic Group', geography=geography, equal_weight=equal_weight, age_adjusted=age_adjusted, all_years=all_years)
+
+
+def update_dem_chronic_fig(df, selected_year, demographic, chronic_var, geography='all', equal_weight=False, age_adjusted=False, all_years=False):
+    """
+    Generates the figure for the Chronic Conditions graph.
+
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+    selected_year (int or list): The year, or [first, last] range of years, selected by the user.
+    demographic (str or list): The demographic variable, or variables, selected by the user (e.g., 'age', ['age', 'sex']).
+    chronic_var (str): The specific chronic condition variable to plot (e.g., 'asthma').
+    geography (str or int): 'all', 'region:<name>', 'division:<name>' or a state code.
+    equal_weight (bool): With a range of years, whether each year counts equally.
+    age_adjusted (bool): Whether to age-standardize the percentages.
+
+    Returns:
+    dict: A Plotly figure dictionary for the Chronic Conditions.
+    """
+    return _cross_tab_bar_figure(df, selected_year, demographic, chronic_var, barmode='group', yaxis_title='Percentage of Demographic Group', geography=geography, equal_weight=equal_weight, age_adjusted=age_adjusted, all_years=all_years)
+
+
+def update_dem_access_fig(df, selected_year, demographic, access_var, geography='all', equal_weight=False, age_adjusted=False, all_years=False):
+    """
+    Generates the figure for the Healthcare Access graph.
+
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+    selected_year (int or list): The year, or [first, last] range of years, selected by the user.
+    demographic (str or list): The demographic variable, or variables, selected by the user (e.g., 'age', ['age', 'sex']).
+    access_var (str): The specific healthcare access variable to plot (e.g., 'health_insurance').
+    geography (str or int): 'all', 'region:<name>', 'division:<name>' or a state code.
+    equal_weight (bool): With a range of years, whether each year counts equally.
+    age_adjusted (bool): Whether to age-standardize the percentages.
+
+    Returns:
+    dict: A Plotly figure dictionary for Healthcare Access.
+    """
+    return _cross_tab_bar_figure(df, selected_year, demographic, access_var, barmode='group', yaxis_title='Percentage of Demographic Group', geography=geography, equal_weight=equal_weight, age_adjusted=age_adjusted, all_years=all_years)
+
+
+def update_dem_health_fig(df, selected_year, demographic, health_var, geography='all', equal_weight=False, age_adjusted=False, all_years=False):
+    """
+    Generates the figure for the Health Measures graph.
+
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+    selected_year (int or list): The year, or [first, last] range of years, selected by the user.
+    demographic (str or list): The demographic variable, or variables, selected by the user (e.g., 'age', ['age', 'sex']).
+    health_var (str): The specific health measure variable to plot (e.g., 'blood_pressure').
+    geography (str or int): 'all', 'region:<name>', 'division:<name>' or a state code.
+    equal_weight (bool): With a range of years, whether each year counts equally.
+    age_adjusted (bool): Whether to age-standardize the percentages.
+
+    Returns:
+    dict: A Plotly figure dictionary for Health Measures.
+    """
+    return _cross_tab_bar_figure(df, selected_year, demographic, health_var, barmode='group', yaxis_title='Percentage of Demographic Group', geography=geography, equal_weight=equal_weight, age_adjusted=age_adjusted, all_years=all_years)
+
+
+def update_dem_lifestyle_fig(df, selected_year, demographic, lifestyle_var, geography='all', equal_weight=False, age_adjusted=False, all_years=False):
+    """
+    Generates the figure for the Lifestyle graph.
+
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+    selected_year (int or list): The year, or [first, last] range of years, selected by the user.
+    demographic (str or list): The demographic variable, or variables, selected by the user (e.g., 'age', ['age', 'sex']).
+    lifestyle_var (str): The specific lifestyle variable to plot (e.g., 'smoking').
+    geography (str or int): 'all', 'region:<name>', 'division:<name>' or a state code.
+    equal_weight (bool): With a range of years, whether each year counts equally.
+    age_adjusted (bool): Whether to age-standardize the percentages.
+
+    Returns:
+    dict: A Plotly figure dictionary for Lifestyle.
+    """
+    return _cross_tab_bar_figure(df, selected_year, demographic, lifestyle_var, barmode='group', yaxis_title='Percentage of Demographic Group', geography=geography, equal_weight=equal_weight, age_adjusted=age_adjusted, all_years=all_years)
+
+def randomize_colors(color_sequence):
+    """
+    Randomizes the order of a given color sequence.
+    
+    Parameters:
+        color_sequence (list): A list of color hex codes or names.
+    
+    Returns:
+        list: A randomized list of the color sequence.
+    """
+    randomized_sequence = color_sequence.copy()  # Copy the original sequence
+    random.shuffle(randomized_sequence)  # Randomize the order
+    return randomized_sequence
+
+def update_life_health_fig(df, selected_year, lifestyle, health_var, geography='all', equal_weight=False, age_adjusted=False, all_years=False):
+    return _cross_tab_bar_figure(df, selected_year, lifestyle, health_var, barmode='stack', yaxis_title='Percentage', geography=geography, equal_weight=equal_weight, age_adjusted=age_adjusted, all_years=all_years)
+
+def update_life_anthro_fig(df, selected_year, lifestyle, anthro_var, geography='all', equal_weight=False, age_adjusted=False, all_years=False):
+    return _cross_tab_bar_figure(df, selected_year, lifestyle, anthro_var, barmode='stack', yaxis_title='Percentage of Lifestyle Group', geography=geography, equal_weight=equal_weight, age_adjusted=age_adjusted, all_years=all_years)
+
+def update_life_chronic_fig(df, selected_year, lifestyle, chronic_var, geography='all', equal_weight=False, age_adjusted=False, all_years=False, weight_col='wt'):
+    return _cross_tab_bar_figure(df, selected_year, lifestyle, chronic_var, barmode='stack', yaxis_title='Percentage of Lifestyle Group', geography=geography, equal_weight=equal_weight, age_adjusted=age_adjusted, all_years=all_years)
+
+
+def update_life_access_fig(df, selected_year, lifestyle, access_var, geography='all', equal_weight=False, age_adjusted=False, all_years=False, weight_col='wt'):
+    return _cross_tab_bar_figure(df, selected_year, lifestyle, access_var, barmode='stack', yaxis_title='Percentage of Lifestyle Group', geography=geography, equal_weight=equal_weight, age_adjusted=age_adjusted, all_years=all_years)
+
+
+
+def prepare_state_time_series(df, selected_state, variable, all=False, age_adjusted=False):
+    """
+    Weighted frequency and percentage of each category of the variable per year, for one
+    state, a Census region or division, or the whole country. Read from the state x year x
+    variable cube, so only the selected states' cells are touched, and cached so the
+    overview time series and stacked bar share one frame.
+
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing the survey data.
+    selected_state (int or str): The state code, or a geography such as 'region:South',
+                                 selected by the user. Ignored if all is True.
+    variable (str): The demographic variable to be analyzed.
+    all (bool): If True, sums every state into a national total.
+    age_adjusted (bool): Whether to age-standardize the percentages (not for 'age' itself).
+
+    Returns:
+    pd.DataFrame: Columns year, the variable (mapped to labels), frequency, percentage,
+                  percentage_text and formatted_frequency, for the years the variable was
+                  collected in (see available_years).
+    """
+    def build():
+        geography = 'all' if all else selected_state
+        freq_df = geography_table(df, ['year', variable], geography)[['year', variable, 'wt']]
+
+        freq_df = freq_df.loc[freq_df['year'].isin(available_years(df, variable, geography))].rename(columns={'wt': 'frequency'}).reset_index(drop=True)
+        if age_adjusted and variable != 'age':
+            strata = geography_table(df, ['year', 'age', variable], geography)
+            freq_df = freq_df.merge(age_adjusted_percentage(strata, ['year'], variable), on=['year', variable], how='left')
+            freq_df['percentage'] = freq_df['percentage'].fillna(0).round(1)
+        else:
+            freq_df['percentage'] = (freq_df['frequency'] / freq_df.groupby('year')['frequency'].transform('sum') * 100).round(1)
+        freq_df['percentage_text'] = freq_df['percentage'].apply(lambda x: f'{x:.1f}%')
+        freq_df['formatted_frequency'] = (freq_df['frequency'] / 1e6).round(2).astype(str) + 'M'
+        freq_df[variable] = freq_df[variable].map(get_mapping_dict(variable, time_series=True))
+        return freq_df
+
+    return cached_table(df, ('state_time_series', 'all' if all else selected_state, variable, age_adjusted), build)
+
+def update_time_series(df, selected_state, variable, all=False):
+    """
+    Generates a time series plot based on the selected variable.
+
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing the survey data.
+    selected_state (str): The state selected by the user.
+    variable (str): The demographic variable to be analyzed.
+    all (bool): If True, plots the national total instead of one state.
+
+    Returns:
+    dict: A Plotly figure dictionary representing the time series.
+    """
+
+    time_series_data = prepare_state_time_series(df, selected_state, variable, all=all)
+
+    if time_series_data.empty:
+        return not_collected_figure(df, [variable], [2012, 2022], 'all' if all else selected_state) or {}
 
     # Calculate the total frequency for each year
     total_per_year = time_series_data.groupby('year')['frequency'].sum().reset_index()
     total_per_year['formatted_total'] = total_per_year['frequency'].apply(lambda x: f'{x / 1e6:.2f}M')
 
     # Generate the stacked area plot
-    fig = px.area(
+    fig = area_figure(
         time_series_data,
         x='year',
         y='frequency',
         color=variable,
-        title=f'Population by {variable.title()} in {state_mapping[selected_state]} (2012-2022)',
+        title=f'Population by {variable.title()} in {geography_label("all" if all else selected_state)} (2012-2022)',
         labels={
             variable: variable.title(),
             'frequency': 'Count',
             'year': 'Year',
             'formatted_frequency': 'Count (Millions)'
-        }
-    )
-
-    # Update layout to adjust the y-axis range and hover mode
-    fig.update_layout(
-        hovermode='x unified',
-        yaxis=dict(range=[0, total_per_year['frequency'].max() * 1.1]),
-        xaxis=dict(tickmode='linear', tick0=2012, dtick=1)  # Ensure yearly ticks
+        },
+        # Adjust the y-axis range and hover mode
+        layout=dict(
+            hovermode='x unified',
+            yaxis=dict(range=[0, total_per_year['frequency'].max() * 1.1]),
+            xaxis=dict(tickmode='linear', tick0=2012, dtick=1)  # Ensure yearly ticks
+        )
     )
 
     # Add the total text to the plot
-    for year, formatted_total in zip(total_per_year['year'], total_per_year['formatted_total']):
-        fig.add_annotation(
-            x=year,
-            y=total_per_year.loc[total_per_year['year'] == year, 'frequency'].values[0],
-            text=formatted_total,
-            showarrow=False,
-            yshift=10
-        )
+    fig['layout']['annotations'] = [
+        dict(x=year, y=total, text=formatted_total, showarrow=False, yshift=10)
+        for year, total, formatted_total in zip(total_per_year['year'], total_per_year['frequency'], total_per_year['formatted_total'])
+    ]
 
     return fig
 
-def update_overview_bar(df, selected_state, variable, all=False):
+def update_overview_bar(df, selected_state, variable, all=False, age_adjusted=False):
     """
     Generates a stacked bar chart based on the selected variable.
 
@@ -1109,46 +1293,42 @@ def update_overview_bar(df, selected_state, variable, all=False):
     df (pd.DataFrame): The input DataFrame containing the survey data.
     selected_state (str): The state selected by the user.
     variable (str): The variable to group by in the stacked bar chart.
+    all (bool): If True, plots the national total instead of one state.
+    age_adjusted (bool): Whether to age-standardize the percentages.
 
     Returns:
-    plotly.graph_objs._figure.Figure: A Plotly figure representing the stacked bar chart.
+    dict: A Plotly figure dictionary representing the stacked bar chart.
     """
 
-    # Filter the data based on the selected state and ensure it excludes the year 2014
-    filtered_data = filter_and_prepare_data(df, year=None, x_variable='state', y_variable=variable)
+    filtered_data = prepare_state_time_series(df, selected_state, variable, all=all, age_adjusted=age_adjusted)
 
     if filtered_data.empty:
-        return {}
-
-    filtered_data = filtered_data.loc[filtered_data['state'] == selected_state]
-    filtered_data = filtered_data.loc[filtered_data['year'].astype(int) != 2014]
-    filtered_data[variable] = filtered_data[variable].map(get_mapping_dict(variable, time_series=True))
+        return not_collected_figure(df, [variable], [2012, 2022], 'all' if all else selected_state) or {}
 
     # Generate the stacked bar chart
-    fig = px.bar(
+    fig = bar_figure(
         filtered_data,
         x='year',
         y='percentage',
         color=variable,
-        text='percentage_text',
-        title=f'{variable.title()} as a Percentage of Population in {state_mapping[selected_state]} (2012-2022)',
+        texttemplate='%{y:.1f}%',
+        barmode='stack',
+        title=f'{variable.title()} as a Percentage of Population in {geography_label("all" if all else selected_state)} (2012-2022)',
         labels={
             variable: variable.title(),
-            'percentage': 'Percentage',
-            'year': 'Year',
-            'percentage_text': 'Percentage'
-        }
-    )
-
-    # Update layout to adjust the y-axis range and hover mode
-    fig.update_layout(
-        barmode='stack',
-        hovermode='x unified',
-        yaxis=dict(range=[0, 100]),
-        xaxis=dict(tickmode='linear', tick0=2012, dtick=1)  # Ensure yearly ticks
+            'percentage': 'Percentage (Age-Adjusted)' if age_adjusted and variable != 'age' else 'Percentage',
+            'year': 'Year'
+        },
+        # Adjust the y-axis range and hover mode
+        layout=dict(
+            hovermode='x unified',
+            yaxis=dict(range=[0, 100]),
+            xaxis=dict(tickmode='linear', tick0=2012, dtick=1)  # Ensure yearly ticks
+        )
     )
 
-    fig.update_traces(textposition='inside')
+    for trace in fig['data']:
+        trace['textposition'] = 'inside'
 
     return fig
 
@@ -1157,303 +1337,509 @@ def update_overview_bar(df, selected_state, variable, all=False):
 def percentage_plot(df, variable):
     pass
 
-def update_chronic_anthro_fig(df, selected_year, chronic_condition, anthro_var):
-    # Prepare data
-    plot_df = filter_and_prepare_data(df, selected_year, chronic_condition, anthro_var)
+def update_chronic_anthro_fig(df, selected_year, chronic_condition, anthro_var, geography='all', equal_weight=False, age_adjusted=False, all_years=False):
+    return _cross_tab_bar_figure(df, selected_year, chronic_condition, anthro_var, barmode='group', yaxis_title='Percentage of Group', title_right=False, geography=geography, equal_weight=equal_weight, age_adjusted=age_adjusted, all_years=all_years)
 
-    # Get the mapping dictionaries for chronic_condition and anthro_var
-    chronic_mapping = get_mapping_dict(chronic_condition, year=selected_year)
-    anthro_mapping = get_mapping_dict(anthro_var, year=selected_year)
+def update_chronic_health_fig(df, selected_year, chronic_condition, health_var, geography='all', equal_weight=False, age_adjusted=False, all_years=False):
+    return _cross_tab_bar_figure(df, selected_year, chronic_condition, health_var, barmode='group', yaxis_title='Percentage of Group', title_right=False, geography=geography, equal_weight=equal_weight, age_adjusted=age_adjusted, all_years=all_years)
 
-    # Apply the mappings
-    plot_df[chronic_condition] = plot_df[chronic_condition].map(chronic_mapping)
-    plot_df[anthro_var] = plot_df[anthro_var].map(anthro_mapping)
+def update_chronic_lifestyle_fig(df, selected_year, chronic_condition, lifestyle_var, geography='all', equal_weight=False, age_adjusted=False, all_years=False):
+    return _cross_tab_bar_figure(df, selected_year, chronic_condition, lifestyle_var, barmode='group', yaxis_title='Percentage of Group', title_right=False, geography=geography, equal_weight=equal_weight, age_adjusted=age_adjusted, all_years=all_years)
 
-    #generate Plotly bar chart
-    fig = px.bar(
-        plot_df,
-        x=chronic_condition,
-        y='percentage',
-        color=anthro_var,
-        text='formatted_frequency',
-        barmode='group',
-        title=f'{title_dictionary[anthro_var]} by {title_dictionary[chronic_condition]} ({selected_year})',
-        color_discrete_sequence=randomize_colors(px.colors.qualitative.Set3),
-            labels={
-            "formatted_frequency": "Frequency",
-            "percentage": "Percentage",
-            chronic_condition: title_dictionary[chronic_condition],
-            anthro_var: title_dictionary[anthro_var]
-        },
-    )
+def update_chronic_access_fig(df, selected_year, chronic_condition, access_var, geography='all', equal_weight=False, age_adjusted=False, all_years=False):
+    return _cross_tab_bar_figure(df, selected_year, chronic_condition, access_var, barmode='group', yaxis_title='Percentage of Group', title_right=False, geography=geography, equal_weight=equal_weight, age_adjusted=age_adjusted, all_years=all_years)
 
-    fig.update_layout(
-        template='plotly_dark',
-        plot_bgcolor='white',  # Set plot area background to white
-        paper_bgcolor='rgba(0,0,0,0)',  # Keep the outer background transparent (or dark)
-        font=dict(color='white'),  # Ensure text is visible on the white background
-        xaxis=dict(showgrid=False),  # Optional: light gridlines
-        yaxis=dict(showgrid=True, gridcolor='LightGray'),
-        yaxis_title='Percentage of Group',
-        xaxis_title=title_dictionary[chronic_condition],
-        uniformtext_minsize=8, uniformtext_mode='hide'
-    )
+import pandas as pd
 
-    return fig
+def get_kpi_card_info(df, selected_state, selected_year):
+    """
+    The KPI card values of a state and year and their change since the previous year,
+    read from the precomputed kpi_table.
 
-def update_chronic_health_fig(df, selected_year, chronic_condition, health_var):
-    # Prepare data
-    plot_df = filter_and_prepare_data(df, selected_year, chronic_condition, health_var)
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+    selected_state (int): The state code.
+    selected_year (int): The year shown on the card.
 
-    # Get the mapping dictionaries for chronic_condition and health_var
-    chronic_mapping = get_mapping_dict(chronic_condition, year=selected_year)
-    health_mapping = get_mapping_dict(health_var, year=selected_year)
+    Returns:
+    tuple: The population, average age, employment rate and median income displays,
+           each followed by its change display.
+    """
+    kpis = kpi_table(df)
+    kpis = kpis[kpis['state'] == selected_state].set_index('year')
+    empty = pd.Series(np.nan, index=['population', 'avg_age', 'employment_rate', 'median_income'])
+    current = kpis.loc[selected_year] if selected_year in kpis.index else empty
+    previous = kpis.loc[selected_year - 1] if selected_year - 1 in kpis.index else empty
 
-    # Apply the mappings
-    plot_df[chronic_condition] = plot_df[chronic_condition].map(chronic_mapping)
-    plot_df[health_var] = plot_df[health_var].map(health_mapping)
+    population = current['population'] if not np.isnan(current['population']) else 0
+    avg_age = current['avg_age']
+    employment = current['employment_rate']
+    income = current['median_income']
 
-    #generate Plotly bar chart
-    fig = px.bar(
-        plot_df,
-        x=chronic_condition,
-        y='percentage',
-        color=health_var,
-        text='formatted_frequency',
-        barmode='group',
-        title=f'{title_dictionary[health_var]} by {title_dictionary[chronic_condition]} ({selected_year})',
-        color_discrete_sequence=randomize_colors(px.colors.qualitative.Set3),
-            labels={
-            "formatted_frequency": "Frequency",
-            "percentage": "Percentage",
-            chronic_condition: title_dictionary[chronic_condition],
-            health_var: title_dictionary[health_var]
-        },
-    )
+    population_change = population_change_percent = "N/A"
+    avg_age_change = avg_age_change_percent = "N/A"
+    employment_change = employment_change_percent = "N/A"
+    income_change = income_change_percent = "N/A"
 
-    fig.update_layout(
-        template='plotly_dark',
-        plot_bgcolor='white',  # Set plot area background to white
-        paper_bgcolor='rgba(0,0,0,0)',  # Keep the outer background transparent (or dark)
-        font=dict(color='white'),  # Ensure text is visible on the white background
-        xaxis=dict(showgrid=False),  # Optional: light gridlines
-        yaxis=dict(showgrid=True, gridcolor='LightGray'),
-        yaxis_title='Percentage of Group',
-        xaxis_title=title_dictionary[chronic_condition],
-        uniformtext_minsize=8, uniformtext_mode='hide'
-    )
+    previous_population = previous['population']
+    if previous_population > 0:
+        population_change = population - previous_population
+        population_change_percent = (population_change / previous_population) * 100
 
-    return fig
+    previous_avg_age = previous['avg_age']
+    if not np.isnan(previous_avg_age) and not np.isnan(avg_age):
+        avg_age_change = avg_age - previous_avg_age
+        avg_age_change_percent = (avg_age_change / previous_avg_age) * 100
 
-def update_chronic_lifestyle_fig(df, selected_year, chronic_condition, lifestyle_var):
-    # Prepare data
-    plot_df = filter_and_prepare_data(df, selected_year, chronic_condition, lifestyle_var)
+    previous_employment = previous['employment_rate']
+    if not np.isnan(previous_employment) and not np.isnan(employment):
+        employment_change = employment - previous_employment
+        employment_change_percent = employment_change
 
-    # Get the mapping dictionaries for chronic_condition and lifestyle_var
-    chronic_mapping = get_mapping_dict(chronic_condition, year=selected_year)
-    lifestyle_mapping = get_mapping_dict(lifestyle_var, year=selected_year)
+    previous_income = previous['median_income']
+    if not np.isnan(previous_income) and not np.isnan(income):
+        income_change = income - previous_income
+        income_change_percent = (income_change / previous_income) * 100
 
-    # Apply the mappings
-    plot_df[chronic_condition] = plot_df[chronic_condition].map(chronic_mapping)
-    plot_df[lifestyle_var] = plot_df[lifestyle_var].map(lifestyle_mapping)
+    population_display = f"{population:,.0f}"  # Format population with commas
+    avg_age_display = f"{avg_age:.1f}"  # Format average age to one decimal place
+    employment_display = f"{employment:.1f}%"
+    income_display = f"${income:,.0f}"
 
-    #generate Plotly bar chart
-    fig = px.bar(
-        plot_df,
-        x=chronic_condition,
-        y='percentage',
-        color=lifestyle_var,
-        text='formatted_frequency',
-        barmode='group',
-        title=f'{title_dictionary[lifestyle_var]} by {title_dictionary[chronic_condition]} ({selected_year})',
-        color_discrete_sequence=randomize_colors(px.colors.qualitative.Set3),
-            labels={
-            "formatted_frequency": "Frequency",
-            "percentage": "Percentage",
-            chronic_condition: title_dictionary[chronic_condition],
-            lifestyle_var: title_dictionary[lifestyle_var]
-        },
-    )
+    population_change_display = format_change(population_change, population_change_percent)
+    avg_age_change_display = format_change(avg_age_change, avg_age_change_percent, decimal=True)
+    employment_change_display = format_change(employment_change, employment_change_percent, decimal=True, rate=True)
+    income_change_display = format_change(income_change, income_change_percent, income=True)
 
-    fig.update_layout(
-        template='plotly_dark',
-        plot_bgcolor='white',  # Set plot area background to white
-        paper_bgcolor='rgba(0,0,0,0)',  # Keep the outer background transparent (or dark)
-        font=dict(color='white'),  # Ensure text is visible on the white background
-        xaxis=dict(showgrid=False),  # Optional: light gridlines
-        yaxis=dict(showgrid=True, gridcolor='LightGray'),
-        yaxis_title='Percentage of Group',
-        xaxis_title=title_dictionary[chronic_condition],
-        uniformtext_minsize=8, uniformtext_mode='hide'
-    )
 
-    return fig
+    return (population_display, population_change_display, avg_age_display, avg_age_change_display, employment_display, employment_change_display, income_display, income_change_display)
 
-def update_chronic_access_fig(df, selected_year, chronic_condition, access_var):
-    # Prepare data
-    plot_df = filter_and_prepare_data(df, selected_year, chronic_condition, access_var)
+def get_kpi_sparklines(df, selected_state, selected_year):
+    """
+    Trend lines of the four KPI card values over every survey year, with the
+    selected year marked. Read from the precomputed kpi_table.
 
-    # Get the mapping dictionaries for chronic_condition and access_var
-    chronic_mapping = get_mapping_dict(chronic_condition, year=selected_year)
-    access_mapping = get_mapping_dict(access_var, year=selected_year)
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+    selected_state (int): The state code.
+    selected_year (int): The year to mark.
 
-    # Apply the mappings
-    plot_df[chronic_condition] = plot_df[chronic_condition].map(chronic_mapping)
-    plot_df[access_var] = plot_df[access_var].map(access_mapping)
+    Returns:
+    list: Figure dictionaries for population, average age, employment rate and median income.
+    """
+    kpis = kpi_table(df)
+    kpis = kpis[kpis['state'] == selected_state]
 
-    #generate Plotly bar chart
-    fig = px.bar(
-        plot_df,
-        x=chronic_condition,
-        y='percentage',
-        color=access_var,
-        text='formatted_frequency',
-        barmode='group',
-        title=f'{title_dictionary[access_var]} by {title_dictionary[chronic_condition]} ({selected_year})',
-        color_discrete_sequence=randomize_colors(px.colors.qualitative.Set3),
-            labels={
-            "formatted_frequency": "Frequency",
-            "percentage": "Percentage",
-            chronic_condition: title_dictionary[chronic_condition],
-            access_var: title_dictionary[access_var]
-        },
+    return [
+        sparkline_figure(kpis, 'year', 'population', highlight=selected_year, hoverformat=',.0f'),
+        sparkline_figure(kpis, 'year', 'avg_age', highlight=selected_year, hoverformat='.1f'),
+        sparkline_figure(kpis, 'year', 'employment_rate', highlight=selected_year, hoverformat='.1f'),
+        sparkline_figure(kpis, 'year', 'median_income', highlight=selected_year, hoverformat='$,.0f'),
+    ]
+
+def get_ranking_page(df, selected_year, metrics, sort_by, page_current, page_size):
+    """
+    One page of the state ranking table, sorted on the server. Reads the precomputed
+    state_metrics_table, so sorting and paging only touch the year's state rows.
+
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+    selected_year (int): The year to rank.
+    metrics (list): The metrics in ranking_metric_mappings to show.
+    sort_by (list): The DataTable sort_by property, e.g. [{'column_id': 'obese', 'direction': 'desc'}].
+                    Columns no longer shown are ignored.
+    page_current (int): The zero-based page number.
+    page_size (int): The number of rows per page.
+
+    Returns:
+    tuple: The rows of the page (list of dicts), the table columns and the number of pages.
+    """
+    labels = {metric['value']: metric['label'] for metric in ranking_metric_mappings}
+    metrics = [metric for metric in metrics if metric in labels]
+
+    table = state_metrics_table(df)
+    table = table.loc[table['year'] == selected_year, ['state'] + metrics + [f'{metric}_pct' for metric in metrics]].copy()
+    table.insert(0, 'state_name', table['state'].map(get_mapping_dict('state')))
+
+    # Rank follows the default order, and a sort left on a metric that was removed falls back to it
+    sort_column, ascending = (metrics[0] if metrics else 'state_name'), False
+    reverse = False
+    if sort_by and sort_by[0]['column_id'] == 'rank':
+        reverse = sort_by[0]['direction'] == 'desc'
+    elif sort_by and sort_by[0]['column_id'] in table.columns:
+        sort_column = sort_by[0]['column_id']
+        ascending = sort_by[0]['direction'] == 'asc'
+    table = table.sort_values(sort_column, ascending=ascending, na_position='last', kind='stable')
+    table.insert(0, 'rank', np.arange(1, len(table) + 1))
+    if reverse:
+        table = table.iloc[::-1]
+
+    page = table.iloc[page_current * page_size:(page_current + 1) * page_size].round(1)
+
+    columns = [{'name': ['', 'Rank'], 'id': 'rank'}, {'name': ['', 'State'], 'id': 'state_name'}]
+    for metric in metrics:
+        columns.append({'name': [labels[metric], 'Value'], 'id': metric, 'type': 'numeric'})
+        columns.append({'name': [labels[metric], 'Percentile'], 'id': f'{metric}_pct', 'type': 'numeric'})
+
+    page_count = max(1, -(-len(table) // page_size))
+
+    return page.drop(columns='state').to_dict('records'), columns, page_count
+
+def get_top_movers(df, year_a, year_b, min_respondents=50, top_n=25, variables=None):
+    """
+    The state, variable and answer combinations whose weighted prevalence changed most
+    between two years, labelled for display.
+
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+    year_a (int): The earlier year.
+    year_b (int): The later year.
+    min_respondents (int): The minimum number of respondents in both years.
+    top_n (int): The number of movers to return.
+    variables (list or None): Restricts the result to these survey variables.
+
+    Returns:
+    list: One dict per mover with state, variable, answer, percentage_a, percentage_b,
+          change, respondents_a and respondents_b.
+    """
+    movers = prevalence_movers(df, year_a, year_b, min_respondents)
+    if variables:
+        movers = movers.loc[movers['variable'].isin(variables)]
+    movers = movers.head(top_n).copy()
+
+    movers['answer'] = [get_mapping_dict(variable, year=year_b).get(code, code) for variable, code in zip(movers['variable'], movers['code'])]
+    movers['state'] = movers['state'].map(get_mapping_dict('state'))
+    movers['variable'] = movers['variable'].astype(str).map(title_dictionary)
+
+    columns = ['state', 'variable', 'answer', 'percentage_a', 'percentage_b', 'change', 'respondents_a', 'respondents_b']
+    return movers[columns].round(1).to_dict('records')
+
+def update_association_heatmap(df, selected_year):
+    """
+    Generates the heatmap of weighted Cramér's V between every pair of survey variables.
+
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+    selected_year (int): The year selected by the user.
+
+    Returns:
+    dict: A Plotly figure dictionary for the association heatmap.
+    """
+    matrix = association_matrix(df, selected_year)
+    labels = [title_dictionary.get(variable, variable.title()) for variable in matrix.index]
+
+    return heatmap_figure(
+        matrix.to_numpy(),
+        x_labels=labels,
+        y_labels=labels,
+        title=f"Association Between Survey Variables (Cramér's V, {selected_year})",
+        zmin=0,
+        zmax=1,
+        colorscale=px.colors.sequential.speed,
+        value_label="Cramér's V",
+        layout=dict(
+            template='plotly_dark',
+            paper_bgcolor='rgba(0,0,0,0)',
+            margin=dict(l=10, r=10, t=60, b=10),
+        ),
     )
 
-    fig.update_layout(
-        template='plotly_dark',
-        plot_bgcolor='white',  # Set plot area background to white
-        paper_bgcolor='rgba(0,0,0,0)',  # Keep the outer background transparent (or dark)
-        font=dict(color='white'),  # Ensure text is visible on the white background
-        xaxis=dict(showgrid=False),  # Optional: light gridlines
-        yaxis=dict(showgrid=True, gridcolor='LightGray'),
-        yaxis_title='Percentage of Group',
-        xaxis_title=title_dictionary[chronic_condition],
-        uniformtext_minsize=8, uniformtext_mode='hide'
+def _similarity(df, selected_year, groups):
+    # The clustering of the variables in the selected groups, or None if there is nothing to compare
+    variables = [variable for option in similarity_group_mappings if option['value'] in (groups or []) for variable in option['variables']]
+    if not variables:
+        return None
+    similarity = state_similarity(df, selected_year, variables)
+    if len(similarity['states']) < 2 or similarity['features'] == 0:
+        return None
+    return similarity
+
+def update_similarity_heatmap(df, selected_year, groups, clusters):
+    """
+    Generates the heatmap of distances between the states' health profiles, with the
+    states in the leaf order of their clustering and each cluster outlined.
+
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+    selected_year (int): The year selected by the user.
+    groups (list): The values of similarity_group_mappings whose variables make up the profiles.
+    clusters (int): The number of clusters outlined.
+
+    Returns:
+    dict: A Plotly figure dictionary for the distance heatmap.
+    """
+    layout = dict(template='plotly_dark', paper_bgcolor='rgba(0,0,0,0)', margin=dict(l=10, r=10, t=60, b=10))
+    similarity = _similarity(df, selected_year, groups)
+    if similarity is None:
+        return message_figure('Select at least one group of variables collected in this year', layout=layout)
+
+    leaves = similarity['leaves']
+    states = [state_mapping.get(int(state), str(state)) for state in similarity['states'][leaves]]
+    distances = similarity['distances'][np.ix_(leaves, leaves)]
+
+    # Clusters are contiguous in leaf order, so each one is a square on the diagonal
+    sizes = state_clusters(similarity, clusters)['cluster'].value_counts().sort_index().to_numpy()
+    bounds = np.concatenate([[0], np.cumsum(sizes)]) - 0.5
+    layout['shapes'] = [
+        dict(type='rect', xref='x', yref='y', x0=low, x1=high, y0=low, y1=high, line=dict(color='white', width=2))
+        for low, high in zip(bounds[:-1], bounds[1:])
+    ]
+
+    return heatmap_figure(
+        distances,
+        x_labels=states,
+        y_labels=states,
+        title=f"Distance Between State Health Profiles ({selected_year}, {similarity['features']} answers)",
+        zmin=0,
+        colorscale=px.colors.sequential.Viridis,
+        value_label='Distance',
+        layout=layout,
     )
 
-    return fig
+def update_cluster_map(df, selected_year, groups, clusters):
+    """
+    Generates the choropleth of the states coloured by their cluster of similar health
+    profiles.
 
-import pandas as pd
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+    selected_year (int): The year selected by the user.
+    groups (list): The values of similarity_group_mappings whose variables make up the profiles.
+    clusters (int): The number of clusters.
 
-def calculate_weighted_median_income(filtered_df, selected_year):
-    # Define income ranges for interpolation
-    if selected_year >= 2021:
-        income_ranges = {
-            1: (0, 15000),
-            2: (15000, 25000),
-            3: (25000, 35000),
-            4: (35000, 50000),
-            5: (50000, 100000),
-            6: (100000, 200000),
-            7: (200000, float('inf')),
-        }
-        bound_multiplier = 1.5
-    else:
-        income_ranges = {
-            1: (0, 15000),
-            2: (15000, 25000),
-            3: (25000, 35000),
-            4: (35000, 50000),
-            5: (50000, float('inf')),
-        }
-        bound_multiplier = 2
-    
-    # Filter out 'Other' (-1) income category
-    filtered_df = filtered_df[filtered_df['income'] != -1]
-    
-    # Sort by income bracket
-    filtered_df = filtered_df.sort_values('income', ascending=True)
-    
-    # Calculate cumulative weight
-    filtered_df['cum_weight'] = filtered_df['wt'].cumsum()
-    
-    # Calculate the median weight (which is 50% of the total weight)
-    total_weight = filtered_df['wt'].sum()
-    median_weight = total_weight / 2.0
-    
-    # Find the row where cumulative weight first exceeds the median weight
-    median_row = filtered_df[filtered_df['cum_weight'] >= median_weight].iloc[0]
-    
-    # Determine the income bracket
-    income_bracket = median_row['income']
-    
-    # Get the cumulative weight just before the median weight
-    previous_cum_weights = filtered_df[filtered_df['cum_weight'] < median_weight]['cum_weight']
-    if not previous_cum_weights.empty:
-        previous_cum_weight = previous_cum_weights.max()
-    else:
-        previous_cum_weight = 0
-    
-    # Linear interpolation within the income bracket
-    lower_bound, upper_bound = income_ranges[income_bracket]
-    weight_in_bracket = median_weight - previous_cum_weight
-    weight_in_current_bracket = median_row['wt']
-    
-    if upper_bound == float('inf'):
-        # If the upper bound is infinity, assume it's a large value for interpolation
-        upper_bound = lower_bound * bound_multiplier
-    
-    median_income = lower_bound + (weight_in_bracket / weight_in_current_bracket) * (upper_bound - lower_bound)
-    
-    return median_income
+    Returns:
+    dict: A Plotly figure dictionary for the cluster map.
+    """
+    layout = dict(template='plotly_dark', paper_bgcolor='rgba(0,0,0,0)', geo=dict(bgcolor='rgba(0,0,0,0)'))
+    similarity = _similarity(df, selected_year, groups)
+    if similarity is None:
+        return message_figure('Select at least one group of variables collected in this year', layout=layout)
 
-def get_kpi_card_info(df, selected_state, selected_year):
-    filtered_df = df[(df['year'] == selected_year) & (df['state'] == selected_state)]
+    plot_df = state_clusters(similarity, clusters).sort_values('cluster')
+    plot_df['state'] = plot_df['state'].map(lambda state: state_mapping.get(int(state), str(state)))
+    plot_df['cluster'] = 'Cluster ' + plot_df['cluster'].astype(str)
 
-    population = filtered_df['wt'].sum()
+    return category_choropleth_figure(
+        plot_df,
+        locations='state',
+        color='cluster',
+        color_discrete_sequence=px.colors.qualitative.Set2,
+        labels={'state': 'State', 'cluster': 'Cluster'},
+        title=f'States Clustered by Health Profile ({selected_year})',
+        layout=layout,
+    )
 
-    if population > 0:
-        avg_age = (filtered_df['age_midpoint'] * filtered_df['wt']).sum() / population
-    else:
-        avg_age = float('nan')
-    
-    employed = filtered_df['employment'].value_counts()[1]
-    unemployed = filtered_df['employment'].value_counts()[2]
-    employment = employed / (employed + unemployed) * 100
+def zoom_ranges(relayout_data, current=None):
+    """
+    Reads the axis ranges of a zoom or pan from a graph's relayoutData.
 
-    income = calculate_weighted_median_income(filtered_df, selected_year)
+    Parameters:
+    relayout_data (dict or None): The graph's relayoutData.
+    current (dict or None): The ranges in use before this event, as returned here.
 
-    population_change = population_change_percent = "N/A"
-    avg_age_change = avg_age_change_percent = "N/A"
-    employment_change = employment_change_percent = "N/A"
-    income_change = income_change_percent = "N/A"
+    Returns:
+    dict: {'x': [low, high] or None, 'y': [low, high] or None}, None meaning the full
+          extent. Axes the event does not mention keep their current range.
+    """
+    ranges = dict(current or {'x': None, 'y': None})
+    for axis in ('x', 'y'):
+        if not relayout_data:
+            break
+        if relayout_data.get(f'{axis}axis.autorange'):
+            ranges[axis] = None
+        elif f'{axis}axis.range[0]' in relayout_data and f'{axis}axis.range[1]' in relayout_data:
+            ranges[axis] = [relayout_data[f'{axis}axis.range[0]'], relayout_data[f'{axis}axis.range[1]']]
+        elif f'{axis}axis.range' in relayout_data:
+            ranges[axis] = list(relayout_data[f'{axis}axis.range'])
+    return ranges
+
+def update_density_fig(df, selected_year, variable=None, code=None, x_range=None, y_range=None):
+    """
+    Generates the height x weight density heatmap, binned on the server so only the bin
+    grid is sent. Zoomed ranges are re-binned at a finer width.
 
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+    selected_year (int or list): The year, or [first, last] range of years, selected by the user.
+    variable (str or None): Optional survey variable to filter on (e.g., 'sex').
+    code (int or None): The variable's answer code to keep.
+    x_range, y_range (list or None): The zoomed height and weight ranges, None for the full extent.
 
-    if selected_year > df['year'].min():
-        previous_year_df = df[(df['year'] == selected_year - 1) & (df['state'] == selected_state)]
-        previous_population = previous_year_df['wt'].sum()
+    Returns:
+    dict: A Plotly figure dictionary for the density heatmap.
+    """
+    grid = density_grid(df, selected_year, variable, code, x_range, y_range)
+
+    title = f'Height and Weight of Adults ({_year_label(selected_year)})'
+    if variable is not None and code is not None:
+        label = get_mapping_dict(variable, time_series=True).get(code, code)
+        title = f'Height and Weight of Adults, {title_dictionary[variable]}: {str(label).replace("<br>", " ")} ({_year_label(selected_year)})'
+
+    return density_figure(
+        grid,
+        x_title=title_dictionary['height'],
+        y_title=title_dictionary['weight'],
+        value_label='Population',
+        title=title,
+        layout=dict(
+            template='plotly_dark',
+            paper_bgcolor='rgba(0,0,0,0)',
+            margin=dict(l=10, r=10, t=60, b=10),
+        ),
+    )
 
-        if previous_population > 0:
-            population_change = population - previous_population
-            population_change_percent = (population_change / previous_population) * 100
+def update_distribution_fig(df, selected_year, measure, by, geography='all'):
+    """
+    Generates box summaries of a continuous measure for each group of a survey
+    variable. The boxes span the weighted 25th to 75th percentiles with whiskers at the
+    5th and 95th, read from merged quantile sketches rather than the survey rows.
 
-        previous_avg_age = (previous_year_df['age_midpoint'] * previous_year_df['wt']).sum() / previous_population if previous_population > 0 else np.nan
-        if not np.isnan(previous_avg_age):
-            avg_age_change = avg_age - previous_avg_age
-            avg_age_change_percent = (avg_age_change / previous_avg_age) * 100
-        
-        previous_employment = (100 * previous_year_df['employment'].value_counts()[1]) / (previous_year_df['employment'].value_counts()[1] + previous_year_df['employment'].value_counts()[2]) if previous_population > 0 else np.nan
-        if not np.isnan(previous_employment):
-            employment_change = employment - previous_employment
-            employment_change_percent = employment_change
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+    selected_year (int or list): The year, or [first, last] range of years, selected by the user.
+    measure (str): A value of quantile_measure_mappings (e.g., 'bmi').
+    by (str): The survey variable to group by (e.g., 'sex').
+    geography (str or int): 'all', 'region:<name>', 'division:<name>' or a state code.
 
-        previous_income = calculate_weighted_median_income(previous_year_df, selected_year - 1) if previous_population > 0 else np.nan
-        if not np.isnan(previous_income):
-            income_change = income - previous_income
-            income_change_percent = (income_change / previous_income) * 100
+    Returns:
+    dict: A Plotly figure dictionary for the box summaries.
+    """
+    plot_df = weighted_quantiles(df, measure, selected_year, by=by, geography=geography)
+    plot_df = plot_df.loc[plot_df['respondents'] > 0]
+    label_year = _label_year(selected_year)
+    plot_df[by] = plot_df[by].map(get_mapping_dict(by, year=label_year, time_series=label_year is None))
+    plot_df[by] = plot_df[by].astype(str).str.replace('<br>', ' ')
+
+    measure_label = next(option['label'] for option in quantile_measure_mappings if option['value'] == measure)
+    title = f'{measure_label} by {title_dictionary[by]} ({_year_label(selected_year)})'
+    if geography != 'all':
+        title = f'{measure_label} by {title_dictionary[by]}, {geography_label(geography)} ({_year_label(selected_year)})'
+
+    return box_summary_figure(
+        plot_df,
+        x=by,
+        low='p5',
+        q1='p25',
+        median='p50',
+        q3='p75',
+        high='p95',
+        title=title,
+        x_title=title_dictionary[by],
+        y_title=measure_label,
+        layout=dict(
+            template='plotly_dark',
+            paper_bgcolor='rgba(0,0,0,0)',
+            margin=dict(l=10, r=10, t=60, b=10),
+        ),
+    )
 
-    population_display = f"{population:,.0f}"  # Format population with commas
-    avg_age_display = f"{avg_age:.1f}"  # Format average age to one decimal place
-    employment_display = f"{employment:.1f}%"
-    income_display = f"${income:,.0f}"
+def update_trend_fig(df, x_variable, y_variable, y_code, geography='all', age_adjusted=False, bands=True):
+    """
+    Generates the trend of the share of each x_variable group giving one y_variable
+    answer, one line per group over every survey year. The shares are read from the
+    year x x_variable x y_variable cube of prepare_cross_tab_by_year, so any pair of
+    variables costs one cube lookup.
 
-    population_change_display = format_change(population_change, population_change_percent)
-    avg_age_change_display = format_change(avg_age_change, avg_age_change_percent, decimal=True)
-    employment_change_display = format_change(employment_change, employment_change_percent, decimal=True, rate=True)
-    income_change_display = format_change(income_change, income_change_percent, income=True)
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+    x_variable (str): The variable whose groups are followed (e.g., 'education').
+    y_variable (str): The variable whose answer is tracked (e.g., 'smoking').
+    y_code (int): The y_variable code whose share is shown.
+    geography (str or int): 'all', 'region:<name>', 'division:<name>' or a state code.
+    age_adjusted (bool): Whether to age-standardize the shares.
+    bands (bool): Whether to shade the 95% confidence interval around each line.
+
+    Returns:
+    dict: A Plotly figure dictionary for the trend lines.
+    """
+    layout = dict(template='plotly_dark', paper_bgcolor='rgba(0,0,0,0)', font=dict(color='white'))
+    if x_variable == y_variable:
+        return message_figure('Choose two different variables', layout=layout)
+
+    answer = str(get_mapping_dict(y_variable, time_series=True).get(y_code, y_code)).replace('<br>', ' ')
+    place = '' if geography == 'all' else f', {geography_label(geography)}'
+    title = f'{title_dictionary[y_variable]}: {answer} by {title_dictionary[x_variable]}{place}'
+
+    plot_df = prepare_cross_tab_by_year(df, x_variable, y_variable, geography, age_adjusted)
+    plot_df = plot_df.loc[plot_df[y_variable] == y_code]
+    if plot_df.empty:
+        return not_collected_figure(df, [x_variable, y_variable], [ALL_YEARS[0], ALL_YEARS[-1]], geography, title=title) \
+            or message_figure('No respondents gave this answer', title=title, layout=layout)
+
+    # Lines run along the years within each group
+    plot_df = plot_df.sort_values([x_variable, 'year'])
+    plot_df[x_variable] = plot_df[x_variable].map(get_mapping_dict(x_variable, time_series=True)).astype(str).str.replace('<br>', ' ')
+
+    adjusted = age_adjusted and 'age' not in (x_variable, y_variable)
+    layout.update(
+        xaxis=dict(dtick=1, title=dict(text='Year')),
+        yaxis=dict(title=dict(text='Percentage' + (' (Age-Adjusted)' if adjusted else ''))),
+        hovermode='closest',
+    )
 
+    return line_figure(
+        plot_df,
+        x='year',
+        y='percentage',
+        color=x_variable,
+        title=title,
+        labels={
+            'year': 'Year',
+            'percentage': 'Percentage',
+            x_variable: title_dictionary[x_variable],
+        },
+        color_discrete_sequence=px.colors.qualitative.Plotly,
+        layout=layout,
+        interval=('ci_low', 'ci_high'),
+        bands=bands,
+        hollow='unreliable',
+    )
 
-    return (population_display, population_change_display, avg_age_display, avg_age_change_display, employment_display, employment_change_display, income_display, income_change_display)
+def update_chronic_odds_ratio_fig(df, selected_year, chronic_condition):
+    """
+    Generates the forest plot of adjusted odds ratios for the chronic condition, from
+    the survey-weighted logistic regression on age, sex and the lifestyle covariates.
+
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+    selected_year (int or list): The year, or [first, last] range of years, selected by the user.
+    chronic_condition (str): The chronic condition selected by the user (e.g., 'stroke').
+
+    Returns:
+    dict: A Plotly figure dictionary for the adjusted odds ratios.
+    """
+    odds_ratios = risk_model(df, chronic_condition, selected_year)
+
+    label_year = _label_year(selected_year)
+    references = ', '.join(f"{title_dictionary[covariate]}: {get_mapping_dict(covariate, year=label_year)[code]}"
+                           for covariate, code in risk_model_covariates.items())
+    odds_ratios['term'] = [f"{title_dictionary[covariate]}: {get_mapping_dict(covariate, year=label_year).get(int(code), code)}"
+                           for covariate, code in zip(odds_ratios['covariate'], odds_ratios['code'])]
+
+    figure = forest_figure(
+        odds_ratios,
+        y='term',
+        x='odds_ratio',
+        low='ci_low',
+        high='ci_high',
+        title=f'Adjusted Odds Ratios for {title_dictionary[chronic_condition]} ({_year_label(selected_year)})',
+        x_title='Odds Ratio (95% CI, log scale)',
+        layout=dict(
+            template='plotly_dark',
+            plot_bgcolor='white',
+            paper_bgcolor='rgba(0,0,0,0)',
+            font=dict(color='white'),
+            xaxis=dict(showgrid=True, gridcolor='LightGray'),
+            yaxis=dict(showgrid=False),
+            margin=dict(l=10, r=10, t=60, b=80),
+        ),
+    )
+    figure['layout']['annotations'] = [dict(
+        text=f'Reference groups: {references}', xref='paper', yref='paper', x=0, y=-0.18,
+        xanchor='left', showarrow=False, font=dict(size=10),
+    )]
+
+    return figure
 
 def format_change(change, change_percent, decimal=False, rate=False, income=False):
     """
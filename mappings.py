@@ -21,6 +21,29 @@ state_mapping = {
     54: 'WV', 55: 'WI', 56: 'WY', 66: 'GU', 72: 'PR', 78: 'VI'
 }
 
+# Census Bureau divisions, and the region each division belongs to. The territories
+# (GU, PR, VI) are not part of any division and only count towards 'All States'.
+state_division_mapping = {
+    9: 'New England', 23: 'New England', 25: 'New England', 33: 'New England', 44: 'New England', 50: 'New England',
+    34: 'Middle Atlantic', 36: 'Middle Atlantic', 42: 'Middle Atlantic',
+    17: 'East North Central', 18: 'East North Central', 26: 'East North Central', 39: 'East North Central', 55: 'East North Central',
+    19: 'West North Central', 20: 'West North Central', 27: 'West North Central', 29: 'West North Central',
+    31: 'West North Central', 38: 'West North Central', 46: 'West North Central',
+    10: 'South Atlantic', 11: 'South Atlantic', 12: 'South Atlantic', 13: 'South Atlantic', 24: 'South Atlantic',
+    37: 'South Atlantic', 45: 'South Atlantic', 51: 'South Atlantic', 54: 'South Atlantic',
+    1: 'East South Central', 21: 'East South Central', 28: 'East South Central', 47: 'East South Central',
+    5: 'West South Central', 22: 'West South Central', 40: 'West South Central', 48: 'West South Central',
+    4: 'Mountain', 8: 'Mountain', 16: 'Mountain', 30: 'Mountain', 32: 'Mountain', 35: 'Mountain', 49: 'Mountain', 56: 'Mountain',
+    2: 'Pacific', 6: 'Pacific', 15: 'Pacific', 41: 'Pacific', 53: 'Pacific'
+}
+
+division_region_mapping = {
+    'New England': 'Northeast', 'Middle Atlantic': 'Northeast',
+    'East North Central': 'Midwest', 'West North Central': 'Midwest',
+    'South Atlantic': 'South', 'East South Central': 'South', 'West South Central': 'South',
+    'Mountain': 'West', 'Pacific': 'West'
+}
+
 income_bracket_midpoints = {
     1: 7500,    # Midpoint of "<$15,000"
     2: 20000,   # Midpoint of "$15,000 - $25,000"
@@ -32,6 +55,19 @@ income_bracket_midpoints = {
     -1: -1
 }
 
+# Income bracket bounds used to interpolate the median household income. The open
+# top brackets ("$50,000+" before 2021, "$200,000+" from 2021) are closed at 2x and
+# 1.5x their lower bound.
+income_bracket_bounds = {
+    1: (0, 15000),
+    2: (15000, 25000),
+    3: (25000, 35000),
+    4: (35000, 50000),
+    5: (50000, 100000),
+    6: (100000, 200000),
+    7: (200000, 300000)
+}
+
 age_range_midpoints = {
     1: 21.5,
     2: 30,
@@ -42,12 +78,34 @@ age_range_midpoints = {
     -1: -1
 }
 
+# Standard populations for direct age standardization, by age code. 'us2000' is the
+# U.S. 2000 standard population for the adult age groups; 'equal' weights every age
+# group the same. Only the proportions matter.
+age_standard_populations = {
+    'us2000': {1: 26258, 2: 37233, 3: 44659, 4: 37030, 5: 23962, 6: 34710},
+    'equal': {1: 1, 2: 1, 3: 1, 4: 1, 5: 1, 6: 1}
+}
+
+# Continuous measures with weighted quantile summaries
+quantile_measure_mappings = [
+    {'label': 'Height (m)', 'value': 'height'},
+    {'label': 'Weight (kg)', 'value': 'weight'},
+    {'label': 'BMI (kg/m²)', 'value': 'bmi'},
+    {'label': 'Survey Weight', 'value': 'wt'},
+]
+
 state_variable_mappings = [
                             {'label': 'Income', 'value': 'Average Household Income'},
                             {'label': 'Height', 'value': 'Average Height'},
                             {'label': 'Weight', 'value': 'Average Weight'},
                             {'label': 'Age', 'value': 'Average Age'}
                         ]
+state_variable_columns = {
+    'Average Household Income': 'income_midpoint',
+    'Average Height': 'height',
+    'Average Weight': 'weight',
+    'Average Age': 'age_midpoint'
+}
 population_dropdown_mappings = [
                               {'label': 'State', 'value': 'state'},
                               {'label': 'Employment', 'value': 'employment'},
@@ -215,3 +273,53 @@ state_fullname_mappings = [
     {'label': 'Puerto Rico', 'value': 72},
     {'label': 'Virgin Islands', 'value': 78}
 ]
+
+# Variable groups the state similarity profiles can be built from
+similarity_group_mappings = [
+    {'label': 'Demographics', 'value': 'demographics', 'variables': [option['value'] for option in demographic_variable_mappings]},
+    {'label': 'Lifestyle', 'value': 'lifestyle', 'variables': [option['value'] for option in lifestyle_variable_mappings]},
+    {'label': 'Health Conditions', 'value': 'chronic_conditions', 'variables': [option['value'] for option in chronic_condition_variable_mappings]},
+    {'label': 'Healthcare Access', 'value': 'healthcare_access', 'variables': [option['value'] for option in healthcare_access_variable_mappings]},
+    {'label': 'Health Measures', 'value': 'health_measures', 'variables': [option['value'] for option in health_measure_variable_mappings]},
+    {'label': 'Anthropometrics', 'value': 'anthropometrics', 'variables': [option['value'] for option in anthropometric_variable_mappings]},
+]
+
+# Options for the geography selectors: the whole country, each Census region and
+# division, then each state
+geography_dropdown_mappings = (
+    [{'label': 'All States', 'value': 'all'}]
+    + [{'label': f'{region} (Region)', 'value': f'region:{region}'} for region in dict.fromkeys(division_region_mapping.values())]
+    + [{'label': f'{division} (Division)', 'value': f'division:{division}'} for division in division_region_mapping]
+    + state_fullname_mappings
+)
+
+# Metrics on the state rankings page. Prevalence metrics are the weighted percentage
+# of respondents giving one of the listed answer codes, out of those giving any answer
+# other than 'Other' (-1).
+ranking_metric_mappings = [
+    {'label': 'Population', 'value': 'population'},
+    {'label': 'Average Age', 'value': 'avg_age'},
+    {'label': 'Employment Rate (%)', 'value': 'employment_rate'},
+    {'label': 'Median Household Income ($)', 'value': 'median_income'},
+    {'label': 'Average Height (m)', 'value': 'avg_height'},
+    {'label': 'Average Weight (kg)', 'value': 'avg_weight'},
+    {'label': 'Current Smokers (%)', 'value': 'current_smoking', 'variable': 'smoking', 'codes': [1, 2]},
+    {'label': 'Binge Drinkers (%)', 'value': 'binge_drinking', 'variable': 'binge_drinking', 'codes': [2]},
+    {'label': 'Heavy Drinkers (%)', 'value': 'heavy_drinking', 'variable': 'heavy_drinking', 'codes': [2]},
+    {'label': 'No Exercise (%)', 'value': 'no_exercise', 'variable': 'exercise', 'codes': [2]},
+    {'label': 'Obese (%)', 'value': 'obese', 'variable': 'bmi_category', 'codes': [4]},
+    {'label': 'Overweight or Obese (%)', 'value': 'overweight_or_obese', 'variable': 'overweight', 'codes': [2]},
+    {'label': 'Fair or Poor Health (%)', 'value': 'fair_poor_health', 'variable': 'general_health', 'codes': [2]},
+    {'label': 'Frequent Mental Distress (%)', 'value': 'mental_distress', 'variable': 'mental_health', 'codes': [3]},
+    {'label': 'Frequent Physical Distress (%)', 'value': 'physical_distress', 'variable': 'physical_health', 'codes': [3]},
+    {'label': 'Uninsured (%)', 'value': 'uninsured', 'variable': 'health_insurance', 'codes': [2]},
+    {'label': 'Could Not Afford Doctor (%)', 'value': 'cost_barrier', 'variable': 'medcost', 'codes': [1]},
+    {'label': 'Checkup in Past Year (%)', 'value': 'recent_checkup', 'variable': 'checkup', 'codes': [1]},
+    {'label': 'Current Asthma (%)', 'value': 'current_asthma', 'variable': 'asthma', 'codes': [1]},
+    {'label': 'Arthritis (%)', 'value': 'arthritis', 'variable': 'arthritis', 'codes': [1]},
+    {'label': 'Heart Attack / Angina / CHD (%)', 'value': 'cardiac_event', 'variable': 'cardiac_event', 'codes': [1]},
+    {'label': 'Stroke (%)', 'value': 'stroke', 'variable': 'stroke', 'codes': [1]},
+    {'label': 'College Graduates (%)', 'value': 'college_graduate', 'variable': 'education', 'codes': [4]},
+    {'label': 'Tested for HIV (%)', 'value': 'hiv_tested', 'variable': 'aids_test', 'codes': [1]},
+    {'label': 'Flu Jab, Over 65 (%)', 'value': 'flu_jab', 'variable': 'flu_jab', 'codes': [1]}
+]
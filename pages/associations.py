@@ -0,0 +1,64 @@
+from dash import dcc, html, register_page, callback, Input, Output
+import dash_bootstrap_components as dbc
+
+from process_data import df
+from figure_factory import compact_figures
+from helper_functions import update_association_heatmap
+
+register_page(__name__, name='Associations', path='/associations')
+
+layout = dbc.Container(
+    [
+        dbc.Row(
+            dbc.Col(
+                dbc.Container(
+                    [
+                        html.H4("Associations Between Variables", className="display-7", style={"color": "black", "text-align": "center"}),
+                        html.P(
+                            "How strongly each pair of survey variables is associated, measured by the weighted Cramér's V "
+                            "(0 for no association, 1 for a perfect one). 'Other' answers are left out.",
+                            className="small", style={"color": "black", "text-align": "center"}
+                        ),
+                    ],
+                    className="p-3 bg-light rounded-3"
+                ),
+                width=12, style={'marginBottom': '15px', 'marginTop': '20px'}
+            ),
+        ),
+
+        # Year Slider
+        dbc.Row(
+            dbc.Col(
+                dcc.Slider(
+                    id='year-slider-associations',
+                    min=2012,
+                    max=2022,
+                    step=1,
+                    value=2022,
+                    marks={str(year): str(year) for year in range(2012, 2023)},
+                ),
+                width=8,
+                className='mb-4'
+            ),
+            justify='center'
+        ),
+
+        dbc.Row(
+            dbc.Col(
+                dcc.Loading(dcc.Graph(id='heatmap-associations', style={'height': '850px'})),
+                width=12,
+            ),
+            className='mb-4'
+        ),
+    ],
+    fluid=True
+)
+
+
+@callback(
+    Output('heatmap-associations', 'figure'),
+    Input('year-slider-associations', 'value')
+)
+def update_associations(selected_year):
+    # The matrix of each year is computed once and cached
+    return compact_figures([update_association_heatmap(df, selected_year)], label='associations', decimals=3)[0]
@@ -0,0 +1,200 @@
+from dash import dcc, html, register_page, callback, ctx, no_update, Input, Output, State
+import dash_bootstrap_components as dbc
+
+from process_data import df
+from figure_factory import compact_figures
+from helper_functions import get_mapping_dict, update_density_fig, update_distribution_fig, zoom_ranges
+from mappings import population_dropdown_mappings, quantile_measure_mappings, geography_dropdown_mappings
+
+register_page(__name__, name='Height & Weight', path='/body_measures')
+
+layout = dbc.Container(
+    [
+        dbc.Row(
+            dbc.Col(
+                dbc.Container(
+                    [
+                        html.H4("Height and Weight", className="display-7", style={"color": "black", "text-align": "center"}),
+                        html.P(
+                            "How the adult population is spread over height and weight, as a weighted density. "
+                            "Drag over the chart to zoom in and see finer bins, double-click to zoom back out.",
+                            className="small", style={"color": "black", "text-align": "center"}
+                        ),
+                    ],
+                    className="p-3 bg-light rounded-3"
+                ),
+                width=12, style={'marginBottom': '15px', 'marginTop': '20px'}
+            ),
+        ),
+
+        dbc.Row(
+            [
+                dbc.Col(
+                    [
+                        html.Label('Filter by:', className='dropdown-label'),
+                        dcc.Dropdown(
+                            id='variable-selector-body-measures',
+                            options=population_dropdown_mappings,
+                            placeholder='All adults',
+                        ),
+                    ],
+                    width=4,
+                ),
+                dbc.Col(
+                    [
+                        html.Label('Answer:', className='dropdown-label'),
+                        dcc.Dropdown(id='code-selector-body-measures', clearable=False, disabled=True),
+                    ],
+                    width=4,
+                ),
+            ],
+            justify='center',
+            className='mb-4'
+        ),
+
+        # Year Slider
+        dbc.Row(
+            dbc.Col(
+                dcc.RangeSlider(
+                    id='year-slider-body-measures',
+                    min=2012,
+                    max=2022,
+                    step=1,
+                    value=[2022, 2022],
+                    allowCross=False,
+                    marks={str(year): str(year) for year in range(2012, 2023)},
+                ),
+                width=8,
+                className='mb-4'
+            ),
+            justify='center'
+        ),
+
+        # Zoomed height and weight ranges, None for the full extent
+        dcc.Store(id='zoom-body-measures', data={'x': None, 'y': None}),
+
+        dbc.Row(
+            dbc.Col(
+                dcc.Loading(dcc.Graph(id='density-body-measures', style={'height': '700px'})),
+                width=12,
+            ),
+            className='mb-4'
+        ),
+
+        # Distribution Section Subheading
+        dbc.Row(
+            dbc.Col(
+                dbc.Container(
+                    [
+                        html.H4("Distribution By Group", className="display-7", style={"color": "black", "text-align": "center"}),
+                        html.P(
+                            "Boxes span the weighted 25th to 75th percentiles, with the median inside "
+                            "and whiskers at the 5th and 95th percentiles.",
+                            className="small", style={"color": "black", "text-align": "center"}
+                        ),
+                    ],
+                    className="p-3 bg-light rounded-3"
+                ),
+                width=12, style={'marginBottom': '15px', 'marginTop': '20px'}
+            ),
+        ),
+
+        dbc.Row(
+            [
+                dbc.Col(
+                    [
+                        html.Label('Measure:', className='dropdown-label'),
+                        dcc.Dropdown(id='measure-selector-body-measures', options=quantile_measure_mappings, value='bmi', clearable=False),
+                    ],
+                    width=3,
+                ),
+                dbc.Col(
+                    [
+                        html.Label('Group by:', className='dropdown-label'),
+                        dcc.Dropdown(id='group-selector-body-measures', options=population_dropdown_mappings, value='sex', clearable=False),
+                    ],
+                    width=3,
+                ),
+                dbc.Col(
+                    [
+                        html.Label('State or region:', className='dropdown-label'),
+                        dcc.Dropdown(id='geography-selector-body-measures', options=geography_dropdown_mappings, value='all', clearable=False),
+                    ],
+                    width=3,
+                ),
+            ],
+            justify='center',
+            className='mb-4'
+        ),
+
+        dbc.Row(
+            dbc.Col(
+                dcc.Loading(dcc.Graph(id='distribution-body-measures', style={'height': '550px'})),
+                width=12,
+            ),
+            className='mb-4'
+        ),
+    ],
+    fluid=True
+)
+
+
+@callback(
+    [
+        Output('code-selector-body-measures', 'options'),
+        Output('code-selector-body-measures', 'value'),
+        Output('code-selector-body-measures', 'disabled'),
+    ],
+    Input('variable-selector-body-measures', 'value'),
+    State('code-selector-body-measures', 'value')
+)
+def update_code_selector(variable, code):
+    if variable is None:
+        return [], None, True
+    labels = get_mapping_dict(variable, time_series=True)
+    options = [{'label': str(label).replace('<br>', ' '), 'value': key} for key, label in labels.items() if key != -1]
+    if code not in labels or code == -1:
+        code = options[0]['value']
+    return options, code, False
+
+
+@callback(
+    [
+        Output('density-body-measures', 'figure'),
+        Output('zoom-body-measures', 'data'),
+    ],
+    [
+        Input('year-slider-body-measures', 'value'),
+        Input('code-selector-body-measures', 'value'),
+        Input('density-body-measures', 'relayoutData'),
+    ],
+    [
+        State('variable-selector-body-measures', 'value'),
+        State('zoom-body-measures', 'data'),
+    ]
+)
+def update_density(selected_year, code, relayout_data, variable, zoom):
+    if ctx.triggered_id == 'density-body-measures':
+        new_zoom = zoom_ranges(relayout_data, zoom)
+        # Resizes and other layout events leave the ranges as they were
+        if new_zoom == zoom:
+            return no_update, no_update
+        zoom = new_zoom
+
+    # Only the bin grid is sent; each zoom level is binned once per filter and every window is sliced from it
+    figure = update_density_fig(df, selected_year, variable, code, zoom['x'], zoom['y'])
+    return compact_figures([figure], label='body_measures')[0], zoom
+
+
+@callback(
+    Output('distribution-body-measures', 'figure'),
+    [
+        Input('year-slider-body-measures', 'value'),
+        Input('measure-selector-body-measures', 'value'),
+        Input('group-selector-body-measures', 'value'),
+        Input('geography-selector-body-measures', 'value'),
+    ]
+)
+def update_distribution(selected_year, measure, by, geography):
+    # Quantiles come from per state and year sketches merged on demand
+    return compact_figures([update_distribution_fig(df, selected_year, measure, by, geography)], label='body_measures', decimals=3)[0]
@@ -3,8 +3,9 @@ from dash.dependencies import Input, Output
 import dash_bootstrap_components as dbc
 
 from process_data import df
-from mappings import chronic_condition_variable_mappings, health_measure_variable_mappings, anthropometric_variable_mappings, lifestyle_variable_mappings, healthcare_access_variable_mappings
-from helper_functions import update_chronic_access_fig, update_chronic_health_fig, update_chronic_lifestyle_fig, update_chronic_anthro_fig
+from figure_factory import patch_unchanged_figures, compact_figures
+from mappings import chronic_condition_variable_mappings, health_measure_variable_mappings, anthropometric_variable_mappings, lifestyle_variable_mappings, healthcare_access_variable_mappings, geography_dropdown_mappings
+from helper_functions import update_chronic_access_fig, update_chronic_health_fig, update_chronic_lifestyle_fig, update_chronic_anthro_fig, update_chronic_odds_ratio_fig, build_figures, availability_options, availability_marks, cross_tab_graph_style
 
 register_page(__name__, name='Health Conditions', path='/health_conditions')
 
@@ -42,6 +43,10 @@ layout = dbc.Container(
                                         html.Li("Single-click on a legend item to exclude that category from the graph."),
                                     ]
                                 ),
+                                html.P(
+                                    "Hover over a bar to see the 95% confidence interval of its percentage, also drawn as error bars on grouped bars. "
+                                    "Hatched bars rest on fewer than 50 respondents or have a relative standard error above 30%, so read them with caution."
+                                ),
                                 html.P(
                                     "Have fun exploring the data!"
                                 ),
@@ -58,41 +63,80 @@ layout = dbc.Container(
         ),
 
         #Top-level Dropdown for Chronic Condition Variable Selection
-        dbc.Row(
+        dbc.Row([
             dbc.Col(
                 [
-                    html.Label('Select Health Condition Variable:', className='dropdown-label'),
+                    html.Label('Select Health Condition Variables:', className='dropdown-label'),
                     dcc.Dropdown(
                         id='chronic-condition-dropdown',
                         options=chronic_condition_variable_mappings,  # Replace with your actual options
-                        value='stroke',  # Default value
-                        clearable=False,
+                        value=['stroke'],  # Default value
+                        multi=True,  # Several conditions are compared side by side
                     ),
                 ],
                 width=6,  # Adjust this width as necessary
                 className='mb-4'
             ),
+            dbc.Col(
+                [
+                    html.Label('Select Geography:', className='dropdown-label'),
+                    dcc.Dropdown(
+                        id='geography-selector-chronic-condition',
+                        options=geography_dropdown_mappings,
+                        value='all',
+                        clearable=False,
+                        searchable=True,
+                    ),
+                ],
+                width=3,
+                className='mb-4'
+            )],
             justify='center'
         ),
 
-        # Year Slider
-        dbc.Row(
+        # Year Range Slider (selecting several years pools them)
+        dbc.Row([
             dbc.Col(
-                dcc.Slider(
+                dcc.RangeSlider(
                     id='year-slider-chronic-condition',
                     updatemode='drag',
                     min=2012,
                     max=2022,
                     step=1,
-                    value=2022,
+                    value=[2022, 2022],
+                    allowCross=False,
                     marks={str(year): str(year) for year in range(2012, 2023)},
                 ),
                 width=8,
                 className='mb-4'
             ),
+            dbc.Col(
+                [
+                    dbc.Switch(
+                        id='equal-weight-chronic-condition',
+                        label='Weight pooled years equally',
+                        value=False,
+                    ),
+                    dbc.Switch(
+                        id='age-adjust-chronic-condition',
+                        label='Age-adjusted percentages',
+                        value=False,
+                    ),
+                    dbc.Switch(
+                        id='all-years-chronic-condition',
+                        label='Show all years',
+                        value=False,
+                    ),
+                ],
+                width='auto',
+                className='mb-4'
+            )],
             justify='center'
         ),
 
+        # Structure of the figures last sent, so year changes can be sent as patches
+        dcc.Store(id='figure-signatures-chronic-condition'),
+
         # Row for First Two Graphs
         dbc.Row(
             [
@@ -166,12 +210,30 @@ layout = dbc.Container(
                 ),
             ],
         ),
+
+        # Adjusted Odds Ratios
+        dbc.Row(
+            dbc.Col(
+                [
+                    html.Div('Adjusted Odds Ratios', className='form-label'),
+                    html.P(
+                        "Odds of the health condition for each group against its reference group, holding the other "
+                        "factors fixed, from a survey-weighted logistic regression. The national data is used.",
+                        className='text-muted'
+                    ),
+                    dcc.Graph(id='odds-ratio-chronic-condition-graph', style={'height': '600px'}),
+                ],
+                width=10
+            ),
+            justify='center',
+            className='mt-4 mb-4'
+        ),
     ],
     fluid=True
 )
 
 # Callbacks
-from dash import callback, Output, Input, State
+from dash import callback, ctx, no_update, Output, Input, State
 
 @callback(
     [
@@ -179,7 +241,8 @@ from dash import callback, Output, Input, State
         Output('health-measures-chronic-condition-graph', 'figure'),
         Output('lifestyle-chronic-condition-graph', 'figure'),
         Output('healthcare-access-chronic-condition-graph', 'figure'),
-        Output('alert-collapse-section-chronic-condition', 'is_open')
+        Output('alert-collapse-section-chronic-condition', 'is_open'),
+        Output('figure-signatures-chronic-condition', 'data'),
     ],
     [
         Input('chronic-condition-dropdown', 'value'),
@@ -188,19 +251,102 @@ from dash import callback, Output, Input, State
         Input('lifestyle-dropdown', 'value'),
         Input('healthcare-access-dropdown', 'value'),
         Input('year-slider-chronic-condition', 'value'),
-        Input('alert-collapse-button-chronic-condition', 'n_clicks')
+        Input('alert-collapse-button-chronic-condition', 'n_clicks'),
+        Input('geography-selector-chronic-condition', 'value'),
+        Input('equal-weight-chronic-condition', 'value'),
+        Input('age-adjust-chronic-condition', 'value'),
+        Input('all-years-chronic-condition', 'value'),
     ],
-    [State('alert-collapse-section-chronic-condition', 'is_open')]
+    [
+        State('alert-collapse-section-chronic-condition', 'is_open'),
+        State('figure-signatures-chronic-condition', 'data'),
+    ]
 )
 
-def update_graphs_and_toggle_alert(chronic_condition, anthro_var, health_var, lifestyle_var, access_var, selected_year, n_clicks, is_open):
+def update_graphs_and_toggle_alert(chronic_condition, anthro_var, health_var, lifestyle_var, access_var, selected_year, n_clicks, geography, equal_weight, age_adjusted, all_years, is_open, signatures):
+    # The all-years view does not depend on the slider
+    if all_years and ctx.triggered_id == 'year-slider-chronic-condition':
+        return (no_update,) * 6
+
     # Generate each figure using the respective update function
-    fig_chronic_anthro = update_chronic_anthro_fig(df, selected_year, chronic_condition, anthro_var)
-    fig_chronic_health = update_chronic_health_fig(df, selected_year, chronic_condition, health_var)
-    fig_chronic_lifestyle = update_chronic_lifestyle_fig(df, selected_year, chronic_condition, lifestyle_var)
-    fig_chronic_access = update_chronic_access_fig(df, selected_year, chronic_condition, access_var)
+    fig_chronic_anthro, fig_chronic_health, fig_chronic_lifestyle, fig_chronic_access = build_figures({
+        'anthro': (update_chronic_anthro_fig, df, selected_year, chronic_condition, anthro_var, geography, equal_weight, age_adjusted, all_years),
+        'health': (update_chronic_health_fig, df, selected_year, chronic_condition, health_var, geography, equal_weight, age_adjusted, all_years),
+        'lifestyle': (update_chronic_lifestyle_fig, df, selected_year, chronic_condition, lifestyle_var, geography, equal_weight, age_adjusted, all_years),
+        'access': (update_chronic_access_fig, df, selected_year, chronic_condition, access_var, geography, equal_weight, age_adjusted, all_years),
+    }, label='chronic_conditions')
+    # Moving the year slider only changes bar heights, labels and titles
+    figures, signatures = patch_unchanged_figures(
+        compact_figures([fig_chronic_anthro, fig_chronic_health, fig_chronic_lifestyle, fig_chronic_access], label='chronic_conditions'),
+        signatures,
+        values_only=ctx.triggered_id == 'year-slider-chronic-condition'
+    )
+
     # Handle the alert collapse functionality
     if n_clicks:
         is_open = not is_open
 
-    return fig_chronic_anthro, fig_chronic_health, fig_chronic_lifestyle, fig_chronic_access, is_open
\ No newline at end of file
+    return *figures, is_open, signatures
+
+
+# The odds ratio panel only depends on the condition and years, so the other
+# dropdowns do not refit or resend it. With several conditions selected it shows
+# the first
+@callback(
+    Output('odds-ratio-chronic-condition-graph', 'figure'),
+    [
+        Input('chronic-condition-dropdown', 'value'),
+        Input('year-slider-chronic-condition', 'value'),
+    ]
+)
+def update_odds_ratio_graph(chronic_condition, selected_year):
+    if isinstance(chronic_condition, list):
+        if not chronic_condition:
+            return no_update
+        chronic_condition = chronic_condition[0]
+    return compact_figures([update_chronic_odds_ratio_fig(df, selected_year, chronic_condition)], label='odds_ratios')[0]
+
+
+# Options and years where a question was not asked are greyed out, using the availability index
+@callback(
+    [
+        Output('chronic-condition-dropdown', 'options'),
+        Output('health-measures-dropdown', 'options'),
+        Output('anthropometric-dropdown', 'options'),
+        Output('lifestyle-dropdown', 'options'),
+        Output('healthcare-access-dropdown', 'options'),
+        Output('year-slider-chronic-condition', 'marks'),
+    ],
+    [
+        Input('year-slider-chronic-condition', 'value'),
+        Input('geography-selector-chronic-condition', 'value'),
+        Input('chronic-condition-dropdown', 'value'),
+    ]
+)
+def update_availability(selected_year, geography, chronic_condition):
+    return (
+        availability_options(df, chronic_condition_variable_mappings, selected_year, geography),
+        availability_options(df, health_measure_variable_mappings, selected_year, geography),
+        availability_options(df, anthropometric_variable_mappings, selected_year, geography),
+        availability_options(df, lifestyle_variable_mappings, selected_year, geography),
+        availability_options(df, healthcare_access_variable_mappings, selected_year, geography),
+        availability_marks(df, chronic_condition or [], geography),
+    )
+
+
+# Every two conditions compared, or four years shown, add a row of subplots.
+# The slider has no effect in the all-years view, except on the odds ratios
+@callback(
+    [
+        Output('anthropometric-chronic-condition-graph', 'style'),
+        Output('health-measures-chronic-condition-graph', 'style'),
+        Output('lifestyle-chronic-condition-graph', 'style'),
+        Output('healthcare-access-chronic-condition-graph', 'style'),
+    ],
+    [
+        Input('chronic-condition-dropdown', 'value'),
+        Input('all-years-chronic-condition', 'value'),
+    ]
+)
+def update_graph_heights(chronic_condition, all_years):
+    return [cross_tab_graph_style(chronic_condition, all_years)] * 4
@@ -1,8 +1,9 @@
 from dash import dcc, html, register_page, callback
 from dash.dependencies import Input, Output
 import dash_bootstrap_components as dbc
-from mappings import lifestyle_variable_mappings, health_measure_variable_mappings, demographic_variable_mappings, anthropometric_variable_mappings, chronic_condition_variable_mappings, healthcare_access_variable_mappings
-from helper_functions import update_dem_access_fig, update_dem_anthro_fig, update_dem_health_fig, update_dem_chronic_fig, update_dem_lifestyle_fig
+from mappings import lifestyle_variable_mappings, health_measure_variable_mappings, demographic_variable_mappings, anthropometric_variable_mappings, chronic_condition_variable_mappings, healthcare_access_variable_mappings, geography_dropdown_mappings
+from helper_functions import update_dem_access_fig, update_dem_anthro_fig, update_dem_health_fig, update_dem_chronic_fig, update_dem_lifestyle_fig, build_figures, availability_options, availability_marks, cross_tab_graph_style
+from figure_factory import patch_unchanged_figures, compact_figures
 from process_data import df
 
 register_page(__name__, name='Demographics', path='/demographics')
@@ -40,6 +41,10 @@ layout = dbc.Container(
                                             html.Li("Single-click on a legend item to exclude that category from the graph."),
                                         ]
                                     ),
+                                    html.P(
+                                        "Hover over a bar to see the 95% confidence interval of its percentage, also drawn as error bars on grouped bars. "
+                                        "Hatched bars rest on fewer than 50 respondents or have a relative standard error above 30%, so read them with caution."
+                                    ),
                                     html.P(
                                         "Have fun exploring the data!"
                                     ),
@@ -56,40 +61,79 @@ layout = dbc.Container(
             ),
         
         # Top-level Dropdown for Demographic Variable Selection
-        dbc.Row(
+        dbc.Row([
             dbc.Col(
                 [
-                    html.Label('Select Demographic Variable:', className='dropdown-label'),
+                    html.Label('Select Demographic Variables:', className='dropdown-label'),
                     dcc.Dropdown(
                         id='demographic-selector-demographics',
                         options=demographic_variable_mappings,  # Replace with your actual demographic options
-                        value='age',  # Default value
-                        clearable=False,
+                        value=['age'],  # Default value
+                        multi=True,  # Several variables are compared side by side
                     ),
                 ],
                 width=6,  # Adjust this width as necessary
                 className='mb-4'
             ),
+            dbc.Col(
+                [
+                    html.Label('Select Geography:', className='dropdown-label'),
+                    dcc.Dropdown(
+                        id='geography-selector-demographics',
+                        options=geography_dropdown_mappings,
+                        value='all',
+                        clearable=False,
+                        searchable=True,
+                    ),
+                ],
+                width=3,
+                className='mb-4'
+            )],
             justify='center'
         ),
 
-        # Year Slider
-        dbc.Row(
+        # Year Range Slider (selecting several years pools them)
+        dbc.Row([
             dbc.Col(
-                dcc.Slider(
+                dcc.RangeSlider(
                     id='year-slider-demographics',
                     updatemode='drag',
                     min=2012,
                     max=2022,
                     step=1,
-                    value=2022,
+                    value=[2022, 2022],
+                    allowCross=False,
                     marks={str(year): str(year) for year in range(2012, 2023)},
                 ),
                 width=8,
                 className='mb-4'
             ),
+            dbc.Col(
+                [
+                    dbc.Switch(
+                        id='equal-weight-demographics',
+                        label='Weight pooled years equally',
+                        value=False,
+                    ),
+                    dbc.Switch(
+                        id='age-adjust-demographics',
+                        label='Age-adjusted percentages',
+                        value=False,
+                    ),
+                    dbc.Switch(
+                        id='all-years-demographics',
+                        label='Show all years',
+                        value=False,
+                    ),
+                ],
+                width='auto',
+                className='mb-4'
+            )],
             justify='center'
         ),
+
+        # Structure of the figures last sent, so year changes can be sent as patches
+        dcc.Store(id='figure-signatures-demographics'),
         
          # Row for First Two Graphs
         dbc.Row(
@@ -189,7 +233,7 @@ layout = dbc.Container(
     fluid=True
 )
 
-from dash import callback, Output, Input, State
+from dash import callback, ctx, no_update, Output, Input, State
 
 @callback(
     [
@@ -199,6 +243,7 @@ from dash import callback, Output, Input, State
         Output('graph-health-measures-demographics', 'figure'),
         Output('graph-lifestyle-demographics', 'figure'),
         Output('alert-collapse-section-demographics', 'is_open'),  # Add this Output for the alert
+        Output('figure-signatures-demographics', 'data'),
     ],
     [
         Input('demographic-selector-demographics', 'value'),
@@ -209,22 +254,89 @@ from dash import callback, Output, Input, State
         Input('health-measures-selector-demographics', 'value'),
         Input('lifestyle-selector-demographics', 'value'),
         Input('alert-collapse-button-demographics', 'n_clicks'),  # Add this Input for the alert button
+        Input('geography-selector-demographics', 'value'),
+        Input('equal-weight-demographics', 'value'),
+        Input('age-adjust-demographics', 'value'),
+        Input('all-years-demographics', 'value'),
     ],
-    [State('alert-collapse-section-demographics', 'is_open')]  # State to track if the alert is open
+    [
+        State('alert-collapse-section-demographics', 'is_open'),  # State to track if the alert is open
+        State('figure-signatures-demographics', 'data'),
+    ]
 )
-def update_graphs_and_toggle_alert(demographic, selected_year, anthro_var, chronic_var, access_var, health_var, lifestyle_var, n_clicks, is_open):
+def update_graphs_and_toggle_alert(demographic, selected_year, anthro_var, chronic_var, access_var, health_var, lifestyle_var, n_clicks, geography, equal_weight, age_adjusted, all_years, is_open, signatures):
+    # The all-years view does not depend on the slider
+    if all_years and ctx.triggered_id == 'year-slider-demographics':
+        return (no_update,) * 7
+
     # Generate each figure using the respective update function
-    fig_anthro = update_dem_anthro_fig(df, selected_year, demographic, anthro_var)
-    fig_chronic = update_dem_chronic_fig(df, selected_year, demographic, chronic_var)
-    fig_access = update_dem_access_fig(df, selected_year, demographic, access_var)
-    fig_health = update_dem_health_fig(df, selected_year, demographic, health_var)
-    fig_lifestyle = update_dem_lifestyle_fig(df, selected_year, demographic, lifestyle_var)
+    fig_anthro, fig_chronic, fig_access, fig_health, fig_lifestyle = build_figures({
+        'anthro': (update_dem_anthro_fig, df, selected_year, demographic, anthro_var, geography, equal_weight, age_adjusted, all_years),
+        'chronic': (update_dem_chronic_fig, df, selected_year, demographic, chronic_var, geography, equal_weight, age_adjusted, all_years),
+        'access': (update_dem_access_fig, df, selected_year, demographic, access_var, geography, equal_weight, age_adjusted, all_years),
+        'health': (update_dem_health_fig, df, selected_year, demographic, health_var, geography, equal_weight, age_adjusted, all_years),
+        'lifestyle': (update_dem_lifestyle_fig, df, selected_year, demographic, lifestyle_var, geography, equal_weight, age_adjusted, all_years),
+    }, label='demographics')
+
+    # Moving the year slider only changes bar heights, labels and titles
+    figures, signatures = patch_unchanged_figures(
+        compact_figures([fig_anthro, fig_chronic, fig_access, fig_health, fig_lifestyle], label='demographics'),
+        signatures,
+        values_only=ctx.triggered_id == 'year-slider-demographics'
+    )
 
     # Handle the alert collapse functionality
     if n_clicks:
         is_open = not is_open
 
     # Return all figures plus the state of the alert collapse
-    return fig_anthro, fig_chronic, fig_access, fig_health, fig_lifestyle, is_open
+    return *figures, is_open, signatures
 
 
+# Options and years where a question was not asked are greyed out, using the availability index
+@callback(
+    [
+        Output('demographic-selector-demographics', 'options'),
+        Output('health-measures-selector-demographics', 'options'),
+        Output('lifestyle-selector-demographics', 'options'),
+        Output('chronic-conditions-selector-demographics', 'options'),
+        Output('healthcare-access-selector-demographics', 'options'),
+        Output('anthropometrics-selector-demographics', 'options'),
+        Output('year-slider-demographics', 'marks'),
+    ],
+    [
+        Input('year-slider-demographics', 'value'),
+        Input('geography-selector-demographics', 'value'),
+        Input('demographic-selector-demographics', 'value'),
+    ]
+)
+def update_availability(selected_year, geography, demographic):
+    return (
+        availability_options(df, demographic_variable_mappings, selected_year, geography),
+        availability_options(df, health_measure_variable_mappings, selected_year, geography),
+        availability_options(df, lifestyle_variable_mappings, selected_year, geography),
+        availability_options(df, chronic_condition_variable_mappings, selected_year, geography),
+        availability_options(df, healthcare_access_variable_mappings, selected_year, geography),
+        availability_options(df, anthropometric_variable_mappings, selected_year, geography),
+        availability_marks(df, demographic or [], geography),
+    )
+
+
+# Every two variables compared, or four years shown, add a row of subplots.
+# The slider has no effect in the all-years view
+@callback(
+    [
+        Output('graph-anthropometrics-demographics', 'style'),
+        Output('graph-chronic-conditions-demographics', 'style'),
+        Output('graph-healthcare-access-demographics', 'style'),
+        Output('graph-health-measures-demographics', 'style'),
+        Output('graph-lifestyle-demographics', 'style'),
+        Output('year-slider-demographics', 'disabled'),
+    ],
+    [
+        Input('demographic-selector-demographics', 'value'),
+        Input('all-years-demographics', 'value'),
+    ]
+)
+def update_graph_heights(demographic, all_years):
+    return *[cross_tab_graph_style(demographic, all_years)] * 5, bool(all_years)
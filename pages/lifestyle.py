@@ -1,8 +1,9 @@
 from dash import dcc, html, register_page, callback
 from dash.dependencies import Input, Output
 import dash_bootstrap_components as dbc
-from mappings import lifestyle_variable_mappings, health_measure_variable_mappings, anthropometric_variable_mappings, chronic_condition_variable_mappings, healthcare_access_variable_mappings
-from helper_functions import update_life_access_fig, update_life_anthro_fig, update_life_health_fig, update_life_chronic_fig
+from mappings import lifestyle_variable_mappings, health_measure_variable_mappings, anthropometric_variable_mappings, chronic_condition_variable_mappings, healthcare_access_variable_mappings, geography_dropdown_mappings
+from helper_functions import update_life_access_fig, update_life_anthro_fig, update_life_health_fig, update_life_chronic_fig, build_figures, availability_options, availability_marks, cross_tab_graph_style
+from figure_factory import patch_unchanged_figures, compact_figures
 from process_data import df
 
 register_page(__name__, name='Lifestyle', path='/lifestyle')
@@ -40,6 +41,10 @@ layout = dbc.Container(
                                             html.Li("Single-click on a legend item to exclude that category from the graph."),
                                         ]
                                     ),
+                                    html.P(
+                                        "Hover over a bar to see the 95% confidence interval of its percentage, also drawn as error bars on grouped bars. "
+                                        "Hatched bars rest on fewer than 50 respondents or have a relative standard error above 30%, so read them with caution."
+                                    ),
                                     html.P(
                                         "Have fun exploring the data!"
                                     ),
@@ -56,7 +61,7 @@ layout = dbc.Container(
             ),
         
         # Top-level Dropdown for Lifestyle Variable Selection
-        dbc.Row(
+        dbc.Row([
             dbc.Col(
                 [
                     html.Label('Select Lifestyle Variable:', className='dropdown-label'),
@@ -70,26 +75,65 @@ layout = dbc.Container(
                 width=6,  # Adjust this width as necessary
                 className='mb-4'
             ),
+            dbc.Col(
+                [
+                    html.Label('Select Geography:', className='dropdown-label'),
+                    dcc.Dropdown(
+                        id='geography-selector-lifestyle',
+                        options=geography_dropdown_mappings,
+                        value='all',
+                        clearable=False,
+                        searchable=True,
+                    ),
+                ],
+                width=3,
+                className='mb-4'
+            )],
             justify='center'
         ),
 
-        # Year Slider
-        dbc.Row(
+        # Year Range Slider (selecting several years pools them)
+        dbc.Row([
             dbc.Col(
-                dcc.Slider(
+                dcc.RangeSlider(
                     id='year-slider-lifestyle',
                     min=2012,
                     max=2022,
                     step=1,
-                    value=2022,
+                    value=[2022, 2022],
+                    allowCross=False,
                     marks={str(year): str(year) for year in range(2012, 2023)},
                     updatemode='drag',
                 ),
                 width=8,
                 className='mb-4'
             ),
+            dbc.Col(
+                [
+                    dbc.Switch(
+                        id='equal-weight-lifestyle',
+                        label='Weight pooled years equally',
+                        value=False,
+                    ),
+                    dbc.Switch(
+                        id='age-adjust-lifestyle',
+                        label='Age-adjusted percentages',
+                        value=False,
+                    ),
+                    dbc.Switch(
+                        id='all-years-lifestyle',
+                        label='Show all years',
+                        value=False,
+                    ),
+                ],
+                width='auto',
+                className='mb-4'
+            )],
             justify='center'
         ),
+
+        # Structure of the figures last sent, so year changes can be sent as patches
+        dcc.Store(id='figure-signatures-lifestyle'),
         
          # Row for First Two Graphs
         dbc.Row(
@@ -169,7 +213,7 @@ layout = dbc.Container(
     fluid=True
 )
 
-from dash import callback, Output, Input, State
+from dash import callback, ctx, no_update, Output, Input, State
 
 @callback(
     [
@@ -178,6 +222,7 @@ from dash import callback, Output, Input, State
         Output('graph-chronic-conditions-lifestyle', 'figure'),
         Output('graph-healthcare-access-lifestyle', 'figure'),
         Output('alert-collapse-section-lifestyle', 'is_open'),  # Add this Output for the alert
+        Output('figure-signatures-lifestyle', 'data'),
     ],
     [
         Input('lifestyle-selector-lifestyle', 'value'),
@@ -187,21 +232,81 @@ from dash import callback, Output, Input, State
         Input('chronic-conditions-selector-lifestyle', 'value'),
         Input('healthcare-access-selector-lifestyle', 'value'),
         Input('alert-collapse-button-lifestyle', 'n_clicks'),  # Add this Input for the alert button
+        Input('geography-selector-lifestyle', 'value'),
+        Input('equal-weight-lifestyle', 'value'),
+        Input('age-adjust-lifestyle', 'value'),
+        Input('all-years-lifestyle', 'value'),
     ],
-    [State('alert-collapse-section-lifestyle', 'is_open')]  # State to track if the alert is open
+    [
+        State('alert-collapse-section-lifestyle', 'is_open'),  # State to track if the alert is open
+        State('figure-signatures-lifestyle', 'data'),
+    ]
 )
-def update_graphs_and_toggle_alert(lifestyle, selected_year, health_var, anthro_var, chronic_var, access_var, n_clicks, is_open):
+def update_graphs_and_toggle_alert(lifestyle, selected_year, health_var, anthro_var, chronic_var, access_var, n_clicks, geography, equal_weight, age_adjusted, all_years, is_open, signatures):
+    # The all-years view does not depend on the slider
+    if all_years and ctx.triggered_id == 'year-slider-lifestyle':
+        return (no_update,) * 6
+
     # Generate each figure using the respective update function
-    fig_health = update_life_health_fig(df, selected_year, lifestyle, health_var)
-    fig_anthro = update_life_anthro_fig(df, selected_year, lifestyle, anthro_var)
-    fig_chronic = update_life_chronic_fig(df, selected_year, lifestyle, chronic_var)
-    fig_access = update_life_access_fig(df, selected_year, lifestyle, access_var)
+    fig_health, fig_anthro, fig_chronic, fig_access = build_figures({
+        'health': (update_life_health_fig, df, selected_year, lifestyle, health_var, geography, equal_weight, age_adjusted, all_years),
+        'anthro': (update_life_anthro_fig, df, selected_year, lifestyle, anthro_var, geography, equal_weight, age_adjusted, all_years),
+        'chronic': (update_life_chronic_fig, df, selected_year, lifestyle, chronic_var, geography, equal_weight, age_adjusted, all_years),
+        'access': (update_life_access_fig, df, selected_year, lifestyle, access_var, geography, equal_weight, age_adjusted, all_years),
+    }, label='lifestyle')
+
+    # Moving the year slider only changes bar heights, labels and titles
+    figures, signatures = patch_unchanged_figures(
+        compact_figures([fig_health, fig_anthro, fig_chronic, fig_access], label='lifestyle'),
+        signatures,
+        values_only=ctx.triggered_id == 'year-slider-lifestyle'
+    )
 
     # Handle the alert collapse functionality
     if n_clicks:
         is_open = not is_open
 
     # Return all figures plus the state of the alert collapse
-    return fig_health, fig_anthro, fig_chronic, fig_access, is_open
+    return *figures, is_open, signatures
 
 
+# Options and years where a question was not asked are greyed out, using the availability index
+@callback(
+    [
+        Output('lifestyle-selector-lifestyle', 'options'),
+        Output('health-measures-selector-lifestyle', 'options'),
+        Output('anthropometrics-selector-lifestyle', 'options'),
+        Output('chronic-conditions-selector-lifestyle', 'options'),
+        Output('healthcare-access-selector-lifestyle', 'options'),
+        Output('year-slider-lifestyle', 'marks'),
+    ],
+    [
+        Input('year-slider-lifestyle', 'value'),
+        Input('geography-selector-lifestyle', 'value'),
+        Input('lifestyle-selector-lifestyle', 'value'),
+    ]
+)
+def update_availability(selected_year, geography, lifestyle):
+    return (
+        availability_options(df, lifestyle_variable_mappings, selected_year, geography),
+        availability_options(df, health_measure_variable_mappings, selected_year, geography),
+        availability_options(df, anthropometric_variable_mappings, selected_year, geography),
+        availability_options(df, chronic_condition_variable_mappings, selected_year, geography),
+        availability_options(df, healthcare_access_variable_mappings, selected_year, geography),
+        availability_marks(df, [lifestyle], geography),
+    )
+
+
+# Four years shown add a row of subplots, and the slider has no effect
+@callback(
+    [
+        Output('graph-health-measures-lifestyle', 'style'),
+        Output('graph-anthropometrics-lifestyle', 'style'),
+        Output('graph-chronic-conditions-lifestyle', 'style'),
+        Output('graph-healthcare-access-lifestyle', 'style'),
+        Output('year-slider-lifestyle', 'disabled'),
+    ],
+    Input('all-years-lifestyle', 'value'),
+)
+def update_graph_heights(all_years):
+    return *[cross_tab_graph_style(None, all_years)] * 4, bool(all_years)
@@ -0,0 +1,121 @@
+from dash import dcc, html, register_page, callback, dash_table, Input, Output
+import dash_bootstrap_components as dbc
+
+from process_data import df
+from helper_functions import get_top_movers
+from mappings import population_dropdown_mappings
+
+register_page(__name__, name='Biggest Movers', path='/movers')
+
+year_options = [{'label': str(year), 'value': year} for year in range(2012, 2023)]
+
+layout = dbc.Container(
+    [
+        dbc.Row(
+            dbc.Col(
+                dbc.Container(
+                    [
+                        html.H4("Biggest Movers", className="display-7", style={"color": "black", "text-align": "center"}),
+                        html.P(
+                            "The states and survey answers whose share of the population changed most between two years. "
+                            "Changes are in percentage points.",
+                            className="small", style={"color": "black", "text-align": "center"}
+                        ),
+                    ],
+                    className="p-3 bg-light rounded-3"
+                ),
+                width=12, style={'marginBottom': '15px', 'marginTop': '20px'}
+            ),
+        ),
+
+        dbc.Row(
+            [
+                dbc.Col(
+                    [
+                        html.Label('From:', className='dropdown-label'),
+                        dcc.Dropdown(id='year-a-selector-movers', options=year_options, value=2018, clearable=False),
+                    ],
+                    width=2,
+                ),
+                dbc.Col(
+                    [
+                        html.Label('To:', className='dropdown-label'),
+                        dcc.Dropdown(id='year-b-selector-movers', options=year_options, value=2022, clearable=False),
+                    ],
+                    width=2,
+                ),
+                dbc.Col(
+                    [
+                        html.Label('Variables (all if empty):', className='dropdown-label'),
+                        dcc.Dropdown(
+                            id='variable-selector-movers',
+                            options=[option for option in population_dropdown_mappings if option['value'] != 'state'],
+                            multi=True,
+                        ),
+                    ],
+                    width=4,
+                ),
+                dbc.Col(
+                    [
+                        html.Label('Minimum respondents:', className='dropdown-label'),
+                        dbc.Input(id='min-respondents-movers', type='number', min=0, step=10, value=50),
+                    ],
+                    width=2,
+                ),
+                dbc.Col(
+                    [
+                        html.Label('Show top:', className='dropdown-label'),
+                        dbc.Input(id='top-n-movers', type='number', min=1, max=200, step=5, value=25),
+                    ],
+                    width=1,
+                ),
+            ],
+            justify='center',
+            className='mb-4'
+        ),
+
+        dbc.Row(
+            dbc.Col(
+                dash_table.DataTable(
+                    id='table-movers',
+                    columns=[
+                        {'name': 'State', 'id': 'state'},
+                        {'name': 'Variable', 'id': 'variable'},
+                        {'name': 'Answer', 'id': 'answer'},
+                        {'name': 'From (%)', 'id': 'percentage_a', 'type': 'numeric'},
+                        {'name': 'To (%)', 'id': 'percentage_b', 'type': 'numeric'},
+                        {'name': 'Change (pp)', 'id': 'change', 'type': 'numeric'},
+                        {'name': 'Respondents (from)', 'id': 'respondents_a', 'type': 'numeric'},
+                        {'name': 'Respondents (to)', 'id': 'respondents_b', 'type': 'numeric'},
+                    ],
+                    page_size=25,
+                    sort_action='native',
+                    style_table={'overflowX': 'auto'},
+                    style_header={'backgroundColor': '#32383e', 'color': 'white', 'fontWeight': 'bold'},
+                    style_cell={'backgroundColor': '#272b30', 'color': 'white', 'padding': '6px', 'textAlign': 'left'},
+                    style_data_conditional=[
+                        {'if': {'filter_query': '{change} > 0', 'column_id': 'change'}, 'color': '#62c462'},
+                        {'if': {'filter_query': '{change} < 0', 'column_id': 'change'}, 'color': '#ee5f5b'},
+                    ],
+                ),
+                width=12,
+            ),
+            className='mb-4'
+        ),
+    ],
+    fluid=True
+)
+
+
+@callback(
+    Output('table-movers', 'data'),
+    [
+        Input('year-a-selector-movers', 'value'),
+        Input('year-b-selector-movers', 'value'),
+        Input('variable-selector-movers', 'value'),
+        Input('min-respondents-movers', 'value'),
+        Input('top-n-movers', 'value'),
+    ]
+)
+def update_movers_table(year_a, year_b, variables, min_respondents, top_n):
+    return get_top_movers(df, year_a, year_b, min_respondents or 0, top_n or 25, variables)
@@ -1,12 +1,17 @@
-from dash import Dash, dcc, html, register_page, callback, Input, Output
+from dash import Dash, dcc, html, register_page, callback, clientside_callback, no_update, Input, Output, State
 import dash_bootstrap_components as dbc
 
 from process_data import df
-from helper_functions import get_mapping_dict, update_state_map, update_frequency_chart, update_time_series, update_overview_bar, get_kpi_card_info
-from mappings import population_dropdown_mappings, state_fullname_mappings, demographic_variable_mappings
+from figure_factory import compact_figures
+from helper_functions import get_mapping_dict, update_state_map, update_frequency_chart_slices, update_time_series, update_overview_bar, get_kpi_card_info, get_kpi_sparklines, build_figures, availability_options, availability_marks
+from mappings import population_dropdown_mappings, state_fullname_mappings, demographic_variable_mappings, state_variable_mappings, geography_dropdown_mappings
 
 register_page(__name__, name='Overview', path='/overview')
 
+# Trend lines next to the KPI values, drawn without the mode bar or interactions besides hover
+sparkline_config = {'displayModeBar': False}
+sparkline_style = {'height': '36px'}
+
 kpi_card = dbc.Card(
     dbc.CardBody(
         [
@@ -48,6 +53,22 @@ kpi_card = dbc.Card(
 
                         ],
                     ),
+                    # Trend Column
+                    dbc.Col(
+                        [
+                            html.H6("2012-2022:", className="card-text"),
+                            dcc.Graph(id='population-sparkline', config=sparkline_config, style=sparkline_style),
+                            html.P(""),
+                            html.H6("2012-2022:", className="card-text"),
+                            dcc.Graph(id='avg-age-sparkline', config=sparkline_config, style=sparkline_style),
+                            html.P(""),
+                            html.H6("2012-2022:", className="card-text"),
+                            dcc.Graph(id='employment-sparkline', config=sparkline_config, style=sparkline_style),
+                            html.P(""),
+                            html.H6("2012-2022:", className="card-text"),
+                            dcc.Graph(id='income-sparkline', config=sparkline_config, style=sparkline_style),
+                        ],
+                    ),
                 ]
             ),
         ], className="h-100",
@@ -150,6 +171,8 @@ layout = dbc.Container(
                                 options=[
                                     {"label": "Population", "value": "frequency"},
                                     {"label": "Number of Respondents", "value": "count"},
+                                    {"label": "Prevalence", "value": "prevalence"},
+                                    {"label": "Average", "value": "average"},
                                 ],
                                 value="frequency",
                             ),
@@ -161,6 +184,67 @@ layout = dbc.Container(
             ],
             className='justify-content-left g-3',
         ),
+        html.Div(
+            dbc.Row(
+                [
+                    dbc.Col(
+                        [
+                            dbc.Label("Select a survey variable:", html_for='prevalence-variable-state-map'),
+                            dcc.Dropdown(
+                                id='prevalence-variable-state-map',
+                                options=[option for option in population_dropdown_mappings if option['value'] != 'state'],
+                                value='smoking',
+                                clearable=False,
+                                searchable=True,
+                            ),
+                        ],
+                        width=4,
+                    ),
+                    dbc.Col(
+                        [
+                            dbc.Label("Select an answer:", html_for='prevalence-code-state-map'),
+                            dcc.Dropdown(
+                                id='prevalence-code-state-map',
+                                clearable=False,
+                                searchable=True,
+                            ),
+                        ],
+                        width=4,
+                    ),
+                    dbc.Col(
+                        dbc.Switch(
+                            id='age-adjust-state-map',
+                            label='Age-adjusted',
+                            value=False,
+                        ),
+                        width='auto',
+                        className='align-self-end',
+                    ),
+                ],
+                className='justify-content-end g-3 mb-2',
+            ),
+            id='prevalence-controls-state-map',
+            style={'display': 'none'},
+        ),
+        html.Div(
+            dbc.Row(
+                dbc.Col(
+                    [
+                        dbc.Label("Select a measure:", html_for='average-variable-state-map'),
+                        dcc.Dropdown(
+                            id='average-variable-state-map',
+                            options=state_variable_mappings,
+                            value='Average Household Income',
+                            clearable=False,
+                        ),
+                    ],
+                    width=4,
+                ),
+                className='justify-content-end g-3 mb-2',
+            ),
+            id='average-controls-state-map',
+            style={'display': 'none'},
+        ),
         dbc.Row(
             [
                 dbc.Col(kpi_card, width=5, className='h-100'),
@@ -182,10 +266,14 @@ layout = dbc.Container(
                 ),
 
                 dbc.Col(
-                    dcc.Graph(
-                        id='choropleth-map-state-map',
-                        style={'height': '400px'},
-                    ),
+                    [
+                        dcc.Graph(
+                            id='choropleth-map-state-map',
+                            style={'height': '400px'},
+                        ),
+                        # Map figure with one frame per year
+                        dcc.Store(id='state-map-store'),
+                    ],
                     width=6
                 ),
 
@@ -213,10 +301,10 @@ layout = dbc.Container(
         dbc.Row([
             dbc.Col(
                 [
-                    dbc.Label("Select a state:", html_for='state-selector-overview-1'),
+                    dbc.Label("Select a state or region:", html_for='state-selector-overview-1'),
                     dcc.Dropdown(
                         id='state-selector-overview-1',
-                        options=state_fullname_mappings,
+                        options=geography_dropdown_mappings,
                         value=1,
                         clearable=False,
                         searchable=True,
@@ -246,7 +334,14 @@ layout = dbc.Container(
                 width=6
             ),
             dbc.Col(
-                dcc.Graph(id='stacked-bar-chart-overview'),
+                [
+                    dcc.Graph(id='stacked-bar-chart-overview'),
+                    dbc.Switch(
+                        id='age-adjust-overview',
+                        label='Age-adjusted percentages',
+                        value=False,
+                    ),
+                ],
                 width=6
             )],
             className="mt-4", style={'marginBottom': '5px', 'marginTop': '5px'}
@@ -280,7 +375,9 @@ layout = dbc.Container(
                             placeholder='Select a variable',
                             id='variable-selector-overview'
                         ),
-                        html.Div(id='dd-output-container-overview')
+                        html.Div(id='dd-output-container-overview'),
+                        # Frequency chart for every year of the selected variable
+                        dcc.Store(id='frequency-chart-store-overview'),
                     ],
                     width=2,
                     className='d-flex flex-column justify-content-start'
@@ -320,12 +417,28 @@ layout = dbc.Container(
 # Callbacks for the "Overview" page
 @callback(
     [
-        Output('kpi-card-title', 'children'),
         Output('time-series-graph-overview', 'figure'),
         Output('stacked-bar-chart-overview', 'figure'),
-        Output('dd-output-container-overview', 'children'),
-        Output('frequency-chart-overview', 'figure'),
-        Output('choropleth-map-state-map', 'figure'),
+    ],
+    [
+        Input('state-selector-overview-1', 'value'),
+        Input('demographic-selector-overview', 'value'),
+        Input('age-adjust-overview', 'value'),
+    ]
+)
+def update_overview(selected_state_1, variable, age_adjusted):
+    all_states = selected_state_1 == 'all'
+    time_series_figure, stacked_bar_figure = build_figures({
+        'time_series': (update_time_series, df, selected_state_1, variable, all_states),
+        'stacked_bar': (update_overview_bar, df, selected_state_1, variable, all_states, age_adjusted),
+    }, label='overview')
+
+    return compact_figures([time_series_figure, stacked_bar_figure], label='overview')
+
+
+@callback(
+    [
+        Output('kpi-card-title', 'children'),
         Output('population-display', 'children'),
         Output('avg-age-display', 'children'),
         Output('employment-display', 'children'),
@@ -334,29 +447,124 @@ layout = dbc.Container(
         Output('avg-age-change-display', 'children'),
         Output('employment-change-display', 'children'),
         Output('income-change-display', 'children'),
+        Output('population-sparkline', 'figure'),
+        Output('avg-age-sparkline', 'figure'),
+        Output('employment-sparkline', 'figure'),
+        Output('income-sparkline', 'figure'),
     ],
     [
-        Input('state-selector-overview-1', 'value'),
-        Input('demographic-selector-overview', 'value'),
-        Input('year-slider-overview', 'value'),
-        Input('variable-selector-overview', 'value'),
         Input('year-slider-state-map', 'value'),
-        Input('variable-selector-state-map', 'value'),
         Input('state-selector-overview-2', 'value')
     ]
 )
-def update_overview(selected_state_1, variable, selected_year, selected_variable, map_year, map_variable, selected_state_2):
-    time_series_figure = update_time_series(df, selected_state_1, variable)
-    stacked_bar_figure = update_overview_bar(df, selected_state_1, variable)
-    
-    dropdown_text, frequency_chart = update_frequency_chart(selected_year, selected_variable, df)
-    
-    state_map = update_state_map(df, map_year, map_variable)
-
+def update_kpi_card(map_year, selected_state_2):
     population, population_change, avg_age, avg_age_change, employment, employment_change, income, income_change = get_kpi_card_info(df, selected_state_2, map_year)
 
     state_name_mapping = get_mapping_dict('state')
 
     title = f"{state_name_mapping[selected_state_2]}: Key {map_year} Stats"
-    
-    return title, time_series_figure, stacked_bar_figure, dropdown_text, frequency_chart, state_map, population, avg_age, employment, income, population_change, avg_age_change, employment_change, income_change
+
+    # Trends for every year come from the same precomputed KPI table as the values
+    sparklines = compact_figures(get_kpi_sparklines(df, selected_state_2, map_year), label='kpi_sparklines')
+
+    return title, population, avg_age, employment, income, population_change, avg_age_change, employment_change, income_change, *sparklines
+
+
+@callback(
+    [
+        Output('prevalence-controls-state-map', 'style'),
+        Output('average-controls-state-map', 'style'),
+        Output('prevalence-code-state-map', 'options'),
+        Output('prevalence-code-state-map', 'value'),
+    ],
+    Input('variable-selector-state-map', 'value'),
+    Input('prevalence-variable-state-map', 'value'),
+    State('prevalence-code-state-map', 'value')
+)
+def update_map_controls(map_variable, prevalence_variable, prevalence_code):
+    prevalence_style = {'display': 'block'} if map_variable == 'prevalence' else {'display': 'none'}
+    average_style = {'display': 'block'} if map_variable == 'average' else {'display': 'none'}
+    labels = get_mapping_dict(prevalence_variable, time_series=True)
+    options = [{'label': label.replace('<br>', ' '), 'value': code} for code, label in labels.items() if code != -1]
+    if prevalence_code not in labels or prevalence_code == -1:
+        prevalence_code = options[0]['value']
+
+    return prevalence_style, average_style, options, prevalence_code
+
+
+# Variables not asked anywhere in the map's year are disabled. Kept apart from
+# update_map_controls so moving the year does not re-fire the map store
+@callback(
+    Output('prevalence-variable-state-map', 'options'),
+    Input('year-slider-state-map', 'value')
+)
+def update_map_variable_options(map_year):
+    return availability_options(df, [option for option in population_dropdown_mappings if option['value'] != 'state'], map_year)
+
+
+# The map holds a frame for every year, so moving the year slider only picks
+# another frame in the browser
+@callback(
+    Output('state-map-store', 'data'),
+    Input('variable-selector-state-map', 'value'),
+    Input('prevalence-variable-state-map', 'value'),
+    Input('prevalence-code-state-map', 'value'),
+    Input('average-variable-state-map', 'value'),
+    Input('age-adjust-state-map', 'value'),
+    State('year-slider-state-map', 'value')
+)
+def update_state_map_store(map_variable, prevalence_variable, prevalence_code, average_variable, age_adjusted, map_year):
+    if map_variable == 'prevalence' and prevalence_code is None:
+        return no_update
+    return compact_figures([update_state_map(df, map_year, map_variable, prevalence_variable, prevalence_code, average_variable, age_adjusted)], label='state_map')[0]
+
+
+clientside_callback(
+    """
+    function(selectedYear, figure) {
+        if (!figure || !figure.frames) {
+            return window.dash_clientside.no_update;
+        }
+        const frame = figure.frames.find(frame => frame.name === String(selectedYear));
+        if (!frame) {
+            return window.dash_clientside.no_update;
+        }
+        const data = figure.data.map((trace, index) => Object.assign({}, trace, frame.data[index]));
+        return {data: data, layout: figure.layout};
+    }
+    """,
+    Output('choropleth-map-state-map', 'figure'),
+    Input('year-slider-state-map', 'value'),
+    Input('state-map-store', 'data')
+)
+
+
+# The frequency chart of every year is sent once per variable, the year slider
+# then switches between them in the browser without a server round-trip
+@callback(
+    [
+        Output('dd-output-container-overview', 'children'),
+        Output('frequency-chart-store-overview', 'data'),
+        Output('year-slider-overview', 'marks'),
+    ],
+    Input('variable-selector-overview', 'value')
+)
+def update_frequency_chart_store(selected_variable):
+    # Years where the question was not asked are struck through on the slider
+    return *update_frequency_chart_slices(df, selected_variable), availability_marks(df, [selected_variable])
+
+
+clientside_callback(
+    """
+    function(selectedYear, slices) {
+        if (!slices || !slices.years[selectedYear]) {
+            return window.dash_clientside.no_update;
+        }
+        const slice = slices.years[selectedYear];
+        return {data: slice.data, layout: Object.assign({}, slices.layout, slice.layout)};
+    }
+    """,
+    Output('frequency-chart-overview', 'figure'),
+    Input('year-slider-overview', 'value'),
+    Input('frequency-chart-store-overview', 'data')
+)
@@ -0,0 +1,103 @@
+from dash import dcc, html, register_page, callback, dash_table, Input, Output
+import dash_bootstrap_components as dbc
+
+from process_data import df
+from helper_functions import get_ranking_page
+from mappings import ranking_metric_mappings
+
+register_page(__name__, name='State Rankings', path='/rankings')
+
+layout = dbc.Container(
+    [
+        dbc.Row(
+            dbc.Col(
+                dbc.Container(
+                    [
+                        html.H4("State Rankings", className="display-7", style={"color": "black", "text-align": "center"}),
+                        html.P(
+                            "Ranks the states on key statistics and health measures. Click a column header to sort; "
+                            "the percentile shows the share of states at or below each state's value.",
+                            className="small", style={"color": "black", "text-align": "center"}
+                        ),
+                    ],
+                    className="p-3 bg-light rounded-3"
+                ),
+                width=12, style={'marginBottom': '15px', 'marginTop': '20px'}
+            ),
+        ),
+
+        dbc.Row(
+            [
+                dbc.Col(
+                    [
+                        html.Label('Select Metrics:', className='dropdown-label'),
+                        dcc.Dropdown(
+                            id='metric-selector-rankings',
+                            options=[{'label': metric['label'], 'value': metric['value']} for metric in ranking_metric_mappings],
+                            value=['median_income', 'employment_rate', 'current_smoking', 'obese'],
+                            multi=True,
+                            clearable=False,
+                        ),
+                    ],
+                    width=8,
+                    className='mb-4'
+                ),
+                dbc.Col(
+                    [
+                        html.Label('Select Year:', className='dropdown-label'),
+                        dcc.Dropdown(
+                            id='year-selector-rankings',
+                            options=[{'label': str(year), 'value': year} for year in range(2022, 2011, -1)],
+                            value=2022,
+                            clearable=False,
+                        ),
+                    ],
+                    width=2,
+                    className='mb-4'
+                ),
+            ],
+            justify='center'
+        ),
+
+        dbc.Row(
+            dbc.Col(
+                # Sorting and paging run on the server against the precomputed metrics table
+                dash_table.DataTable(
+                    id='table-rankings',
+                    page_current=0,
+                    page_size=15,
+                    page_action='custom',
+                    sort_action='custom',
+                    sort_mode='single',
+                    sort_by=[],
+                    merge_duplicate_headers=True,
+                    style_table={'overflowX': 'auto'},
+                    style_header={'backgroundColor': '#32383e', 'color': 'white', 'fontWeight': 'bold', 'textAlign': 'center'},
+                    style_cell={'backgroundColor': '#272b30', 'color': 'white', 'padding': '6px'},
+                    style_cell_conditional=[{'if': {'column_id': 'state_name'}, 'textAlign': 'left'}],
+                ),
+                width=12,
+            ),
+            className='mb-4'
+        ),
+    ],
+    fluid=True
+)
+
+
+@callback(
+    [
+        Output('table-rankings', 'data'),
+        Output('table-rankings', 'columns'),
+        Output('table-rankings', 'page_count'),
+    ],
+    [
+        Input('year-selector-rankings', 'value'),
+        Input('metric-selector-rankings', 'value'),
+        Input('table-rankings', 'sort_by'),
+        Input('table-rankings', 'page_current'),
+        Input('table-rankings', 'page_size'),
+    ]
+)
+def update_rankings_table(selected_year, metrics, sort_by, page_current, page_size):
+    return get_ranking_page(df, selected_year, metrics or [], sort_by, page_current or 0, page_size)
@@ -0,0 +1,116 @@
+from dash import dcc, html, register_page, callback, Input, Output
+import dash_bootstrap_components as dbc
+
+from process_data import df
+from figure_factory import compact_figures
+from helper_functions import update_similarity_heatmap, update_cluster_map
+from mappings import similarity_group_mappings
+
+register_page(__name__, name='State Similarity', path='/similarity')
+
+layout = dbc.Container(
+    [
+        dbc.Row(
+            dbc.Col(
+                dbc.Container(
+                    [
+                        html.H4("States With Similar Health Profiles", className="display-7", style={"color": "black", "text-align": "center"}),
+                        html.P(
+                            "Each state's profile is the weighted share of its adults giving each answer to the selected "
+                            "groups of questions. States are compared on these shares, standardized across states, and "
+                            "grouped by average linkage clustering. Darker cells in the heatmap are more similar states.",
+                            className="small", style={"color": "black", "text-align": "center"}
+                        ),
+                    ],
+                    className="p-3 bg-light rounded-3"
+                ),
+                width=12, style={'marginBottom': '15px', 'marginTop': '20px'}
+            ),
+        ),
+
+        dbc.Row(
+            [
+                dbc.Col(
+                    [
+                        html.Label('Compare states on:', className='dropdown-label'),
+                        dcc.Checklist(
+                            id='groups-similarity',
+                            options=[{'label': option['label'], 'value': option['value']} for option in similarity_group_mappings],
+                            value=['lifestyle', 'chronic_conditions', 'healthcare_access', 'health_measures'],
+                            inline=True,
+                            inputStyle={'marginRight': '5px', 'marginLeft': '15px'},
+                        ),
+                    ],
+                    width=8,
+                ),
+                dbc.Col(
+                    [
+                        html.Label('Number of clusters:', className='dropdown-label'),
+                        dcc.Slider(
+                            id='clusters-similarity',
+                            min=2,
+                            max=8,
+                            step=1,
+                            value=4,
+                            marks={str(count): str(count) for count in range(2, 9)},
+                        ),
+                    ],
+                    width=4,
+                ),
+            ],
+            justify='center',
+            className='mb-4'
+        ),
+
+        # Year Slider
+        dbc.Row(
+            dbc.Col(
+                dcc.Slider(
+                    id='year-slider-similarity',
+                    min=2012,
+                    max=2022,
+                    step=1,
+                    value=2022,
+                    marks={str(year): str(year) for year in range(2012, 2023)},
+                ),
+                width=8,
+                className='mb-4'
+            ),
+            justify='center'
+        ),
+
+        dbc.Row(
+            [
+                dbc.Col(
+                    dcc.Loading(dcc.Graph(id='map-similarity', style={'height': '700px'})),
+                    width=5,
+                ),
+                dbc.Col(
+                    dcc.Loading(dcc.Graph(id='heatmap-similarity', style={'height': '850px'})),
+                    width=7,
+                ),
+            ],
+            className='mb-4'
+        ),
+    ],
+    fluid=True
+)
+
+
+@callback(
+    [
+        Output('map-similarity', 'figure'),
+        Output('heatmap-similarity', 'figure'),
+    ],
+    [
+        Input('year-slider-similarity', 'value'),
+        Input('groups-similarity', 'value'),
+        Input('clusters-similarity', 'value'),
+    ]
+)
+def update_similarity(selected_year, groups, clusters):
+    # Distances and clustering are computed once per year and group selection, then cached
+    return compact_figures([
+        update_cluster_map(df, selected_year, groups, clusters),
+        update_similarity_heatmap(df, selected_year, groups, clusters),
+    ], label='similarity', decimals=3)
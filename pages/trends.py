@@ -0,0 +1,131 @@
+from dash import dcc, html, register_page, callback, Input, Output, State
+import dash_bootstrap_components as dbc
+
+from process_data import df
+from figure_factory import compact_figures
+from helper_functions import get_mapping_dict, update_trend_fig
+from mappings import population_dropdown_mappings, geography_dropdown_mappings
+
+register_page(__name__, name='Trends', path='/trends')
+
+# Any survey variable can be followed or tracked, except the state which is chosen as the geography
+trend_variable_mappings = [option for option in population_dropdown_mappings if option['value'] != 'state']
+
+layout = dbc.Container(
+    [
+        dbc.Row(
+            dbc.Col(
+                dbc.Container(
+                    [
+                        html.H4("Trends Over Time", className="display-7", style={"color": "black", "text-align": "center"}),
+                        html.P(
+                            "Follow the share of each group giving an answer from 2012 to 2022, for example smoking "
+                            "by education level or health insurance by income. Shaded bands are 95% confidence "
+                            "intervals and open markers flag estimates from fewer than 50 respondents or with a "
+                            "relative standard error above 30%.",
+                            className="small", style={"color": "black", "text-align": "center"}
+                        ),
+                    ],
+                    className="p-3 bg-light rounded-3"
+                ),
+                width=12, style={'marginBottom': '15px', 'marginTop': '20px'}
+            ),
+        ),
+
+        dbc.Row(
+            [
+                dbc.Col(
+                    [
+                        html.Label('Track the answer:', className='dropdown-label'),
+                        dcc.Dropdown(id='y-variable-trends', options=trend_variable_mappings, value='smoking', clearable=False),
+                    ],
+                    width=3,
+                ),
+                dbc.Col(
+                    [
+                        html.Label('Answer:', className='dropdown-label'),
+                        dcc.Dropdown(id='y-code-trends', clearable=False),
+                    ],
+                    width=3,
+                ),
+                dbc.Col(
+                    [
+                        html.Label('For each group of:', className='dropdown-label'),
+                        dcc.Dropdown(id='x-variable-trends', options=trend_variable_mappings, value='education', clearable=False),
+                    ],
+                    width=3,
+                ),
+                dbc.Col(
+                    [
+                        html.Label('State or region:', className='dropdown-label'),
+                        dcc.Dropdown(id='geography-selector-trends', options=geography_dropdown_mappings, value='all', clearable=False),
+                    ],
+                    width=3,
+                ),
+            ],
+            justify='center',
+            className='mb-4'
+        ),
+
+        dbc.Row(
+            dbc.Col(
+                [
+                    dbc.Switch(
+                        id='bands-trends',
+                        label='Show confidence bands',
+                        value=True,
+                    ),
+                    dbc.Switch(
+                        id='age-adjust-trends',
+                        label='Age-adjusted percentages',
+                        value=False,
+                    ),
+                ],
+                width='auto',
+            ),
+            justify='center',
+            className='mb-4'
+        ),
+
+        dbc.Row(
+            dbc.Col(
+                dcc.Loading(dcc.Graph(id='graph-trends', style={'height': '600px'})),
+                width=12,
+            ),
+            className='mb-4'
+        ),
+    ],
+    fluid=True
+)
+
+
+@callback(
+    [
+        Output('y-code-trends', 'options'),
+        Output('y-code-trends', 'value'),
+    ],
+    Input('y-variable-trends', 'value'),
+    State('y-code-trends', 'value')
+)
+def update_code_selector(variable, code):
+    labels = get_mapping_dict(variable, time_series=True)
+    options = [{'label': str(label).replace('<br>', ' '), 'value': key} for key, label in labels.items() if key != -1]
+    if code not in labels or code == -1:
+        code = options[0]['value']
+    return options, code
+
+
+@callback(
+    Output('graph-trends', 'figure'),
+    [
+        Input('x-variable-trends', 'value'),
+        Input('y-code-trends', 'value'),
+        Input('geography-selector-trends', 'value'),
+        Input('bands-trends', 'value'),
+        Input('age-adjust-trends', 'value'),
+    ],
+    State('y-variable-trends', 'value')
+)
+def update_trend(x_variable, y_code, geography, bands, age_adjusted, y_variable):
+    # Every year of the pair comes from one cached year x x_variable x y_variable cube
+    return compact_figures([update_trend_fig(df, x_variable, y_variable, y_code, geography, age_adjusted, bands)], label='trends')[0]
@@ -0,0 +1,168 @@
+import numpy as np
+import pandas as pd
+from aggregates import cached_table, weighted_cube, year_range
+
+# Survey-weighted logistic regression of a chronic condition on demographic and
+# lifestyle codes. Every covariate is categorical, so respondents sharing the same
+# answers collapse into one covariate pattern carrying the weight of those with and
+# without the condition. The models are fitted on these patterns, a few thousand
+# rows instead of the full survey, and the fits of every year are solved together.
+
+# Outcome codes counted as having the condition, the other valid codes count as not
+risk_model_outcomes = {
+    'stroke': [1],
+    'asthma': [1],
+    'arthritis': [1],
+    'cardiac_event': [1],
+}
+
+# Covariates and their reference codes (the odds ratio of the reference is 1)
+risk_model_covariates = {
+    'age': 1,
+    'sex': 1,
+    'smoking': 4,
+    'exercise': 1,
+    'bmi_category': 2,
+    'binge_drinking': 1,
+}
+
+def _design_matrix(patterns, covariates):
+    """
+    One-hot encodes the covariate patterns against their reference codes.
+
+    Returns:
+    tuple: The design matrix (intercept first) and the (covariate, code) of each column.
+    """
+    columns = [np.ones(len(patterns))]
+    terms = [('intercept', None)]
+    for covariate, reference in covariates.items():
+        for code in sorted(patterns[covariate].unique()):
+            if code == reference:
+                continue
+            columns.append((patterns[covariate].to_numpy() == code).astype(np.float64))
+            terms.append((covariate, int(code)))
+    return np.column_stack(columns), terms
+
+def batched_irls(X, successes, totals, groups, n_groups, max_iter=50, tol=1e-8):
+    """
+    Fits one weighted logistic regression per group by iteratively reweighted least
+    squares, with the normal equations of all groups formed and solved together.
+
+    Parameters:
+    X (np.ndarray): Design matrix, one row per covariate pattern.
+    successes (np.ndarray): Weight of the pattern's respondents with the outcome.
+    totals (np.ndarray): Weight of all the pattern's respondents.
+    groups (np.ndarray): Group index (0 to n_groups - 1) of each row.
+    n_groups (int): Number of groups.
+    max_iter (int): Maximum number of iterations.
+    tol (float): Stops once no coefficient moves more than this.
+
+    Returns:
+    tuple: Coefficients (n_groups x p) and their covariance matrices (n_groups x p x p).
+    """
+    p = X.shape[1]
+    beta = np.zeros((n_groups, p))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        y = np.where(totals > 0, successes / totals, 0)
+    # A small ridge keeps groups solvable when a covariate level is absent from them
+    ridge = np.eye(p) * 1e-8
+    outer = X[:, :, None] * X[:, None, :]
+
+    for _ in range(max_iter):
+        eta = np.einsum('ij,ij->i', X, beta[groups])
+        mu = 1 / (1 + np.exp(-eta))
+        variance = np.clip(mu * (1 - mu), 1e-10, None)
+        w = totals * variance
+        z = eta + (y - mu) / variance
+
+        information = np.zeros((n_groups, p, p))
+        np.add.at(information, groups, outer * w[:, None, None])
+        score = np.zeros((n_groups, p))
+        np.add.at(score, groups, X * (w * z)[:, None])
+
+        new_beta = np.linalg.solve(information + ridge, score[:, :, None])[:, :, 0]
+        converged = np.max(np.abs(new_beta - beta)) < tol
+        beta = new_beta
+        if converged:
+            break
+
+    return beta, np.linalg.inv(information + ridge)
+
+def _fit(df, outcome, years, pooled):
+    """
+    Fits the risk model of an outcome for each of the given years, or once pooled
+    over all of them.
+
+    Returns:
+    dict: Maps each year (or the (first, last) range when pooled) to a DataFrame of
+          the covariate, code, coefficient and standard error of every term.
+    """
+    covariates = dict(risk_model_covariates)
+    patterns = weighted_cube(df, ['year', outcome] + list(covariates))
+    patterns = patterns.loc[patterns['year'].isin(years)]
+    # Complete cases only: 'Other' (-1) in the outcome or any covariate drops the pattern
+    patterns = patterns.loc[(patterns[[outcome] + list(covariates)] != -1).all(axis=1)]
+
+    # Weights are rescaled to the number of respondents in each fit, so the standard
+    # errors reflect the sample size rather than the population size
+    keys = ['fit']
+    patterns = patterns.assign(fit=0 if pooled else patterns['year'].map({year: index for index, year in enumerate(years)}))
+    scale = patterns.groupby(keys)['respondents'].transform('sum') / patterns.groupby(keys)['wt'].transform('sum')
+    patterns = patterns.assign(
+        wt=patterns['wt'] * scale,
+        success=np.where(patterns[outcome].isin(risk_model_outcomes[outcome]), patterns['wt'] * scale, 0.0),
+    )
+    covariate_patterns = patterns.groupby(keys + list(covariates), as_index=False)[['wt', 'success']].sum()
+
+    X, terms = _design_matrix(covariate_patterns, covariates)
+    n_groups = 1 if pooled else len(years)
+    beta, covariance = batched_irls(X, covariate_patterns['success'].to_numpy(), covariate_patterns['wt'].to_numpy(),
+                                    covariate_patterns['fit'].to_numpy(), n_groups)
+
+    results = {}
+    for index in range(n_groups):
+        fit = pd.DataFrame(terms, columns=['covariate', 'code'])
+        fit['coefficient'] = beta[index]
+        fit['se'] = np.sqrt(np.clip(np.diag(covariance[index]), 0, None))
+        present = covariate_patterns.loc[covariate_patterns['fit'] == index]
+        # Levels nobody in this fit answered are not estimable
+        fit['estimable'] = [covariate == 'intercept' or (present[covariate] == code).any() for covariate, code in terms]
+        results[(min(years), max(years)) if pooled else years[index]] = fit
+    return results
+
+def risk_model(df, outcome, selected_year):
+    """
+    Adjusted odds ratios of the chronic outcome for each covariate level against its
+    reference, from a survey-weighted logistic regression. Single years are read
+    from a batch fit of every year, cached per outcome. A range of years is fitted
+    once pooled and cached per range.
+
+    Parameters:
+    df (pd.DataFrame): The input DataFrame containing survey data.
+    outcome (str): One of risk_model_outcomes (e.g., 'stroke').
+    selected_year (int or list): A single year or a [first, last] range.
+
+    Returns:
+    pd.DataFrame: Columns covariate, code, odds_ratio, ci_low and ci_high (95%),
+                  without the intercept.
+    """
+    first, last = year_range(selected_year)
+    if first == last:
+        years = sorted(int(year) for year in weighted_cube(df, ['year'])['year'])
+        fits = cached_table(df, ('risk_model', outcome), lambda: _fit(df, outcome, years, pooled=False))
+        fit = fits.get(first)
+    else:
+        years = list(range(first, last + 1))
+        fit = cached_table(df, ('risk_model', outcome, first, last), lambda: _fit(df, outcome, years, pooled=True))[(first, last)]
+
+    if fit is None:
+        return pd.DataFrame(columns=['covariate', 'code', 'odds_ratio', 'ci_low', 'ci_high'])
+
+    fit = fit.loc[(fit['covariate'] != 'intercept') & fit['estimable']]
+    return pd.DataFrame({
+        'covariate': fit['covariate'],
+        'code': fit['code'],
+        'odds_ratio': np.exp(fit['coefficient']),
+        'ci_low': np.exp(fit['coefficient'] - 1.96 * fit['se']),
+        'ci_high': np.exp(fit['coefficient'] + 1.96 * fit['se']),
+    }).reset_index(drop=True)